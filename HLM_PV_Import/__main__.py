@@ -2,13 +2,22 @@
 Helium Level Monitoring Project - HeRecovery Database PV Import
 """
 
-from HLM_PV_Import.ca_wrapper import PvMonitors
+from HLM_PV_Import.ca_wrapper import PvMonitors, get_monitor_mask
+from HLM_PV_Import.ca_recording import UpdateRecorder
 from HLM_PV_Import.user_config import UserConfig
 from HLM_PV_Import.pv_import import PvImport
-from HLM_PV_Import.settings import CA, HEDB
-from HLM_PV_Import.logger import logger
+from HLM_PV_Import.settings import CA, HEDB, Metrics, PvImportConfig, ImportEngines, Status, Tracing
+from HLM_PV_Import.logger import logger, setup_logging
 from HLM_PV_Import.db_func import db_connect, check_db_connection
+from HLM_PV_Import.db_health import db_health
+from HLM_PV_Import.db_writer import MeasurementWriter
 from HLM_PV_Import.external_pvs import MercuryPVs
+from HLM_PV_Import.metrics import MetricsFileWriter, registry
+from HLM_PV_Import.status_server import StatusServer
+from HLM_PV_Import.tracing import tracer
+from HLM_PV_Import.supervisor import Supervisor
+from HLM_PV_Import.leases import LeaseManager, create_lease_table
+from shared.ca_context import ca_context
 from shared.db_models import initialize_database
 import os
 import sys
@@ -16,23 +25,153 @@ import sys
 this = sys.modules[__name__]
 
 this.pv_import = None
+this.supervisor = None
+this.metrics_exporters = []
+this.status_server = None
+this.reload_requested = False
+
+# The status channel values, and the metrics they are got from
+STATUS_METRICS = {
+    'monitored_pvs': 'hlm_monitored_pvs',
+    'stale_pvs': 'hlm_stale_pvs',
+    'last_insert_time': 'hlm_db_last_insert_timestamp_seconds',
+    'measurements_added': 'hlm_measurements_added_total',
+    'writer_queue_depth': 'hlm_writer_queue_depth',
+    'log_queue_depth': 'hlm_log_queue_depth',
+    'db_healthy': 'hlm_db_healthy',
+    'workers_alive': 'hlm_supervisor_workers_alive'
+}
+
+
+def bootstrap(log_suffix=None):
+    """
+    Set up the logging and tracing from the settings, which importing the service modules doesn't do. Called once by
+    the entry point of each process running the import (this module, the service and the supervisor workers), before
+    anything is logged.
+
+    Args:
+        log_suffix (str, optional): The suffix of the log file names, for the supervisor worker processes.
+    """
+    setup_logging(log_suffix)
+    tracer.configure(enabled=Tracing.ENABLED, report_interval=Tracing.REPORT_INTERVAL)
+
+
+def start_metrics_exporters():
+    """
+    Serve the metrics over HTTP and/or dump them to a file, if enabled in the settings.
+    """
+    try:
+        if Metrics.PORT:
+            from HLM_PV_Import.metrics_server import MetricsServer  # only loads http.server when used
+            this.metrics_exporters.append(MetricsServer(Metrics.PORT))
+        if Metrics.DUMP_FILE:
+            this.metrics_exporters.append(MetricsFileWriter(Metrics.DUMP_FILE, Metrics.DUMP_INTERVAL))
+        for exporter in this.metrics_exporters:
+            exporter.start()
+    except OSError as e:
+        logger.error(f'Could not start the metrics exporters: {e}')
+
+
+def start_status_server():
+    """
+    Serve the service status and commands to the Service Manager, if enabled in the settings.
+    """
+    if not Status.PORT:
+        return
+    try:
+        this.status_server = StatusServer(Status.PORT, get_status, {'reload_config': reload_config},
+                                          token=Status.TOKEN)
+        this.status_server.start()
+    except OSError as e:
+        logger.error(f'Could not start the status server: {e}')
+
+
+def get_status():
+    """
+    Get the live status of the service for the status channel. In supervisor mode, the import values are the combined
+    ones reported by the worker processes, and the stale PV names aren't included.
+
+    Returns:
+        (dict): The status values.
+    """
+    status = {key: registry.get(name).value for key, name in STATUS_METRICS.items()}
+    pv_monitors = this.pv_import.pv_monitors if this.pv_import is not None else None
+    status['stale_pv_names'] = sorted(pv_monitors.get_stale_pvs()) if pv_monitors is not None else []
+    status['supervisor'] = this.supervisor is not None
+    return status
+
+
+def reload_config():
+    """
+    Reload the PV config, once the running import loop is done, by restarting the import, or the supervisor workers.
+    """
+    if this.supervisor is not None:
+        this.supervisor.restart_workers()
+    elif this.pv_import is not None:
+        this.reload_requested = True
+        this.pv_import.stop()
+    else:
+        raise RuntimeError('The PV import is not running.')
 
 
 def main():
+    start_metrics_exporters()
+    start_status_server()
+
+    if PvImportConfig.PROCESSES:
+        # Split the objects between worker processes, each running its own import, and restart them if they fail
+        this.supervisor = Supervisor(PvImportConfig.PROCESSES)
+        this.supervisor.run()
+        return
+
+    run_import()
+
+
+def run_import(shard_index=0, shard_count=1, heartbeat=None):
+    """
+    Run the PV import of the configured objects, or of a shard of them when run by a supervisor worker, until stopped.
+
+    Args:
+        shard_index (int, optional): The shard of the configured objects to import.
+        shard_count (int, optional): The number of shards the objects are split into, Defaults to 1 (all objects).
+        heartbeat (multiprocessing.Value, optional): Set to the time of each import loop, for the supervisor.
+    """
     # Setup the channel access address list in order to connect to PVs
     os.environ['EPICS_CA_ADDR_LIST'] = CA.EPICS_CA_ADDR_LIST
 
-    # External PVs
-    external_pvs_configs = [MercuryPVs()]
+    # External PVs, only imported by the first shard
+    external_pvs_configs = [MercuryPVs()] if shard_index == 0 else []
     external_pvs_list = [y for x in external_pvs_configs for y in x.get_full_pv_list()]
 
     # Initialize and establish the database connection
-    initialize_database(name=HEDB.NAME, user=HEDB.USER, password=HEDB.PASS, host=HEDB.HOST)
+    initialize_database(name=HEDB.NAME, user=HEDB.USER, password=HEDB.PASS, host=HEDB.HOST,
+                        pool_size=HEDB.POOL_SIZE)
     db_connect()
     check_db_connection()
+    db_health.start()  # then track the DB health in the background
+
+    # Record the PV updates to replay them offline, if enabled
+    recorder = get_update_recorder(shard_index, shard_count)
+
+    # Import until stopped, starting over with the reloaded config when asked to reload it
+    while True:
+        this.reload_requested = False
+        import_pvs(shard_index, shard_count, heartbeat, external_pvs_configs, external_pvs_list, recorder)
+        if not this.reload_requested:
+            break
+        logger.info('Reloading the PV config.')
 
+    if recorder is not None:
+        recorder.close()
+    ca_context.disconnect()
+
+
+def import_pvs(shard_index, shard_count, heartbeat, external_pvs_configs, external_pvs_list, recorder):
+    """
+    Load the user configuration, and monitor and import its PVs until the import is stopped.
+    """
     # Get the user configuration and the list of measurement PVs
-    config = UserConfig()
+    config = UserConfig(shard_index, shard_count)
     pv_list = config.get_measurement_pvs(no_duplicates=True, full_names=True)
     logger.info(f'He Recovery PLC PVs to monitor: {pv_list}')
 
@@ -40,20 +179,80 @@ def main():
     logger.info(f'Non-PLC PVs to monitor: {external_pvs_list}')
     pv_list.extend(external_pvs_list)
 
+    # The monitor events to subscribe to, e.g. only archive deadband changes for noisy PVs
+    monitor_mask = get_monitor_mask(CA.MONITOR_EVENTS)
+
+    if PvImportConfig.ENGINE == ImportEngines.ASYNCIO:
+        # Monitoring, import loop and DB writes on one event loop, returns once the import is stopped
+        from HLM_PV_Import.async_import import AsyncPvMonitors, AsyncPvImport  # only loads asyncio when used
+        pv_monitors = AsyncPvMonitors(pv_list, monitor_mask)
+        pv_monitors.recorder = recorder
+        this.pv_import = AsyncPvImport(pv_monitors, config, external_pvs_configs)
+        this.pv_import.heartbeat = heartbeat
+        this.pv_import.lease_manager = get_lease_manager(this.pv_import, shard_index, shard_count)
+        this.pv_import.run()
+        return
+
     # Set up monitoring and fetching of the PV data
-    pv_monitors = PvMonitors(pv_list)
+    pv_monitors = PvMonitors(pv_list, monitor_mask)
+    pv_monitors.recorder = recorder
+
+    measurement_writer = None
+    if PvImportConfig.WRITER_WORKERS:
+        # Add the measurements in parallel on the writer workers, instead of one by one in the import loop
+        measurement_writer = MeasurementWriter(PvImportConfig.WRITER_WORKERS)
+        measurement_writer.start()
 
     # Initialize and set-up the PV import in charge of preparing the PV data, handling logging periods & tasks,
     # running content checks for the user config, and looping through each record every few seconds to check for
     # records scheduled to be updated with a new measurement.
-    this.pv_import = PvImport(pv_monitors, config, external_pvs_configs)
+    this.pv_import = PvImport(pv_monitors, config, external_pvs_configs, measurement_writer)
+    this.pv_import.heartbeat = heartbeat
+    this.pv_import.lease_manager = get_lease_manager(this.pv_import, shard_index, shard_count)
 
     # Start the monitors and continuously store the PV data received on every update
     pv_monitors.start_monitors()
 
     # Start the PV Import main loop
     this.pv_import.start()
+    pv_monitors.stop_monitors()
+
+
+def get_update_recorder(shard_index, shard_count):
+    """
+    Get the recorder of the PV updates, if enabled. Each supervisor worker records to its own file.
+    """
+    if not CA.RECORD_UPDATES:
+        return None
+    path = CA.RECORD_UPDATES if shard_count == 1 else f'{CA.RECORD_UPDATES}.{shard_index}'
+    logger.info(f'Recording the PV updates to {path}')
+    return UpdateRecorder(path)
+
+
+def get_lease_manager(pv_import, shard_index, shard_count):
+    """
+    Get the lease manager sharing the objects with the other service instances using the DB, if enabled.
+    """
+    if not PvImportConfig.LEASES:
+        return None
+    create_lease_table()
+    # Instances only share the objects with the instances running the same shard
+    return LeaseManager(pv_import.get_lease_keys(), group=f'{shard_index}/{shard_count}')
+
+
+def stop():
+    """
+    Stop the supervisor and its workers, or the PV import, whichever is running.
+    """
+    this.reload_requested = False
+    if this.status_server is not None:
+        this.status_server.stop()
+    if this.supervisor is not None:
+        this.supervisor.stop()
+    elif this.pv_import is not None:
+        this.pv_import.stop()
 
 
 if __name__ == '__main__':
+    bootstrap()
     main()
@@ -0,0 +1,216 @@
+"""
+Asyncio import engine, running the PV monitoring, the import scheduling and the measurement writing on one event loop.
+Selected with the [PVImport] Engine setting.
+
+The coroutines of the engine classes are named apart from the methods of the threading engine classes they extend
+(e.g. start_monitors_async), rather than overriding them with coroutines.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from HLM_PV_Import.ca_wrapper import PvMonitors, MONITORED_PVS
+from HLM_PV_Import.pv_import import PvImport, LOOP_DURATION, EXTERNAL_PVS_TASK, EXTERNAL_PVS_UPDATE_INTERVAL
+from HLM_PV_Import.db_func import db_connect, add_measurement, get_obj_id_and_create_if_not_exist, get_object_types, \
+    get_object_display_formats, UNVALIDATED
+from HLM_PV_Import.db_health import DBUnavailableError
+from HLM_PV_Import.logger import logger
+from HLM_PV_Import.settings import PvImportConfig
+from HLM_PV_Import.tracing import tracer
+from HLM_PV_Import.clock import clock
+
+
+class AsyncPvMonitors(PvMonitors):
+    """
+    Monitor PV channels with the caproto asyncio client, storing the updates on the event loop.
+    """
+
+    def __init__(self, pv_name_list: list, monitor_mask=None):
+        super().__init__(pv_name_list, monitor_mask)
+        self.ctx = None  # The asyncio context has to be created on the running event loop, see start_monitors_async
+
+    async def start_monitors_async(self):
+        """
+        Subscribe to channel updates of all PVs in the name list.
+        """
+        # Only imported when this engine is used, so the threading engine doesn't load the asyncio client
+        from caproto.asyncio.client import Context
+
+        self.ctx = Context()
+        self._channel_data = await self.ctx.get_pvs(*self.pv_name_list)
+        for pv in self._channel_data:
+            callback = self._get_async_callback(self.get_handle(pv.name))
+            self._callbacks.append(callback)
+            sub = pv.subscribe(mask=self.monitor_mask)
+            sub.add_callback(callback)
+            self.subscriptions[pv.name] = sub
+        MONITORED_PVS.set(len(self.subscriptions))
+
+    def _get_async_callback(self, handle: int):
+        """
+        Returns:
+            (function): The subscription callback of the PV with the given handle, a coroutine function that caproto
+                awaits on the event loop, while it would run plain ones in its thread pool. Not a partial, which
+                caproto only recognises as a coroutine function from Python 3.8.
+        """
+
+        async def callback(sub, response):
+            self._callback_f(handle, sub, response)
+
+        return callback
+
+    async def stop_monitors_async(self):
+        """
+        Clear the subscriptions and disconnect the context.
+        """
+        for sub in self.subscriptions.values():
+            await sub.clear()
+        self.subscriptions.clear()
+        if self.ctx is not None:
+            await self.ctx.disconnect()
+
+
+class DbWriter:
+    """
+    Run the blocking DB functions on a dedicated thread, in the order they were called, so that the event loop
+    keeps handling PV updates while waiting for the DB.
+    """
+
+    def __init__(self):
+        # The peewee connection is per thread, so the writer thread opens its own
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db_writer', initializer=db_connect)
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Run a blocking function on the writer thread, after the ones called before.
+
+        Returns:
+            The function's return value.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def add_measurement(self, object_id, mea_values, validity=UNVALIDATED, mea_date=None):
+        return await self.call(add_measurement, object_id=object_id, mea_values=mea_values, validity=validity,
+                               mea_date=mea_date)
+
+    async def get_obj_id_and_create_if_not_exist(self, obj_name, obj_type, comment):
+        return await self.call(get_obj_id_and_create_if_not_exist, obj_name, obj_type, comment)
+
+    async def get_object_types(self, object_ids: list):
+        return await self.call(get_object_types, object_ids)
+
+    async def get_object_display_formats(self, object_ids: list):
+        return await self.call(get_object_display_formats, object_ids)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class AsyncPvImport(PvImport):
+    """
+    The PV import loop running as a coroutine, with the measurements written through a DbWriter.
+    """
+
+    def __init__(self, pv_monitors: AsyncPvMonitors, user_config, external_pvs_list: list, db_writer=None):
+        super().__init__(pv_monitors, user_config, external_pvs_list)
+        self.db_writer = db_writer if db_writer is not None else DbWriter()
+
+    def run(self):
+        """
+        Start the monitors and the PV data importing loop on a new event loop, and return when the import is stopped.
+        """
+        asyncio.run(self._run())
+
+    def start(self):
+        """
+        Starts the PV data importing loop, on its own event loop, see run.
+        """
+        self.run()
+
+    async def _run(self):
+        await self.pv_monitors.start_monitors_async()
+        try:
+            await self._import_loop()
+        finally:
+            await self.pv_monitors.stop_monitors_async()
+            await self.db_writer.call(self._release_leases)
+            self.db_writer.close()
+
+    async def _import_loop(self):
+        """
+        The PV data importing loop. The blocking calls (file checks, lease queries and the heartbeat) run on the DB
+        writer thread.
+        """
+        self.running = True  # in case it was previously stopped
+        logger.info('Running the PV import on the asyncio engine.')
+
+        while self.running:
+            await asyncio.sleep(PvImportConfig.LOOP_TIMER)
+            # Profilers follow the thread they are started in, so only the flag files are checked on the writer thread
+            tracer.poll(await self.db_writer.call(tracer.check_flags))
+
+            with LOOP_DURATION.time(), tracer.span('loop'):
+                await self.db_writer.call(self._renew_leases)
+                self._sweep_stale_pvs()
+
+                if self._db_available():
+                    try:
+                        # Helium Recovery PLC Measurements
+                        await self._import_objects_async()
+
+                        # External (Non-PLC) Measurements
+                        await self._import_external_pvs_async()
+                    except DBUnavailableError as e:
+                        logger.warning(f'{e} The due measurements will be added once it is available.')
+
+            await self.db_writer.call(self._beat)
+
+    async def _import_objects_async(self):
+        """
+        Add a measurement for each configured object whose logging period has passed.
+        """
+        mea_date = clock.now()
+        measurements = list(self._get_due_objects_measurements())
+        if PvImportConfig.CALIBRATION and measurements:
+            with tracer.span('calibrate'):
+                await self._calibrate_async(measurements)
+        validity = [UNVALIDATED] * len(measurements)
+        if PvImportConfig.VALIDATION and measurements:
+            with tracer.span('validate'):
+                validity = await self._validate_async(measurements)
+
+        for (object_id, mea_values), mea_validity in zip(measurements, validity):
+            with tracer.span('insert'):
+                await self.db_writer.add_measurement(object_id=object_id, mea_values=mea_values, validity=mea_validity,
+                                                     mea_date=mea_date)
+            self._schedule_next_measurement(object_id)
+
+    async def _calibrate_async(self, measurements: list):
+        missing_objects = self.calibrations.get_missing_objects(object_id for object_id, _ in measurements)
+        if missing_objects:
+            self.calibrations.add_objects(missing_objects, await self.db_writer.get_object_types(missing_objects))
+        self.calibrations.apply(measurements)
+
+    async def _validate_async(self, measurements: list):
+        missing_objects = self.limits.get_missing_objects(object_id for object_id, _ in measurements)
+        if missing_objects:
+            self.limits.add_objects(missing_objects, await self.db_writer.get_object_display_formats(missing_objects))
+        return self.limits.validate(measurements)
+
+    async def _import_external_pvs_async(self):
+        """
+        Add measurements for the external PVs objects, every 'EXTERNAL_PVS_UPDATE_INTERVAL' seconds.
+        """
+        if self.tasks[EXTERNAL_PVS_TASK] > clock.time() or not self._is_leased(EXTERNAL_PVS_TASK):
+            return
+
+        mea_date = clock.now()
+        for obj_name, objects_type, comment, mea_values in self._get_external_measurements():
+            with tracer.span('lookup'):
+                obj_id = await self.db_writer.get_obj_id_and_create_if_not_exist(obj_name, objects_type, comment)
+
+            with tracer.span('insert'):
+                await self.db_writer.add_measurement(object_id=obj_id, mea_values=mea_values, mea_date=mea_date)
+
+        # noinspection PyTypeChecker
+        self.tasks[EXTERNAL_PVS_TASK] = clock.time() + EXTERNAL_PVS_UPDATE_INTERVAL
@@ -0,0 +1,397 @@
+"""
+Backfill the measurements of the configured objects from archived PV values, e.g. to fill the gap left by an outage or
+to load the history of a newly added vessel. Reads EPICS Archiver Appliance CSV exports (secs, val, sevr, stat, nanos
+rows, one file per PV), samples the measurement PVs of each object in pv_config.json every logging period, like the
+import does, and adds the measurements in batches, calibrated and validated if the service settings enable it. The
+measurements of an object less than half a logging period away from one already in the DB (e.g. added by the import, or
+by a previous backfill) are skipped. Uses the service's DB and PV configuration unless given others.
+
+Example: `python -m HLM_PV_Import.backfill --start 2021-03-01 --end 2021-03-04 TE:NDW1801:HA:HLM:LVL1=lvl1.csv`
+"""
+import argparse
+import bisect
+import csv
+import heapq
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from HLM_PV_Import.calibration import ObjectCalibrations
+from HLM_PV_Import.db_func import get_measurement_object, insert_measurement_rows, calculate_gas_counter_litres, \
+    get_object_types, get_object_display_formats, UNVALIDATED
+from HLM_PV_Import.pv_statistics import PvStatistics
+from HLM_PV_Import.validation import ObjectLimits
+from shared.const import PVConfig, MeaStatistics, DBClassIDs
+from shared.db_models import database, initialize_database_from_option, GamMeasurement
+
+CHUNK_SIZE = 5000  # measurements added per transaction
+INVALID_SEVERITY = 3  # alarm severity from which archived samples have no valid value, e.g. while disconnected
+ONE_MINUTE_IN_SECONDS = 60
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_archiver_csv(path: str, pv_name: str):
+    """
+    Read the samples of an archived PV, skipping the rows that aren't samples (e.g. headers) or have non-numeric
+    values.
+
+    Yields:
+        (tuple): The Unix time of the sample, the PV name and the value, None if the sample is invalid.
+    """
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            try:
+                timestamp = float(row[0]) + (int(row[4]) / 1e9 if len(row) > 4 else 0)
+                invalid = len(row) > 2 and int(row[2]) >= INVALID_SEVERITY
+                value = None if invalid else float(row[1])
+            except (ValueError, IndexError):
+                continue
+            yield timestamp, pv_name, value
+
+
+def read_archives(archives: dict):
+    """
+    Merge the samples of the archived PVs by time, keeping one row per file in memory.
+
+    Args:
+        archives (dict): The archive file path of each PV.
+
+    Yields:
+        (tuple): See read_archiver_csv.
+    """
+    yield from heapq.merge(*(read_archiver_csv(path, pv_name) for pv_name, path in archives.items()))
+
+
+def get_config_entries(path: str):
+    """
+    Returns:
+        (list): The entries of the PV configuration file.
+    """
+    with open(path) as f:
+        return json.load(f)[PVConfig.ROOT]
+
+
+def matches_pv(archived_pv: str, config_pv: str):
+    """
+    Whether the archived (full) PV name is the configured PV, which may be without its prefix and domain.
+    """
+    return archived_pv == config_pv or archived_pv.endswith(f':{config_pv}')
+
+
+class Backfill:
+    """
+    Add the measurements of the configured objects from a time ordered stream of archived PV samples, holding each
+    PV's last value between samples. Each object is first measured a logging period after its first sample.
+    """
+
+    def __init__(self, entries: list, pv_names, start: datetime = None, end: datetime = None,
+                 chunk_size: int = CHUNK_SIZE, dry_run: bool = False, calibrate: bool = False, validate: bool = False):
+        """
+        Args:
+            entries (list): The PV configuration entries, the ones without any of the archived PVs are ignored.
+            pv_names (iterable): The names of the archived PVs.
+            start (datetime, optional): Only add the measurements from this time.
+            end (datetime, optional): Only add the measurements before this time.
+            chunk_size (int, optional): The number of measurements added per transaction.
+            dry_run (bool, optional): Count the measurements without adding them.
+            calibrate (bool, optional): Calibrate the values with the calibrations of the objects types.
+            validate (bool, optional): Check the values against the limits of their display formats.
+        """
+        self.start = start.timestamp() if start else None
+        self.end = end.timestamp() if end else None
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.calibrations = ObjectCalibrations() if calibrate else None
+        self.limits = ObjectLimits() if validate else None
+        self.samples_read = 0
+        self.measurements_added = 0
+        self.measurements_skipped = 0  # the measurements already in the DB
+
+        self.plans = {}  # the measurement number, archived PV and statistic of each measurement of each object
+        self.periods = {}  # the logging period of each object, in seconds
+        self.pv_objects = defaultdict(list)  # the objects and measurement numbers each archived PV is used for
+        for entry in entries:
+            object_id = entry[PVConfig.OBJ]
+            statistics = entry.get(PVConfig.STATS) or {}
+            plan = []
+            for mea_number, config_pv in entry[PVConfig.MEAS].items():
+                archived_pv = next((pv for pv in pv_names if config_pv and matches_pv(pv, config_pv)), None)
+                if archived_pv is None:
+                    continue
+                statistic = statistics.get(mea_number, MeaStatistics.LAST)
+                pv_statistics = PvStatistics() if statistic != MeaStatistics.LAST else None
+                plan.append((mea_number, archived_pv, statistic, pv_statistics))
+                self.pv_objects[archived_pv].append(object_id)
+            if plan:
+                self.plans[object_id] = plan
+                self.periods[object_id] = entry[PVConfig.LOG_PERIOD] * ONE_MINUTE_IN_SECONDS
+
+        self._values = {}  # the last value of each archived PV
+        self._due = []  # heap of the next measurement time of each object
+        self._scheduled = set()
+        self._mea_objects = {}  # see get_measurement_object, for each object
+        self._last_revolutions = {}  # the last measurement value 1 of each gas counter measurement object
+        self._gas_counter_dates = {}  # the first and last backfilled measurement date of each gas counter object
+        self._measurements = []  # the object ID, time and values of the measurements waiting to be added
+        self._started = None
+
+    def run(self, samples):
+        """
+        Add the measurements for the samples, printing the progress after each chunk.
+
+        Args:
+            samples (iterable): The samples in time order, see read_archives.
+        """
+        self._started = time.perf_counter()
+        timestamp = None
+        for timestamp, pv_name, value in samples:
+            self._measure_due_objects(until=timestamp)
+            self.samples_read += 1
+            self._values[pv_name] = value
+            for object_id in self.pv_objects.get(pv_name, ()):
+                if value is not None:
+                    for _, archived_pv, _, pv_statistics in self.plans[object_id]:
+                        if archived_pv == pv_name and pv_statistics is not None:
+                            pv_statistics.add(value)
+                if object_id not in self._scheduled:
+                    self._scheduled.add(object_id)
+                    heapq.heappush(self._due, (timestamp + self.periods[object_id], object_id))
+
+        if timestamp is not None:
+            self._measure_due_objects(until=timestamp, inclusive=True)
+        self._flush()
+        if not self.dry_run:
+            self._recalculate_gas_counter_litres()
+
+    def _measure_due_objects(self, until: float, inclusive: bool = False):
+        """
+        Measure the objects whose measurement time is before the given time, and schedule their next measurements.
+        """
+        while self._due and (self._due[0][0] < until or inclusive and self._due[0][0] == until):
+            measurement_time, object_id = heapq.heappop(self._due)
+            heapq.heappush(self._due, (measurement_time + self.periods[object_id], object_id))
+
+            mea_values = self._get_mea_values(object_id)
+            if all(value is None for value in mea_values.values()):
+                continue
+            if self.start is not None and measurement_time < self.start:
+                continue
+            if self.end is not None and measurement_time >= self.end:
+                continue
+            self._add_measurement(object_id, measurement_time, mea_values)
+
+    def _get_mea_values(self, object_id: int):
+        mea_values = defaultdict(lambda: None)
+        for mea_number, archived_pv, statistic, pv_statistics in self.plans[object_id]:
+            pv_value = self._values.get(archived_pv)
+            if pv_statistics is not None:
+                statistics = pv_statistics.take()
+                # Without samples since the last measurement, the PV is still at its last value
+                if statistics[MeaStatistics.COUNT] or statistic == MeaStatistics.COUNT:
+                    pv_value = statistics[statistic]
+            mea_values[mea_number] = pv_value
+        return mea_values
+
+    def _add_measurement(self, object_id: int, measurement_time: float, mea_values: dict):
+        self._measurements.append((object_id, measurement_time, mea_values))
+        if len(self._measurements) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        rows = self._get_rows(self._measurements)
+        self._measurements = []
+        if not self.dry_run and rows:
+            with database.atomic():
+                insert_measurement_rows(rows)
+        self.measurements_added += len(rows)
+        last_date = rows[-1][1] if rows else '-'
+
+        elapsed = time.perf_counter() - self._started
+        print(f'{self.samples_read} samples read, {self.measurements_added} measurements '
+              f'{"counted" if self.dry_run else "added"} ({self.measurements_skipped} already in the DB skipped), '
+              f'up to {last_date} ({self.samples_read / elapsed if elapsed else 0:.0f} samples/s)')
+
+    def _get_rows(self, measurements: list):
+        """
+        Get the rows of the measurements not already in the DB, calibrated and validated if enabled, in the order of
+        the MEASUREMENT_INSERT_COLUMNS.
+        """
+        missing_objects = list({object_id for object_id, _, _ in measurements} - set(self._mea_objects))
+        for object_id in missing_objects:
+            self._mea_objects[object_id] = get_measurement_object(object_id)
+        measurements = self._skip_existing(measurements)
+
+        object_measurements = [(object_id, mea_values) for object_id, _, mea_values in measurements]
+        if self.calibrations is not None and object_measurements:
+            missing_objects = self.calibrations.get_missing_objects(self.plans)
+            if missing_objects:
+                self.calibrations.add_objects(missing_objects, get_object_types(missing_objects))
+            self.calibrations.apply(object_measurements)
+        validity = [UNVALIDATED] * len(measurements)
+        if self.limits is not None and object_measurements:
+            missing_objects = self.limits.get_missing_objects(self.plans)
+            if missing_objects:
+                self.limits.add_objects(missing_objects, get_object_display_formats(missing_objects))
+            validity = self.limits.validate(object_measurements)
+
+        return [self._get_row(object_id, measurement_time, mea_values, mea_validity)
+                for (object_id, measurement_time, mea_values), mea_validity in zip(measurements, validity)]
+
+    def _skip_existing(self, measurements: list):
+        """
+        Skip the measurements of the objects that already have one in the DB less than half a logging period away,
+        so that a time range the import ran in, or that was already backfilled, doesn't get the measurements twice.
+
+        Returns:
+            (list): The measurements to add.
+        """
+        if not measurements:
+            return measurements
+        margins = {object_id: self.periods[object_id] / 2 for object_id, _, _ in measurements}
+        first = min(measurement_time - margins[object_id] for object_id, measurement_time, _ in measurements)
+        last = max(measurement_time + margins[object_id] for object_id, measurement_time, _ in measurements)
+        mea_object_ids = {self._mea_objects[object_id][2] for object_id in margins}
+
+        existing = defaultdict(list)  # the measurement times in the DB of each measurement object, in order
+        for mea_object_id, mea_date in (GamMeasurement
+                                        .select(GamMeasurement.mea_object, GamMeasurement.mea_date)
+                                        .where(GamMeasurement.mea_object.in_(mea_object_ids),
+                                               GamMeasurement.mea_date.between(_format_date(first),
+                                                                               _format_date(last)))
+                                        .order_by(GamMeasurement.mea_date)
+                                        .tuples()):
+            existing[mea_object_id].append(mea_date.timestamp())
+
+        to_add = []
+        for object_id, measurement_time, mea_values in measurements:
+            times = existing.get(self._mea_objects[object_id][2], [])
+            index = bisect.bisect_left(times, measurement_time - margins[object_id])
+            if index < len(times) and times[index] < measurement_time + margins[object_id]:
+                self.measurements_skipped += 1
+                continue
+            to_add.append((object_id, measurement_time, mea_values))
+        return to_add
+
+    def _get_row(self, object_id: int, measurement_time: float, mea_values: dict, validity: tuple):
+        _, obj_class_id, mea_object_id, mea_comment = self._mea_objects[object_id]
+        mea_date = _format_date(measurement_time)
+        mea_valid, mea_status = validity
+
+        if obj_class_id == DBClassIDs.GAS_COUNTER and mea_values['1'] is not None:
+            if mea_object_id not in self._last_revolutions:
+                self._last_revolutions[mea_object_id] = _get_previous_value1(mea_object_id, mea_date)
+            last_revolutions = self._last_revolutions[mea_object_id]
+            if last_revolutions is not None:
+                mea_values['5'] = calculate_gas_counter_litres(mea_values['1'], last_revolutions)
+            self._last_revolutions[mea_object_id] = mea_values['1']
+            first_date, _ = self._gas_counter_dates.get(mea_object_id, (mea_date, None))
+            self._gas_counter_dates[mea_object_id] = (first_date, mea_date)
+
+        return (mea_object_id, mea_date, mea_date, mea_comment, mea_values['1'], mea_values['2'], mea_values['3'],
+                mea_values['4'], mea_values['5'], mea_valid, mea_status, 0)
+
+    def _recalculate_gas_counter_litres(self):
+        """
+        Recalculate the litres of the gas counters measurements from the first one backfilled to the first one after
+        the backfilled ones, in date order. The measurements already added in between or right after, e.g. by the
+        import once it resumed after an outage, otherwise count the litres of the backfilled revolutions again.
+        """
+        for mea_object_id, (first_date, last_date) in self._gas_counter_dates.items():
+            with database.atomic():
+                updated = recalculate_gas_counter_litres(mea_object_id, first_date, last_date)
+            if updated:
+                print(f'Recalculated the litres of {updated} measurements of gas counter {mea_object_id}')
+        self._gas_counter_dates.clear()
+
+
+def recalculate_gas_counter_litres(mea_object_id: int, first_date: str, last_date: str):
+    """
+    Recalculate the litres of the gas counter measurements from the given dates, and of the first one after them,
+    each from the revolutions of the previous measurement by date.
+
+    Returns:
+        (int): The number of measurements whose litres changed.
+    """
+    fields = (GamMeasurement.mea_id, GamMeasurement.mea_value1, GamMeasurement.mea_value5)
+    order = (GamMeasurement.mea_date, GamMeasurement.mea_id)
+    of_object = GamMeasurement.mea_object == mea_object_id
+    measurements = list(GamMeasurement.select(*fields)
+                        .where(of_object & GamMeasurement.mea_date.between(first_date, last_date))
+                        .order_by(*order).tuples())
+    measurements += list(GamMeasurement.select(*fields)
+                         .where(of_object & (GamMeasurement.mea_date > last_date))
+                         .order_by(*order).limit(1).tuples())
+
+    updated = 0
+    last_revolutions = _get_previous_value1(mea_object_id, first_date)
+    for mea_id, revolutions, litres in measurements:
+        if revolutions is None:
+            continue
+        if last_revolutions is not None:
+            new_litres = calculate_gas_counter_litres(float(revolutions), last_revolutions)
+            if litres is None or float(litres) != new_litres:
+                GamMeasurement.update(mea_value5=new_litres).where(GamMeasurement.mea_id == mea_id).execute()
+                updated += 1
+        last_revolutions = float(revolutions)
+    return updated
+
+
+def _format_date(timestamp: float):
+    return datetime.fromtimestamp(timestamp).strftime(DATE_FORMAT)
+
+
+def _get_previous_value1(mea_object_id: int, mea_date: str):
+    """
+    Returns:
+        (float): The value 1 of the last measurement of the object before the date, None if there isn't one.
+    """
+    previous = (GamMeasurement.select(GamMeasurement.mea_value1)
+                .where((GamMeasurement.mea_object == mea_object_id) & (GamMeasurement.mea_date < mea_date))
+                .order_by(GamMeasurement.mea_date.desc(), GamMeasurement.mea_id.desc())
+                .first())
+    return float(previous.mea_value1) if previous is not None and previous.mea_value1 is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('archives', nargs='+', metavar='PV=FILE', help='the archive CSV file of each PV')
+    parser.add_argument('--start', type=datetime.fromisoformat, help='only add the measurements from this time')
+    parser.add_argument('--end', type=datetime.fromisoformat, help='only add the measurements before this time')
+    parser.add_argument('--config', help='PV configuration file to use instead of the service one')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='measurements added per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='count the measurements without adding them')
+    parser.add_argument('--mysql', metavar='USER:PASS@HOST/NAME', help='DB to add to instead of the service DB')
+    args = parser.parse_args()
+
+    archives = {}
+    for archive in args.archives:
+        pv_name, separator, path = archive.partition('=')
+        if not separator:
+            parser.error(f'expected PV=FILE, got {archive}')
+        archives[pv_name] = path
+
+    initialize_database_from_option(args.mysql)
+
+    if args.config:
+        config_path = args.config
+    else:
+        from HLM_PV_Import.settings import PVConfig as ServicePVConfig
+        config_path = ServicePVConfig.PATH
+
+    from HLM_PV_Import.settings import PvImportConfig  # calibrate and validate as the service does
+    backfill = Backfill(get_config_entries(config_path), archives, start=args.start, end=args.end,
+                        chunk_size=args.chunk_size, dry_run=args.dry_run, calibrate=PvImportConfig.CALIBRATION,
+                        validate=PvImportConfig.VALIDATION)
+    unused = set(archives) - set(backfill.pv_objects)
+    if unused:
+        print(f'PVs not in the configuration, ignored: {", ".join(sorted(unused))}')
+    if not backfill.plans:
+        parser.error('none of the PVs are in the configuration')
+    print(f'Backfilling objects {", ".join(str(object_id) for object_id in backfill.plans)}.')
+
+    backfill.run(read_archives({pv_name: path for pv_name, path in archives.items() if pv_name in backfill.pv_objects}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Record the PV monitor updates to a compact binary file, and replay them into PvMonitors at the recorded pace or
+faster, to reproduce a production load offline, e.g. to benchmark or profile the import against real traffic.
+Recording is enabled with the [ChannelAccess] RecordUpdates setting.
+
+The file starts with FILE_HEADER, followed by records starting with their one-byte type. The first update of each PV
+is preceded by a name record, giving the PV the next ID. Update records have the PV ID, the Unix time of the update
+and its value, a float, an integer or a string.
+"""
+import numbers
+import struct
+import threading
+import time
+
+FILE_HEADER = b'HLMCAREC1\n'
+MIN_REPLAY_WAIT = 0.001  # seconds, updates due sooner than this are replayed without waiting
+
+_NAME = struct.Struct('<cH')  # type, name length, followed by the name
+_FLOAT = struct.Struct('<cIdd')  # type, PV ID, time, value
+_INT = struct.Struct('<cIdq')
+_BYTES = struct.Struct('<cIdH')  # type, PV ID, time, value length, followed by the value
+_NAME_RECORD, _FLOAT_RECORD, _INT_RECORD, _BYTES_RECORD = b'N', b'F', b'I', b'S'
+
+
+class RecordingError(ValueError):
+    """
+    The file is not a recording, or is corrupt.
+    """
+
+
+class UpdateRecorder:
+    """
+    Write the updates passed to the PvMonitors callback to a recording file. Can be called from any thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.updates_recorded = 0
+        self._file = open(path, 'wb')
+        self._file.write(FILE_HEADER)
+        self._ids = {}  # PV name and its ID in the file
+        self._lock = threading.Lock()
+
+    def record(self, pv_name: str, response, timestamp: float = None):
+        """
+        Record the first value of the update response, if it is a number or a string.
+
+        Args:
+            pv_name (str): The full PV name.
+            response (caproto._commands.EventAddResponse): The update response.
+            timestamp (float, optional): The Unix time of the update, now if not given.
+        """
+        try:
+            value = response.data[0]
+        except (IndexError, TypeError):
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+
+        with self._lock:
+            if self._file.closed:
+                return
+            pv_id = self._ids.get(pv_name)
+            if pv_id is None:
+                pv_id = self._ids[pv_name] = len(self._ids)
+                name = pv_name.encode()
+                self._file.write(_NAME.pack(_NAME_RECORD, len(name)) + name)
+
+            if isinstance(value, numbers.Integral) and -2 ** 63 <= value < 2 ** 63:
+                self._file.write(_INT.pack(_INT_RECORD, pv_id, timestamp, value))
+            elif isinstance(value, numbers.Real):
+                self._file.write(_FLOAT.pack(_FLOAT_RECORD, pv_id, timestamp, value))
+            elif isinstance(value, (bytes, str)):
+                value = value.encode() if isinstance(value, str) else value
+                self._file.write(_BYTES.pack(_BYTES_RECORD, pv_id, timestamp, len(value)) + value)
+            else:
+                return
+            self.updates_recorded += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path: str):
+    """
+    Read the updates of a recording, in the order they were recorded. Strings are read as bytes, as received.
+
+    Yields:
+        (tuple): The Unix time of the update, the PV name and the value.
+
+    Raises:
+        RecordingError: If the file is not a recording or is corrupt.
+    """
+    names = []
+    with open(path, 'rb') as f:
+        if f.read(len(FILE_HEADER)) != FILE_HEADER:
+            raise RecordingError(f'{path} is not a PV updates recording.')
+        read = f.read
+        while True:
+            record_type = read(1)
+            if not record_type:
+                return
+            try:
+                if record_type == _FLOAT_RECORD:
+                    _, pv_id, timestamp, value = _FLOAT.unpack(record_type + read(_FLOAT.size - 1))
+                elif record_type == _INT_RECORD:
+                    _, pv_id, timestamp, value = _INT.unpack(record_type + read(_INT.size - 1))
+                elif record_type == _BYTES_RECORD:
+                    _, pv_id, timestamp, length = _BYTES.unpack(record_type + read(_BYTES.size - 1))
+                    value = read(length)
+                elif record_type == _NAME_RECORD:
+                    _, length = _NAME.unpack(record_type + read(_NAME.size - 1))
+                    names.append(read(length).decode())
+                    continue
+                else:
+                    raise RecordingError(f'Unknown record type {record_type!r} in {path}.')
+                yield timestamp, names[pv_id], value
+            except (struct.error, IndexError):
+                return  # the last record was cut short, e.g. the service was stopped while writing it
+
+
+def get_recorded_pv_names(path: str):
+    """
+    Returns:
+        (list): The names of the PVs with updates in the recording, in the order of their first update.
+    """
+    names = {}
+    for _, pv_name, _ in read_recording(path):
+        names.setdefault(pv_name)
+    return list(names)
+
+
+class _ReplayPV:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _ReplaySubscription:
+    __slots__ = ('pv',)
+
+    def __init__(self, name):
+        self.pv = _ReplayPV(name)
+
+
+class _ReplayResponse:
+    __slots__ = ('data',)
+
+    def __init__(self, value):
+        self.data = [value]
+
+
+class ReplaySource:
+    """
+    Feed the updates of a recording to the PvMonitors callback, as if received from the PVs, instead of subscribing
+    to the PVs with start_monitors.
+    """
+
+    def __init__(self, path: str, pv_monitors, speed: float = 1.0, rename=None):
+        """
+        Args:
+            path (str): The recording file.
+            pv_monitors (PvMonitors): The monitors to feed the updates to.
+            speed (float, optional): The replay speed relative to the recording, e.g. 10 to replay ten times faster.
+                If 0, the updates are replayed as fast as possible.
+            rename (callable, optional): Gets the name of the monitored PV from the recorded PV name.
+        """
+        self.path = path
+        self.pv_monitors = pv_monitors
+        self.speed = speed
+        self.rename = rename
+        self.updates_replayed = 0
+        self._subscriptions = {}  # recorded PV name and the handle and subscription of the monitored PV
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run(self):
+        """
+        Replay the recording, returning when done or stopped.
+        """
+        callback = self.pv_monitors._callback_f
+        started = time.monotonic()
+        first_timestamp = None
+        for timestamp, pv_name, value in read_recording(self.path):
+            if self._stop.is_set():
+                break
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            if self.speed:
+                wait = started + (timestamp - first_timestamp) / self.speed - time.monotonic()
+                if wait > MIN_REPLAY_WAIT and self._stop.wait(wait):
+                    break
+
+            subscription = self._subscriptions.get(pv_name)
+            if subscription is None:
+                name = self.rename(pv_name) if self.rename is not None else pv_name
+                subscription = self._subscriptions[pv_name] = (self.pv_monitors.get_handle(name),
+                                                               _ReplaySubscription(name))
+            handle, sub = subscription
+            callback(handle, sub, _ReplayResponse(value))
+            self.updates_replayed += 1
+
+    def start(self):
+        """
+        Replay the recording in the background.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='ca_replay', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -2,24 +2,36 @@
 Wrap caproto to give utilities methods for access in one place
 """
 import json
+import threading
 import time
+from functools import partial
 
-from caproto.threading.client import Context
-from caproto.sync.client import read
-from caproto import CaprotoError
+import numpy as np
+from caproto import CaprotoError, SubscriptionType
 
+from HLM_PV_Import.clock import clock
 from HLM_PV_Import.logger import pv_logger, logger
+from HLM_PV_Import.metrics import registry
+from HLM_PV_Import.pv_statistics import PvStatistics
 from HLM_PV_Import.settings import CA
 from HLM_PV_Import.utils import dehex_and_decompress, ints_to_string
-
-# Default timeout for reading a PV
-TIMEOUT = CA.CONN_TIMEOUT
-
-# time in s after which PV data is considered stale and will no longer be considered when adding a measurement
-STALE_AGE = CA.STALE_AFTER
+from shared.ca_context import ca_context
 
 # PV that contains the instrument list
 INST_LIST_PV = "CS:INSTLIST"
+CONNECTION_CHECK_INTERVAL = 0.1  # seconds between checks of whether all the PVs connected
+
+# Monitor event names, as used in the MonitorEvents setting, and their subscription mask bits
+MONITOR_EVENTS = {
+    'value': SubscriptionType.DBE_VALUE,  # value changes outside of the monitor deadband (MDEL)
+    'log': SubscriptionType.DBE_LOG,  # value changes outside of the archive deadband (ADEL)
+    'alarm': SubscriptionType.DBE_ALARM,
+    'property': SubscriptionType.DBE_PROPERTY
+}
+
+CA_UPDATES = registry.counter('hlm_ca_updates_total', 'Number of CA monitor updates received.')
+MONITORED_PVS = registry.gauge('hlm_monitored_pvs', 'Number of PVs subscribed to.')
+STALE_TRANSITIONS = registry.counter('hlm_stale_pv_transitions_total', 'Number of times a PV became stale.')
 
 
 def get_instrument_list():
@@ -32,7 +44,7 @@ def get_instrument_list():
     err_msg = "Error getting instrument list:"
 
     try:
-        bytes_data = read(INST_LIST_PV).data
+        bytes_data = ca_context.read(INST_LIST_PV).data
         raw = ints_to_string([int(x) for x in bytes_data])
     except CaprotoError as e:
         logger.error(f"{err_msg} {e}")
@@ -48,74 +60,200 @@ def get_instrument_list():
     return full_inst_list
 
 
-def get_connected_pvs(pv_list, timeout=TIMEOUT):
+def get_monitor_mask(events: str):
     """
-    Returns a list of connected PVs from the given PV list.
+    Get the subscription mask for the given monitor events.
 
     Args:
-        pv_list (list): The full PV names list.
-        timeout (int, optional): PV connection timeout.
+        events (str): Comma-separated event names, see MONITOR_EVENTS.
 
     Returns:
-        (list): The connected PVs.
+        (SubscriptionType): The subscription mask.
+
+    Raises:
+        ValueError: If an event name is not valid.
     """
+    mask = SubscriptionType(0)
+    for event in events.split(','):
+        event = event.strip().lower()
+        if event not in MONITOR_EVENTS:
+            raise ValueError(f'Invalid monitor event "{event}", expected one of: {", ".join(MONITOR_EVENTS)}.')
+        mask |= MONITOR_EVENTS[event]
+    return mask
 
-    ctx = Context()
-    pvs = ctx.get_pvs(*pv_list, timeout=timeout)
-    time.sleep(timeout)
 
-    return [pv.name for pv in pvs if pv.connected]
+def get_connected_pvs(pv_list, timeout=None):
+    """
+    Returns a list of connected PVs from the given PV list, waiting until they all connect or the timeout passes.
+    The PVs channels stay open for a while, for the monitors to reuse.
+
+    Args:
+        pv_list (list): The full PV names list.
+        timeout (int, optional): PV connection timeout, Defaults to the ConnectionTimeout setting.
+
+    Returns:
+        (list): The connected PVs.
+    """
+    if timeout is None:
+        timeout = CA.CONN_TIMEOUT
+    pvs = ca_context.acquire_pvs(*pv_list, timeout=timeout)
+    try:
+        deadline = time.monotonic() + timeout
+        while not all(pv.connected for pv in pvs) and time.monotonic() < deadline:
+            time.sleep(CONNECTION_CHECK_INTERVAL)
+        return [pv.name for pv in pvs if pv.connected]
+    finally:
+        ca_context.release_pvs(pvs)
 
 
 class PvMonitors:
     """
     Monitor PV channels and continuously store updates data.
+
+    Each PV is given a handle, the index of its data in the responses list and last update times array. Only the
+    latest response of a PV is kept, and decoded when its value is read. The last update times are held in a NumPy
+    array allocated for the PVs to monitor, so that the stale PVs sweep compares all of them at once.
     """
 
-    def __init__(self, pv_name_list: list):
-        self.ctx = Context()
-        self._pv_data = {}  # full PV name and last update value
-        self._pv_last_update = {}  # full PV name and last update time
+    def __init__(self, pv_name_list: list, monitor_mask: SubscriptionType = None):
         self.pv_name_list = pv_name_list  # list of PVs to monitor
+        self.monitor_mask = monitor_mask  # events to subscribe to, caproto's default (value and alarm) if None
+        self._handles = {}  # full PV name and its handle
+        self._names = []  # full PV name of each handle
+        self._responses = []  # last update response of each handle
+        self._last_updates = np.zeros(len(pv_name_list))  # last update time of each handle, 0 if not updated yet
+        self._statistics = {}  # handle and the statistics accumulated from its updates, for PVs that need them
+        for pv_name in pv_name_list:
+            self.get_handle(pv_name)
         self.subscriptions = {}
+        self._callbacks = []  # caproto only keeps weak references to the callbacks
+        self._callback_tokens = {}  # PV name and the token of its subscription callback, to remove only ours
         self._channel_data = []
+        self._stale_handles = set()  # PVs whose data was found stale by the last sweep and not updated since
+        self._stale_lock = threading.Lock()
+        self.recorder = None  # UpdateRecorder writing every update to a file, see ca_recording
+
+    def get_handle(self, pv_name):
+        """
+        Get the handle of the PV, giving it one if it doesn't have one yet.
+
+        Args:
+            pv_name (str): The full PV name.
+
+        Returns:
+            (int): The PV handle.
+        """
+        handle = self._handles.get(pv_name)
+        if handle is None:
+            handle = len(self._names)
+            self._names.append(pv_name)
+            self._responses.append(None)
+            if handle == len(self._last_updates):
+                # Only grown for PVs added after the ones to monitor, which are not updated
+                self._last_updates = np.concatenate((self._last_updates, np.zeros(max(handle, 1))))
+            self._handles[pv_name] = handle
+        return handle
 
     def get_pv_data(self, pv_name):
-        return self._pv_data[pv_name]
+        handle = self._handles.get(pv_name)
+        if handle is None or not self._last_updates[handle]:
+            raise KeyError(pv_name)
+        return self._decode(self._responses[handle])
+
+    def get_values(self, handles: list):
+        """
+        Get the last update values of the PVs with the given handles.
+
+        Returns:
+            (list): The values, None for PVs which have not received updates yet.
+        """
+        return [self._decode(response) for response in map(self._responses.__getitem__, handles)]
+
+    @staticmethod
+    def _decode(response):
+        if response is None:
+            return None
+        value = response.data[0]
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def add_statistics(self, handle: int):
+        """
+        Start accumulating statistics of the updates of the PV with the given handle. The updates of these PVs are
+        decoded when received.
+
+        Returns:
+            (PvStatistics): The statistics, accumulated until taken.
+        """
+        statistics = PvStatistics()
+        self._statistics.setdefault(handle, []).append(statistics)
+        return statistics
+
+    def has_data(self, handle: int):
+        return bool(self._last_updates[handle])
 
-    def _callback_f(self, sub, response):
+    def _callback_f(self, handle, sub, response):
         """
-        Stash the PV Name/Value results in the data dictionary, and the Name/Last Update in another.
+        Stash the response and the time of the update under the PV handle, replacing the previous ones. The value is
+        only decoded when read, so updates that are replaced before being read cost no more than this.
 
         Args:
+            handle (int): The PV handle, bound when subscribing.
             sub (caproto.threading.client.Subscription): The subscription, also containing the pertinent PV
                                                             and its name.
             response (caproto._commands.EventAddResponse): The full response from the server, which includes data
                                                             and any metadata.
         """
-        value = response.data[0]
+        self._responses[handle] = response  # store the PV data
+        self._last_updates[handle] = clock.time()  # as well as the time of update
+        CA_UPDATES.inc()
+
+        statistics = self._statistics.get(handle)
+        if statistics is not None:
+            self._add_to_statistics(statistics, response)
 
-        if isinstance(value, bytes):
-            value = value.decode('utf-8')
+        if handle in self._stale_handles:
+            self._mark_fresh(handle)
 
-        name = sub.pv.name
-        self._pv_data[name] = value  # store the PV name and data
-        self._pv_last_update[name] = time.time()  # as well as the time of update
+        if self.recorder is not None:
+            self.recorder.record(self._names[handle], response)
+
+    def _add_to_statistics(self, statistics: list, response):
+        try:
+            value = float(self._decode(response))
+        except (TypeError, ValueError):
+            return  # not a number
+        for pv_statistics in statistics:
+            pv_statistics.add(value)
 
     def start_monitors(self):
         """
         Subscribe to channel updates of all PVs in the name list.
         """
-        self._channel_data = self.ctx.get_pvs(*self.pv_name_list)
+        self._channel_data = ca_context.acquire_pvs(*self.pv_name_list)
         for pv in self._channel_data:
-            sub = pv.subscribe()
-            sub.add_callback(self._callback_f)
+            callback = partial(self._callback_f, self.get_handle(pv.name))
+            self._callbacks.append(callback)
+            sub = pv.subscribe(mask=self.monitor_mask)
+            self._callback_tokens[pv.name] = sub.add_callback(callback)
             self.subscriptions[pv.name] = sub
+        MONITORED_PVS.set(len(self.subscriptions))
+
+    def stop_monitors(self):
+        """
+        Remove the subscription callbacks and release the PVs. The subscriptions of the shared context can have other
+        callbacks, so only ours are removed.
+        """
+        for pv_name, sub in self.subscriptions.items():
+            sub.remove_callback(self._callback_tokens.pop(pv_name))
+        self.subscriptions.clear()
+        self._callbacks.clear()
+        ca_context.release_pvs(self._channel_data)
+        self._channel_data = []
+        MONITORED_PVS.set(0)
 
     def pv_data_is_stale(self, pv_name):
         """
-        Checks whether a PVs data is stale or not, by looking at the time since its last update and the set length of
-        time after which a PV is considered stale.
+        Checks whether a PVs data is stale or not, as found by the last stale PVs sweep.
 
         Args:
             pv_name (str): The name of the PV.
@@ -123,12 +261,61 @@ class PvMonitors:
         Returns:
             (boolean): True if data is stale, False if not.
         """
-        time_since_last_update = self.get_time_since_last_update(pv_name)
-        if time_since_last_update >= STALE_AGE:
-            pv_logger.warning(f"Stale PV: '{pv_name}' has not received updates for "
+        return self._handles.get(pv_name) in self._stale_handles
+
+    def handle_is_stale(self, handle: int):
+        return handle in self._stale_handles
+
+    def get_stale_pvs(self):
+        """
+        Get the PVs whose data is currently stale.
+
+        Returns:
+            (set): The names of the stale PVs.
+        """
+        return {self._names[handle] for handle in list(self._stale_handles)}
+
+    def update_stale_pvs(self):
+        """
+        Sweep the PVs last update times and mark the ones which have not received updates for the set length of time
+        after which a PV is considered stale. Each PV is logged once when it becomes stale, and once when it receives
+        an update again. Meant to be called periodically, e.g. once per import loop.
+
+        Returns:
+            (set): The names of the PVs that became stale in this sweep.
+        """
+        now = clock.time()
+        stale_age = CA.STALE_AFTER  # time in s after which PV data is considered stale
+        last_updates = self._last_updates
+        became_stale = set()
+        for handle in np.flatnonzero((last_updates != 0) & (now - last_updates >= stale_age)).tolist():
+            if handle in self._stale_handles:
+                continue
+            with self._stale_lock:
+                # Re-check under the lock in case an update arrived in the meantime
+                last_update = self._last_updates[handle]
+                time_since_last_update = now - last_update
+                if time_since_last_update < stale_age:
+                    continue
+                self._stale_handles.add(handle)
+                # The callback doesn't take the lock, an update may have arrived after the check but been checked
+                # against the stale PVs before they had this one: check the time again now that it is added
+                if self._last_updates[handle] != last_update:
+                    self._stale_handles.discard(handle)
+                    continue
+            name = self._names[handle]
+            became_stale.add(name)
+            STALE_TRANSITIONS.inc()
+            pv_logger.warning(f"Stale PV: '{name}' has not received updates for "
                               f"{'{:.1f}'.format(time_since_last_update)} seconds.")
-            return True
-        return False
+        return became_stale
+
+    def _mark_fresh(self, handle):
+        with self._stale_lock:
+            if handle not in self._stale_handles:
+                return
+            self._stale_handles.discard(handle)
+        pv_logger.info(f"PV '{self._names[handle]}' is receiving updates again and is no longer stale.")
 
     def get_time_since_last_update(self, pv_name):
         """
@@ -140,4 +327,7 @@ class PvMonitors:
         Returns:
             (int): Time in seconds since last update
         """
-        return time.time() - self._pv_last_update[pv_name]
+        handle = self._handles.get(pv_name)
+        if handle is None or not self._last_updates[handle]:
+            raise KeyError(pv_name)
+        return clock.time() - self._last_updates[handle]
@@ -0,0 +1,164 @@
+"""
+Calibration curves of the object types (the OT_CALIB_* columns of gam_objecttype), converting the raw PV values of the
+objects' measurements before they are added. Enabled with the [PVImport] Calibration setting.
+
+A curve is a list of raw (x) and calibrated (y) value points. Values in between are linearly interpolated, and values
+outside of the curve get the calibrated value of its nearest end.
+"""
+import numbers
+import re
+
+import numpy as np
+
+from HLM_PV_Import.logger import logger
+
+CALIBRATED_MEASUREMENT = '1'  # the measurement number whose value is calibrated
+
+
+class CalibrationError(ValueError):
+    """
+    The calibration points of an object type are invalid.
+    """
+
+
+def parse_calibration_points(text: str):
+    """
+    Parse the values of a calibration points column, separated by semicolons (which allows decimal commas), or by
+    commas or whitespace.
+
+    Returns:
+        (numpy.ndarray): The values.
+
+    Raises:
+        CalibrationError: If a value is not a number.
+    """
+    text = text.strip()
+    if ';' in text:
+        values = [value.strip().replace(',', '.') for value in text.split(';')]
+    else:
+        values = re.split(r'[,\s]+', text)
+    try:
+        return np.array([float(value) for value in values if value], dtype=float)
+    except ValueError as e:
+        raise CalibrationError(f'Invalid calibration points: {text!r}.') from e
+
+
+class Calibration:
+    """
+    The calibration curve of an object type.
+    """
+    __slots__ = ('name', 'x', 'y')
+
+    def __init__(self, name: str, x, y):
+        """
+        Args:
+            name (str): The calibration name.
+            x (numpy.ndarray): The raw values of the points.
+            y (numpy.ndarray): The calibrated values of the points.
+
+        Raises:
+            CalibrationError: If there are less than 2 points, or two for the same raw value.
+        """
+        if len(x) != len(y) or len(x) < 2:
+            raise CalibrationError(f'Calibration {name} needs the same number of x and y points, at least 2, '
+                                   f'got {len(x)} and {len(y)}.')
+        order = np.argsort(x, kind='stable')
+        self.name = name
+        self.x = np.asarray(x, dtype=float)[order]
+        self.y = np.asarray(y, dtype=float)[order]
+        if np.any(np.diff(self.x) <= 0):
+            raise CalibrationError(f'Calibration {name} has more than one point for the same raw value.')
+
+    @classmethod
+    def from_object_type(cls, object_type):
+        """
+        Get the calibration of an object type.
+
+        Args:
+            object_type (GamObjecttype): The object type.
+
+        Returns:
+            (Calibration): The calibration, or None if the type doesn't have one.
+
+        Raises:
+            CalibrationError: If the calibration points of the type are invalid.
+        """
+        if not object_type.ot_calib_x or not object_type.ot_calib_y:
+            return None
+        name = object_type.ot_calib_name or object_type.ot_name
+        x = parse_calibration_points(object_type.ot_calib_x)
+        y = parse_calibration_points(object_type.ot_calib_y)
+        if object_type.ot_calib_npoints and object_type.ot_calib_npoints != len(x):
+            raise CalibrationError(f'Calibration {name} has {len(x)} points, expected {object_type.ot_calib_npoints}.')
+        return cls(name, x, y)
+
+    def apply(self, values):
+        """
+        Args:
+            values (numpy.ndarray): The raw values.
+
+        Returns:
+            (numpy.ndarray): The calibrated values.
+        """
+        return np.interp(values, self.x, self.y)
+
+
+class ObjectCalibrations:
+    """
+    The calibrations of the imported objects, parsed once per object type, applied to all the measurements of an
+    import loop at once.
+    """
+
+    def __init__(self):
+        self._calibrations = {}  # object ID and the calibration of its type, None if it doesn't have one
+        self._type_calibrations = {}  # object type ID and its calibration, None if it doesn't have one
+
+    def get_missing_objects(self, object_ids):
+        """
+        Returns:
+            (list): The IDs of the objects whose calibrations are not known yet.
+        """
+        return [object_id for object_id in object_ids if object_id not in self._calibrations]
+
+    def add_objects(self, object_ids, object_types: dict):
+        """
+        Add the calibrations of the objects.
+
+        Args:
+            object_ids (list): The object IDs.
+            object_types (dict): The object IDs and their types, see db_func.get_object_types. Objects not found don't
+                get a calibration.
+        """
+        for object_id in object_ids:
+            object_type = object_types.get(object_id)
+            if object_type is None:
+                self._calibrations[object_id] = None
+                continue
+            if object_type.ot_id not in self._type_calibrations:
+                try:
+                    self._type_calibrations[object_type.ot_id] = Calibration.from_object_type(object_type)
+                except CalibrationError as e:
+                    logger.error(f'Object type {object_type.ot_name} ({object_type.ot_id}): {e} Its objects '
+                                 f'measurements are not calibrated.')
+                    self._type_calibrations[object_type.ot_id] = None
+            self._calibrations[object_id] = self._type_calibrations[object_type.ot_id]
+
+    def apply(self, measurements: list):
+        """
+        Calibrate the raw values of the measurements, with one interpolation of all the values of each calibration.
+
+        Args:
+            measurements (list): The object ID and measurement values of each measurement, with the values updated
+                in place.
+        """
+        to_calibrate = {}  # calibration and the measurement values to calibrate with it
+        for object_id, mea_values in measurements:
+            calibration = self._calibrations.get(object_id)
+            if calibration is not None and isinstance(mea_values.get(CALIBRATED_MEASUREMENT), numbers.Real):
+                to_calibrate.setdefault(calibration, []).append(mea_values)
+
+        for calibration, mea_values_list in to_calibrate.items():
+            raw_values = np.fromiter((mea_values[CALIBRATED_MEASUREMENT] for mea_values in mea_values_list),
+                                     dtype=float, count=len(mea_values_list))
+            for mea_values, value in zip(mea_values_list, calibration.apply(raw_values).tolist()):
+                mea_values[CALIBRATED_MEASUREMENT] = value
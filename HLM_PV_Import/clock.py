@@ -0,0 +1,90 @@
+"""
+The clock the import reads the time from and waits with, the real one unless a simulated one is used, e.g. to run a
+day of the import schedule in seconds in tests.
+"""
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+
+
+class Clock:
+    """
+    The real time.
+    """
+    sleep = staticmethod(time.sleep)
+    now = staticmethod(datetime.now)
+    time = staticmethod(time.time)  # last, as it hides the time module in the rest of the class body
+
+
+class SimulatedClock(Clock):
+    """
+    A virtual time, only moving forward when slept on or advanced, running the callbacks scheduled in between at their
+    time. Sleeping returns right away, so the import runs as fast as it can with the time passing as if it had waited.
+    """
+
+    def __init__(self, start: float = None):
+        """
+        Args:
+            start (float, optional): The Unix time to start from, Defaults to now.
+        """
+        self._time = time.time() if start is None else start
+        self._scheduled = []  # heap of the time, order and callback of the scheduled callbacks
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self._time
+
+    def now(self):
+        return datetime.fromtimestamp(self._time)
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        """
+        Move the time forward, running the callbacks scheduled until then in order, each at its scheduled time.
+        """
+        end = self._time + max(seconds, 0)
+        while True:
+            with self._lock:
+                if not self._scheduled or self._scheduled[0][0] > end:
+                    break
+                scheduled_time, _, callback = heapq.heappop(self._scheduled)
+                self._time = max(self._time, scheduled_time)
+            callback()
+        self._time = end
+
+    def call_at(self, timestamp: float, callback):
+        """
+        Schedule the callback to be run when the time reaches the given Unix time.
+        """
+        with self._lock:
+            heapq.heappush(self._scheduled, (timestamp, next(self._order), callback))
+
+    def call_later(self, delay: float, callback):
+        self.call_at(self._time + delay, callback)
+
+
+class CurrentClock:
+    """
+    The clock used by the service modules. Its methods are the ones of the clock in use, so reading the time costs no
+    more than with the clock itself.
+    """
+
+    def __init__(self):
+        self.use(Clock())
+
+    def use(self, clock: Clock):
+        """
+        Use the given clock from now on, e.g. a SimulatedClock.
+        """
+        self.clock = clock
+        self.time = clock.time
+        self.sleep = clock.sleep
+        self.now = clock.now
+
+
+clock = CurrentClock()
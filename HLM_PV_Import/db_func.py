@@ -3,20 +3,31 @@ import time
 from datetime import datetime
 from functools import wraps
 
-from peewee import DoesNotExist
+from peewee import DoesNotExist, OperationalError, InterfaceError, __exception_wrapper__
 
 from shared.const import DBTypeIDs, DBClassIDs
 from shared.db_models import *
-from shared.utils import get_object_module
+from shared.utils import find_object_module
 from HLM_PV_Import.logger import logger, db_logger, log_exception
+from HLM_PV_Import.metrics import registry
+from HLM_PV_Import.tracing import tracer
+from HLM_PV_Import.clock import clock
+from HLM_PV_Import.db_health import db_health, probe_connection, increase_reconnect_wait_time, RECONNECT_WAIT, \
+    RECONNECT_ATTEMPTS, DBUnavailableError, is_connection_error
 
 RECONNECT_ATTEMPTS_MAX = 1000
-RECONNECT_WAIT = 5  # base wait time between attempts in seconds
-RECONNECT_MAX_WAIT_TIME = 14400  # maximum wait time between attempts, in sec
 
+MEASUREMENTS_ADDED = registry.counter('hlm_measurements_added_total', 'Number of measurements added to the DB.')
+INSERT_LATENCY = registry.histogram('hlm_db_insert_seconds', 'Time taken to add a measurement, including lookups.')
+LAST_INSERT_TIME = registry.gauge('hlm_db_last_insert_timestamp_seconds', 'Unix time of the last added measurement.')
+BATCH_INSERT_LATENCY = registry.histogram('hlm_db_batch_insert_seconds',
+                                          'Time taken to add a batch of measurements, including lookups.')
 
-def increase_reconnect_wait_time(current_wait):  # increasing wait time in s between attempts for each failed attempt
-    return current_wait*2 if current_wait*2 < RECONNECT_MAX_WAIT_TIME else RECONNECT_MAX_WAIT_TIME
+# The GamMeasurement fields set by the batch insert, in the order of its parameters
+MEASUREMENT_INSERT_COLUMNS = ('mea_object', 'mea_date', 'mea_date2', 'mea_comment', 'mea_value1', 'mea_value2',
+                              'mea_value3', 'mea_value4', 'mea_value5', 'mea_valid', 'mea_status', 'mea_bookingcode')
+
+UNVALIDATED = (1, None)  # the MEA_VALID and MEA_STATUS of the measurements not checked against their limits
 
 
 def db_connect():
@@ -28,35 +39,45 @@ def db_connect():
         log_exception(*sys.exc_info())
 
 
-def check_db_connection(attempt: int = 1, wait_until_reconnect: int = RECONNECT_WAIT):
+def check_db_connection(wait_until_reconnect: int = RECONNECT_WAIT):
     """
-    Check if DB is connected, and if not re-attempt to establish a connection.
-    With each attempt, the interval between attempts will increase.
+    Check if DB is connected, and if not re-attempt to establish a connection, up to RECONNECT_ATTEMPTS_MAX times.
+    With each attempt, the interval between attempts will increase. Meant for the start-up, after which the DB health
+    is tracked by db_health.
     """
-    if database.is_connection_usable():
-        return True
-    elif attempt > RECONNECT_ATTEMPTS_MAX:
-        conn_aborted = 'Connection to the database was lost and could not be re-established.'
-        logger.error(conn_aborted)
-        raise Exception(conn_aborted)
-    else:
+    attempt = 1
+    while not probe_connection():
+        if attempt > RECONNECT_ATTEMPTS_MAX:
+            conn_aborted = 'Connection to the database was lost and could not be re-established.'
+            logger.error(conn_aborted)
+            raise Exception(conn_aborted)
         logger.error(f'Connection to the database could not be established, re-attempting to connect in '
                      f'{wait_until_reconnect}s. (Attempt: {attempt})')
         time.sleep(wait_until_reconnect)
-        time_until_next_reconnect = increase_reconnect_wait_time(current_wait=wait_until_reconnect)
-        db_connect()
-        check_db_connection(attempt=attempt + 1, wait_until_reconnect=time_until_next_reconnect)
+        RECONNECT_ATTEMPTS.inc()
+        wait_until_reconnect = increase_reconnect_wait_time(current_wait=wait_until_reconnect)
+        attempt += 1
+    return True
 
 
 def check_connection(func):
     """
-    Decorator to check that the DB is connected before function is called.
+    Decorator failing fast with DBUnavailableError while the DB is unavailable, instead of calling the function.
+    Connection errors raised by the function mark the DB as unavailable until db_health reconnects, and are raised as
+    DBUnavailableError, so the callers handle a lost connection the same way whether it was known or not. Other DB
+    errors, e.g. lock wait timeouts, are raised as they are.
     """
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        check_db_connection()
-        return func(*args, **kwargs)
+        db_health.check()
+        try:
+            return func(*args, **kwargs)
+        except (OperationalError, InterfaceError) as e:
+            if not is_connection_error(e):
+                raise
+            db_health.report_failure(e)
+            raise DBUnavailableError(f'The database connection failed: {e}') from e
 
     return wrapper
 
@@ -74,7 +95,52 @@ def get_object(object_id):
 
 
 @check_connection
-def add_measurement(object_id, mea_values: dict):
+def get_object_types(object_ids: list):
+    """
+    Gets the types of the objects with the given IDs, in one query.
+
+    Returns:
+        (dict): The IDs of the objects found and their type (GamObjecttype).
+    """
+    query = (GamObject
+             .select(GamObject.ob_id, GamObjecttype)
+             .join(GamObjecttype)
+             .where(GamObject.ob_id.in_(list(object_ids))))
+    return {obj.ob_id: obj.ob_objecttype for obj in query}
+
+
+@check_connection
+def get_object_display_formats(object_ids: list):
+    """
+    Gets the display formats of the measurements of the objects with the given IDs, in two queries. The display format
+    of each measurement number is the object's, or else its type's, or else its class'.
+
+    Returns:
+        (dict): The IDs of the objects found and the display format (GamDisplayformat) of each of their 5 measurement
+            numbers, None for the ones without one.
+    """
+    df_id_fields = [getattr(model, f'{prefix}_df_id_{number}')
+                    for number in range(1, 6)
+                    for model, prefix in ((GamObject, 'ob'), (GamObjecttype, 'ot'), (GamObjectclass, 'oc'))]
+    query = (GamObject
+             .select(GamObject.ob_id, *df_id_fields)
+             .join(GamObjecttype)
+             .join(GamObjectclass)
+             .where(GamObject.ob_id.in_(list(object_ids)))
+             .tuples())
+    # The first display format set of the object, type and class of each measurement number
+    object_df_ids = {ob_id: [next((df_id for df_id in df_ids[i:i + 3] if df_id is not None), None)
+                             for i in range(0, len(df_ids), 3)]
+                     for ob_id, *df_ids in query}
+
+    used_df_ids = list({df_id for df_ids in object_df_ids.values() for df_id in df_ids if df_id is not None})
+    display_formats = {display_format.df_id: display_format
+                       for display_format in GamDisplayformat.select().where(GamDisplayformat.df_id.in_(used_df_ids))}
+    return {ob_id: [display_formats.get(df_id) for df_id in df_ids] for ob_id, df_ids in object_df_ids.items()}
+
+
+@check_connection
+def add_measurement(object_id, mea_values: dict, validity: tuple = UNVALIDATED, mea_date: datetime = None):
     """
     Adds a measurement to the database.
     The measurement will be added to the module if the object has one.
@@ -83,37 +149,129 @@ def add_measurement(object_id, mea_values: dict):
     Args:
         object_id (int): Record/Object id of the object the measurement is for.
         mea_values (dict): A dict of the measurement values, max 5, in measurement_number(str)/pv_value pairs.
+        validity (tuple): The MEA_VALID and MEA_STATUS of the measurement, see validation.ObjectLimits.
+        mea_date (datetime, optional): The time the measurement values were taken, the current time if None.
     """
-    obj = GamObject.get(GamObject.ob_id == object_id)
-    obj_class_id = obj.ob_objecttype.ot_objectclass.oc_id
-
-    object_module = get_object_module(object_id=obj.ob_id, object_class=obj_class_id)
-    if object_module is not None:
-        object_id = object_module.ob_id
-    mea_comment = _generate_mea_comment(obj, object_module)
-    mea_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    mea_values = _calculate_mea_values(object_id, obj_class_id, mea_values)
-
-    record_id = GamMeasurement.insert(
-        mea_object=object_id,
-        mea_date=mea_date,
-        mea_date2=mea_date,
-        mea_comment=mea_comment,
-        mea_value1=mea_values['1'],
-        mea_value2=mea_values['2'],
-        mea_value3=mea_values['3'],
-        mea_value4=mea_values['4'],
-        mea_value5=mea_values['5'],
-        mea_valid=1,
-        mea_bookingcode=0  # 0 = measurement is not from the balance program (HZB)
-    ).execute()
+    mea_valid, mea_status = validity
+    start = time.perf_counter()
+    with tracer.span('db.lookup'):
+        obj, obj_class_id, object_id, mea_comment = get_measurement_object(object_id)
+    mea_date = _format_mea_date(mea_date)
+
+    with tracer.span('db.calculate'):
+        mea_values = _calculate_mea_values(object_id, obj_class_id, mea_values)
+
+    with tracer.span('db.insert'):
+        record_id = GamMeasurement.insert(
+            mea_object=object_id,
+            mea_date=mea_date,
+            mea_date2=mea_date,
+            mea_comment=mea_comment,
+            mea_value1=mea_values['1'],
+            mea_value2=mea_values['2'],
+            mea_value3=mea_values['3'],
+            mea_value4=mea_values['4'],
+            mea_value5=mea_values['5'],
+            mea_valid=mea_valid,
+            mea_status=mea_status,
+            mea_bookingcode=0  # 0 = measurement is not from the balance program (HZB)
+        ).execute()
+
+    INSERT_LATENCY.observe(time.perf_counter() - start)
+    MEASUREMENTS_ADDED.inc()
+    LAST_INSERT_TIME.set(clock.time())
 
     logger.info(f'Added measurement {record_id} for {obj.ob_name} ({object_id}) with values: {dict(mea_values)}')
     # noinspection PyProtectedMember
     db_logger.info(f"Added record no. {record_id} to {GamMeasurement._meta.table_name}")
 
 
+@check_connection
+def add_measurements(measurements: list):
+    """
+    Adds a batch of measurements to the database, the same as add_measurement but inserting them with a single
+    parameterised statement. Either all or none of the measurements are added.
+
+    Args:
+        measurements (list): The (object_id, mea_values), (object_id, mea_values, validity) or (object_id, mea_values,
+            validity, mea_date) of each measurement, the measurements without a date taken at the current time.
+    """
+    start = time.perf_counter()
+    now = _format_mea_date(None)
+    rows = []
+    with database.atomic():
+        for object_id, mea_values, *optional in measurements:
+            mea_valid, mea_status = optional[0] if optional else UNVALIDATED
+            mea_date = _format_mea_date(optional[1]) if len(optional) > 1 and optional[1] is not None else now
+            with tracer.span('db.lookup'):
+                obj, obj_class_id, mea_object_id, mea_comment = get_measurement_object(object_id)
+
+            # A calculation can depend on the object's last measurement, which could be one waiting in the batch
+            if obj_class_id == DBClassIDs.GAS_COUNTER and any(row[0] == mea_object_id for row in rows):
+                insert_measurement_rows(rows)
+                rows = []
+
+            with tracer.span('db.calculate'):
+                mea_values = _calculate_mea_values(mea_object_id, obj_class_id, mea_values)
+
+            # In the order of the MEASUREMENT_INSERT_COLUMNS
+            rows.append((mea_object_id, mea_date, mea_date, mea_comment, mea_values['1'], mea_values['2'],
+                         mea_values['3'], mea_values['4'], mea_values['5'], mea_valid, mea_status, 0))
+            logger.info(f'Adding measurement for {obj.ob_name} ({mea_object_id}) with values: {dict(mea_values)}')
+
+        insert_measurement_rows(rows)
+
+    BATCH_INSERT_LATENCY.observe(time.perf_counter() - start)
+    MEASUREMENTS_ADDED.inc(len(measurements))
+    LAST_INSERT_TIME.set(clock.time())
+
+    # noinspection PyProtectedMember
+    db_logger.info(f"Added {len(measurements)} records to {GamMeasurement._meta.table_name}")
+
+
+def _format_mea_date(mea_date: datetime = None):
+    """
+    Returns:
+        (str): The measurement date as stored in the DB, the current time if None.
+    """
+    return (mea_date if mea_date is not None else clock.now()).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def insert_measurement_rows(rows: list):
+    """
+    Insert the measurement rows with executemany, which PyMySQL sends as a single multi-row INSERT. The driver errors
+    are raised as the peewee ones, as by the queries, so that connection errors are reported by check_connection.
+    """
+    if not rows:
+        return
+    with tracer.span('db.insert'), __exception_wrapper__:
+        database.cursor().executemany(_get_measurement_insert_sql(), rows)
+
+
+def _get_measurement_insert_sql():
+    # noinspection PyProtectedMember
+    columns = [GamMeasurement._meta.fields[name].column_name for name in MEASUREMENT_INSERT_COLUMNS]
+    # noinspection PyProtectedMember
+    return (f'INSERT INTO {GamMeasurement._meta.table_name.join(database.quote)} '
+            f'({", ".join(column.join(database.quote) for column in columns)}) '
+            f'VALUES ({", ".join(database.param for _ in columns)})')
+
+
+def get_measurement_object(object_id: int):
+    """
+    Get the object with the given ID, and the object the measurement is added to (its module if it has one).
+
+    Returns:
+        (GamObject, int, int, str): The object, its class ID, the measurement object ID and the measurement comment.
+    """
+    obj = GamObject.get(GamObject.ob_id == object_id)
+    obj_class_id = obj.ob_objecttype.ot_objectclass.oc_id
+
+    object_module = find_object_module(object_id=obj.ob_id, object_class=obj_class_id)
+    mea_object_id = object_module.ob_id if object_module is not None else obj.ob_id
+    return obj, obj_class_id, mea_object_id, _generate_mea_comment(obj, object_module)
+
+
 def _generate_mea_comment(obj: GamObject, object_module: GamObject):
     """
     Check whether the object has a module, then generate the measurement comment and update the object ID to add
@@ -156,14 +314,39 @@ def _calculate_mea_values(mea_obj_id: int, object_class_id: int, mea_values: dic
     if object_class_id == DBClassIDs.GAS_COUNTER:
         last_mea = _get_last_measurement(mea_obj_id)
         if last_mea is not None:
-            mea_values['5'] = round((mea_values['1'] - float(last_mea.mea_value1)) * 1.321, 2)
+            mea_values['5'] = calculate_gas_counter_litres(mea_values['1'], float(last_mea.mea_value1))
 
     return mea_values
 
 
+def calculate_gas_counter_litres(revolutions: float, last_revolutions: float):
+    """
+    Returns:
+        (float): The liquid litres for the gas counter revolutions since its last measurement.
+    """
+    return round((revolutions - last_revolutions) * 1.321, 2)
+
+
+@check_connection
+def get_last_measurement_date(object_id: int):
+    """
+    Get the date of the last measurement of the object with the given ID, added to its module if it has one.
+
+    Returns:
+        (datetime): The date of the last measurement, or None if the object or its measurements don't exist.
+    """
+    try:
+        _, _, mea_object_id, _ = get_measurement_object(object_id)
+    except DoesNotExist:
+        return None
+    last_mea = _get_last_measurement(mea_object_id)
+    return last_mea.mea_date if last_mea is not None else None
+
+
 def _get_last_measurement(object_id: int):
     """
-    Get the last measurement of object with given ID.
+    Get the last measurement of object with given ID, by date rather than ID, as backfilled measurements are added
+    after the newer ones.
 
     Args:
         object_id (int): Object ID whose last measurement to look for.
@@ -171,13 +354,13 @@ def _get_last_measurement(object_id: int):
     Returns:
         (GamMeasurement): The last measurement of the object, or None if it doesn't exist.
     """
-    last_mea = (GamMeasurement.select()
-                .where(GamMeasurement.mea_object == object_id)
-                .order_by(GamMeasurement.mea_id.desc())
-                .get())
-    return last_mea if last_mea else None
+    return (GamMeasurement.select()
+            .where(GamMeasurement.mea_object == object_id)
+            .order_by(GamMeasurement.mea_date.desc(), GamMeasurement.mea_id.desc())
+            .first())
 
 
+@check_connection
 def get_obj_id_and_create_if_not_exist(obj_name: str, type_id: int, comment: str):
     """
     Get the ID of the object with the given name. Create one if it doesn't exist.
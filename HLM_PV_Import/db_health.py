@@ -0,0 +1,143 @@
+"""
+DB connection health tracking, as a circuit breaker: while the DB is known to be unreachable, DB functions fail fast
+instead of each probing and waiting for the connection, and a background prober re-attempts to connect with an
+exponential backoff until it is reachable again.
+"""
+import threading
+
+from peewee import OperationalError, InterfaceError
+
+from HLM_PV_Import.logger import logger
+from HLM_PV_Import.metrics import registry
+from shared.db_models import database
+
+RECONNECT_WAIT = 5  # base wait time between attempts in seconds
+RECONNECT_MAX_WAIT_TIME = 14400  # maximum wait time between attempts, in sec
+PROBE_INTERVAL = 30  # seconds between connection probes while the DB is healthy
+# The MySQL client errors of a lost or failed connection: can't connect (2002, 2003), server gone away (2006), lost
+# connection during a query (2013, 2055)
+CONNECTION_ERROR_CODES = (2002, 2003, 2006, 2013, 2055)
+
+RECONNECT_ATTEMPTS = registry.counter('hlm_db_reconnect_attempts_total', 'Number of DB reconnection attempts.')
+FAST_FAILURES = registry.counter('hlm_db_fast_failures_total',
+                                 'Number of DB function calls failed without trying, while the DB was unavailable.')
+DB_HEALTHY = registry.gauge('hlm_db_healthy', 'Whether the DB connection is healthy (1) or not (0).')
+
+
+def increase_reconnect_wait_time(current_wait):  # increasing wait time in s between attempts for each failed attempt
+    return current_wait*2 if current_wait*2 < RECONNECT_MAX_WAIT_TIME else RECONNECT_MAX_WAIT_TIME
+
+
+def probe_connection():
+    """
+    Connect the calling thread to the DB if it isn't, and check that the connection works.
+
+    Returns:
+        (bool): Whether the DB is reachable.
+    """
+    try:
+        database.connect(reuse_if_open=True)
+        database.execute_sql('SELECT 1')
+        return True
+    except Exception as e:
+        logger.debug(f'DB connection probe failed: {e}')
+        return False
+
+
+def is_connection_error(error: Exception):
+    """
+    Whether the DB error is a lost or failed connection, rather than e.g. a lock wait timeout or a deadlock, which
+    don't make the DB unavailable.
+    """
+    if isinstance(error, InterfaceError):
+        return True
+    return isinstance(error, OperationalError) and bool(error.args) and error.args[0] in CONNECTION_ERROR_CODES
+
+
+class DBUnavailableError(Exception):
+    """
+    The DB function was not called because the DB is unavailable.
+    """
+
+
+class DBHealth:
+    """
+    The cached health of the DB connection. Healthy until a DB call or probe fails, then unhealthy until the prober
+    reconnects.
+    """
+
+    def __init__(self, probe_interval: float = PROBE_INTERVAL, base_wait: float = RECONNECT_WAIT):
+        self.probe_interval = probe_interval
+        self.base_wait = base_wait
+        self._healthy = threading.Event()
+        self._healthy.set()
+        self._wake = threading.Event()  # set to probe right away
+        self._stop = threading.Event()
+        self._thread = None
+        DB_HEALTHY.function = lambda: int(self.healthy)
+
+    @property
+    def healthy(self):
+        return self._healthy.is_set()
+
+    def check(self):
+        """
+        Fail fast if the DB is unavailable. Doesn't touch the connection.
+
+        Raises:
+            DBUnavailableError: If the DB is unavailable.
+        """
+        if not self._healthy.is_set():
+            FAST_FAILURES.inc()
+            raise DBUnavailableError('The database is unavailable, waiting for it to reconnect.')
+
+    def report_failure(self, error: Exception):
+        """
+        Mark the DB as unavailable after a connection error, and have the prober re-attempt to connect.
+        """
+        if self._healthy.is_set():
+            logger.error(f'Connection to the database was lost: {error}')
+            self._healthy.clear()
+            self._wake.set()
+
+    def wait_until_healthy(self, timeout: float = None):
+        """
+        Returns:
+            (bool): Whether the DB is healthy, False if it is still unavailable after the timeout.
+        """
+        return self._healthy.wait(timeout)
+
+    def start(self):
+        """
+        Start probing the connection in the background.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='db_health', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        wait = self.base_wait
+        while not self._stop.is_set():
+            if probe_connection():
+                if not self._healthy.is_set():
+                    logger.info('Connection to the database was re-established.')
+                    self._healthy.set()
+                wait = self.base_wait
+                self._wake.wait(self.probe_interval)
+            else:
+                self.report_failure(Exception('connection probe failed'))
+                logger.error(f'Connection to the database could not be established, re-attempting to connect in '
+                             f'{wait}s.')
+                RECONNECT_ATTEMPTS.inc()
+                self._stop.wait(wait)
+                wait = increase_reconnect_wait_time(wait)
+            self._wake.clear()
+
+
+db_health = DBHealth()
@@ -0,0 +1,138 @@
+"""
+Writer worker threads adding the measurements to the DB in parallel, off the import loop thread.
+"""
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+from HLM_PV_Import.db_func import db_connect, add_measurement, add_measurements, UNVALIDATED, INSERT_LATENCY
+from HLM_PV_Import.db_health import db_health, DBUnavailableError
+from HLM_PV_Import.logger import logger, log_exception
+from HLM_PV_Import.metrics import registry
+from HLM_PV_Import.clock import clock
+
+QUEUE_SIZE = 10000  # measurements waiting per worker, after which adding a measurement blocks until there is space
+BATCH_SIZE = 100  # max measurements a worker takes from its queue at once
+
+WRITER_QUEUE_DEPTH = registry.gauge('hlm_writer_queue_depth', 'Number of measurements waiting for a writer worker.')
+WRITER_ERRORS = registry.counter('hlm_writer_errors_total', 'Number of measurements the writer workers failed to add.')
+
+_STOP = object()  # queued to stop a worker once it has added the measurements queued before
+
+
+class MeasurementWriter:
+    """
+    Add measurements on a number of worker threads, each with its own DB connection. The measurements of an object
+    always go to the same worker, so they are added in the order they were taken.
+    """
+
+    def __init__(self, workers: int, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self._stopping = False
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = [threading.Thread(target=self._work, args=(q,), name=f'db_writer_{i}', daemon=True)
+                         for i, q in enumerate(self._queues)]
+        WRITER_QUEUE_DEPTH.function = self.queue_depth
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        logger.info(f'Started {len(self._threads)} DB writer workers.')
+
+    def stop(self):
+        """
+        Stop the workers once they have added all the measurements queued so far, or failed to if the DB is
+        unavailable.
+        """
+        self._stopping = True
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def add_measurement(self, object_id, mea_values: dict, validity: tuple = UNVALIDATED, mea_date: datetime = None):
+        """
+        Queue a measurement to be added by the object's worker.
+
+        Args:
+            object_id (int): Record/Object id of the object the measurement is for.
+            mea_values (dict): A dict of the measurement values, in measurement_number(str)/pv_value pairs.
+            validity (tuple): The MEA_VALID and MEA_STATUS of the measurement.
+            mea_date (datetime, optional): The time the measurement values were taken, rather than the time they are
+                added, the current time if None.
+        """
+        if mea_date is None:
+            mea_date = clock.now()
+        self._queues[hash(object_id) % len(self._queues)].put((object_id, mea_values, validity, mea_date))
+
+    def queue_depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def _work(self, measurements: queue.Queue):
+        db_connect()  # The DB connection is per thread
+        while True:
+            batch = self._get_batch(measurements)
+            stop = _STOP in batch
+            batch = [item for item in batch if item is not _STOP]
+            while batch:
+                self._wait_for_db()
+                batch = self._add_batch(batch)
+            if stop:
+                return
+
+    def _wait_for_db(self):
+        """
+        Keep the measurements queued while the DB is unavailable, unless stopping.
+        """
+        while not db_health.wait_until_healthy(timeout=1) and not self._stopping:
+            pass
+
+    def _add_batch(self, batch: list):
+        """
+        Add a batch of measurements, one by one if it fails, so that only the failing ones are lost.
+
+        Returns:
+            (list): The batch, to be added again once the DB is available, if the DB connection was lost. Otherwise an
+                empty list.
+        """
+        try:
+            start = time.perf_counter()
+            add_measurements(batch)
+            # Each measurement's share of the batch, so the insert latency is per measurement as when added one by one
+            latency = (time.perf_counter() - start) / len(batch)
+            for _ in batch:
+                INSERT_LATENCY.observe(latency)
+            return []
+        except DBUnavailableError as e:
+            if not self._stopping:
+                logger.warning(f'{e} Adding the batch of {len(batch)} measurements once it is available.')
+                return batch
+            WRITER_ERRORS.inc(len(batch))
+            logger.error(f'Could not add batch of {len(batch)} measurements while stopping: {e}')
+            return []
+        except Exception as e:
+            # None of the batch was added, add the measurements one by one so only the failing ones are lost
+            logger.warning(f'Could not add batch of {len(batch)} measurements, adding them one by one: {e}')
+
+        for object_id, mea_values, validity, mea_date in batch:
+            try:
+                add_measurement(object_id=object_id, mea_values=mea_values, validity=validity, mea_date=mea_date)
+            except Exception as e:
+                WRITER_ERRORS.inc()
+                logger.error(f'Could not add measurement for object {object_id}: {e}')
+                log_exception(*sys.exc_info())
+        return []
+
+    def _get_batch(self, measurements: queue.Queue):
+        """
+        Wait for a measurement, then also take the ones queued after it, up to the batch size.
+        """
+        batch = [measurements.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(measurements.get_nowait())
+            except queue.Empty:
+                break
+        return batch
@@ -0,0 +1,182 @@
+"""
+Export the measurements of some or all objects over a time range to a CSV or Parquet file (Parquet needs pyarrow). The
+measurements are streamed from the DB with a server-side cursor and written in chunks, so any number of them can be
+exported in constant memory. Uses the service's DB settings unless given other credentials.
+
+Example: `python -m HLM_PV_Import.export --objects 1201 1202 --start 2019-01-01 --end 2021-01-01 out.parquet`
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime
+
+from peewee import MySQLDatabase
+
+from shared.db_models import database, initialize_database_from_option, is_database, GamMeasurement, GamObject
+
+CHUNK_SIZE = 10000  # rows fetched from the DB and written at a time
+COLUMNS = ('mea_id', 'mea_object', 'ob_name', 'mea_date', 'mea_value1', 'mea_value2', 'mea_value3', 'mea_value4',
+           'mea_value5')
+
+
+def get_export_query(object_ids: list = None, start: datetime = None, end: datetime = None):
+    """
+    Get the query of the measurements to export, in the COLUMNS order. Ordered by object then date (then ID, for the
+    measurements taken at the same time), so that the DB can read them in the order of the (object, date) index
+    without sorting them. The IDs aren't in date order, e.g. for the measurements added by a backfill.
+
+    Args:
+        object_ids (list, optional): The IDs of the objects to export the measurements of, all objects if None.
+        start (datetime, optional): Only export the measurements from this time.
+        end (datetime, optional): Only export the measurements before this time.
+    """
+    query = (GamMeasurement.select(GamMeasurement.mea_id, GamMeasurement.mea_object, GamObject.ob_name,
+                                   GamMeasurement.mea_date, GamMeasurement.mea_value1, GamMeasurement.mea_value2,
+                                   GamMeasurement.mea_value3, GamMeasurement.mea_value4, GamMeasurement.mea_value5)
+             .join(GamObject, on=GamMeasurement.mea_object == GamObject.ob_id))
+    if object_ids:
+        query = query.where(GamMeasurement.mea_object.in_(object_ids))
+    if start is not None:
+        query = query.where(GamMeasurement.mea_date >= start)
+    if end is not None:
+        query = query.where(GamMeasurement.mea_date < end)
+    return query.order_by(GamMeasurement.mea_object, GamMeasurement.mea_date, GamMeasurement.mea_id)
+
+
+def stream_rows(query, chunk_size: int = CHUNK_SIZE):
+    """
+    Run the query with an unbuffered server-side cursor, so that the rows are read from the DB as they are fetched
+    instead of all at once. The connection can't be used for other queries until all rows have been read.
+
+    Yields:
+        (list): The next chunk of row tuples, of up to chunk_size rows.
+    """
+    connection = database.connection()
+    if is_database(database, MySQLDatabase):
+        from pymysql.cursors import SSCursor
+        cursor = connection.cursor(SSCursor)
+    else:
+        cursor = connection.cursor()
+
+    sql, params = query.sql()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+class CsvExportWriter:
+    """
+    Write the rows to a CSV file, with a header of the column names.
+    """
+
+    def __init__(self, file):
+        self._writer = csv.writer(file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+
+    def close(self):
+        pass
+
+
+class ParquetExportWriter:
+    """
+    Write the rows to a Parquet file, a row group per chunk.
+    """
+
+    def __init__(self, path: str):
+        import pyarrow
+        import pyarrow.parquet
+
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([('mea_id', pyarrow.int64()), ('mea_object', pyarrow.int64()),
+                                       ('ob_name', pyarrow.string()), ('mea_date', pyarrow.timestamp('s'))] +
+                                      [(f'mea_value{i}', pyarrow.float64()) for i in range(1, 6)])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows: list):
+        columns = list(zip(*rows))
+        columns[3] = [_to_datetime(value) for value in columns[3]]
+        for i in range(4, len(COLUMNS)):
+            columns[i] = [None if value is None else float(value) for value in columns[i]]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(
+            [self._pyarrow.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def export(query, writer, chunk_size: int = CHUNK_SIZE, progress=None):
+    """
+    Write the rows of the query with the writer, chunk by chunk.
+
+    Args:
+        progress (callable, optional): Called with the number of rows written so far after each chunk.
+
+    Returns:
+        (int): The number of rows written.
+    """
+    count = 0
+    for rows in stream_rows(query, chunk_size):
+        writer.write(rows)
+        count += len(rows)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help='the file to write, - for CSV to stdout')
+    parser.add_argument('--format', choices=('csv', 'parquet'),
+                        help='the output format, from the output file extension if not given')
+    parser.add_argument('--objects', nargs='+', type=int, metavar='ID', help='the objects to export, default all')
+    parser.add_argument('--start', type=datetime.fromisoformat, help='only export the measurements from this time')
+    parser.add_argument('--end', type=datetime.fromisoformat, help='only export the measurements before this time')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows fetched and written at a time')
+    parser.add_argument('--mysql', metavar='USER:PASS@HOST/NAME', help='DB to export from instead of the service DB')
+    args = parser.parse_args()
+
+    output_format = args.format or ('parquet' if args.output.lower().endswith('.parquet') else 'csv')
+    if output_format == 'parquet' and args.output == '-':
+        parser.error('Parquet can only be written to a file')
+
+    initialize_database_from_option(args.mysql)
+
+    if output_format == 'parquet':
+        try:
+            writer = ParquetExportWriter(args.output)
+        except ImportError:
+            parser.error('pyarrow is not installed, it is needed to export to Parquet')
+        file = None
+    else:
+        file = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+        writer = CsvExportWriter(file)
+
+    def print_progress(count):
+        print(f'{count} measurements exported', file=sys.stderr)
+
+    try:
+        query = get_export_query(args.objects, args.start, args.end)
+        count = export(query, writer, args.chunk_size, progress=print_progress)
+    finally:
+        writer.close()
+        if file is not None and file is not sys.stdout:
+            file.close()
+    print(f'Exported {count} measurements to {args.output}.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
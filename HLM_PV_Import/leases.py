@@ -0,0 +1,157 @@
+"""
+Object leases, so that several PV import service instances can share the database, each importing a disjoint subset
+of the configured objects, and taking over the objects of an instance that stops renewing its leases.
+Enabled with the [PVImport] Leases setting.
+"""
+import math
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from peewee import IntegrityError
+
+from HLM_PV_Import.logger import logger, db_logger
+from HLM_PV_Import.metrics import registry
+from shared.db_models import database, HlmObjectLease
+
+LEASE_DURATION = 60  # seconds a lease is valid for after being renewed
+RENEW_INTERVAL = 20  # seconds between lease renewals
+OWNER_KEY_PREFIX = '~owner:'  # lease key prefix of the rows showing which instances are alive
+
+HELD_LEASES = registry.gauge('hlm_held_leases', 'Number of objects this instance holds the import lease for.')
+
+
+def create_lease_table():
+    """
+    Create the leases table if it doesn't exist yet.
+    """
+    database.create_tables([HlmObjectLease], safe=True)
+
+
+def get_db_time():
+    """
+    Returns:
+        (datetime): The current time of the DB server, which all the instances compare the lease expiry dates with,
+            whatever the clocks of their hosts.
+    """
+    now = database.execute_sql('SELECT CURRENT_TIMESTAMP').fetchone()[0]
+    return HlmObjectLease.lease_expires.python_value(now)  # SQLite returns it as text
+
+
+class LeaseManager:
+    """
+    Claim and renew leases for a fair share of the given keys, among the instances with the same keys and group.
+    """
+
+    def __init__(self, keys, group: str = '', duration: float = LEASE_DURATION, renew_interval: float = RENEW_INTERVAL):
+        """
+        Args:
+            keys (iterable): The keys of the objects to share, e.g. object IDs.
+            group (str, optional): The instances sharing the same keys, e.g. the supervisor shard.
+            duration (float, optional): The seconds a lease is valid for after being renewed.
+            renew_interval (float, optional): The min seconds between lease renewals.
+        """
+        self.keys = sorted({str(key) for key in keys})
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.duration = duration
+        self.renew_interval = renew_interval
+        self.held = set()
+        self._owner_prefix = f'{OWNER_KEY_PREFIX}{group}:'
+        self._owner_key = f'{self._owner_prefix}{self.owner}'
+        self._valid_until = 0.0  # monotonic time after which the held leases may have been taken over
+        self._renewed = None  # monotonic time of the last renewal attempt
+
+    def holds(self, key):
+        """
+        Whether this instance holds the lease of the given key, and so is the only one importing it.
+        """
+        return str(key) in self.held and time.monotonic() < self._valid_until
+
+    def renew_if_due(self):
+        """
+        Renew the leases if the renew interval has passed since they were last renewed, logging any DB errors. On
+        errors the held leases are kept until they expire, after which nothing is imported until renewed.
+        """
+        if self._renewed is not None and time.monotonic() - self._renewed < self.renew_interval:
+            return
+        self._renewed = time.monotonic()
+        try:
+            self.renew()
+        except Exception as e:
+            db_logger.error(f'Could not renew the object leases: {e}')
+
+    def renew(self):
+        """
+        Extend the held leases, then claim free or expired leases up to a fair share of the keys, or release the
+        leases above it so that newly started instances can claim them.
+        """
+        started = time.monotonic()  # before reading the DB time, so the leases are not used past their expiry
+        now = get_db_time()
+        expires = now + timedelta(seconds=self.duration)
+        with database.atomic():
+            HlmObjectLease.replace(lease_key=self._owner_key, lease_owner=self.owner, lease_expires=expires).execute()
+            HlmObjectLease.update(lease_expires=expires).where((HlmObjectLease.lease_owner == self.owner) &
+                                                               (HlmObjectLease.lease_key.in_(self.keys))).execute()
+            leases = {lease.lease_key: lease for lease in
+                      HlmObjectLease.select().where(HlmObjectLease.lease_key.in_(self.keys))}
+            owners = list(HlmObjectLease.select().where(HlmObjectLease.lease_key.startswith(self._owner_prefix)))
+            live_owners = {lease.lease_owner for lease in owners if lease.lease_expires > now}
+            # Forget the instances that have stopped long ago
+            gone = [lease.lease_key for lease in owners if lease.lease_expires < now - timedelta(seconds=self.duration)]
+            if gone:
+                HlmObjectLease.delete().where(HlmObjectLease.lease_key.in_(gone)).execute()
+        held = {key for key, lease in leases.items() if lease.lease_owner == self.owner}
+        share = math.ceil(len(self.keys) / max(len(live_owners), 1))
+
+        if len(held) > share:
+            surplus = sorted(held)[share:]
+            HlmObjectLease.delete().where((HlmObjectLease.lease_owner == self.owner) &
+                                          (HlmObjectLease.lease_key.in_(surplus))).execute()
+            held.difference_update(surplus)
+            logger.info(f'Released {len(surplus)} object leases for other instances.')
+        else:
+            for key in self.keys:
+                if len(held) >= share:
+                    break
+                lease = leases.get(key)
+                if lease is None or (lease.lease_owner != self.owner and lease.lease_expires <= now):
+                    if self._claim(key, lease, expires):
+                        held.add(key)
+
+        if held != self.held:
+            logger.info(f'Holding {len(held)}/{len(self.keys)} object leases, shared by {len(live_owners)} instances.')
+        self.held = held
+        self._valid_until = started + self.duration
+        HELD_LEASES.set(len(held))
+
+    def release_all(self):
+        """
+        Release the held leases, so other instances can take them over without waiting for them to expire.
+        """
+        self.held = set()
+        self._valid_until = 0.0
+        HELD_LEASES.set(0)
+        try:
+            HlmObjectLease.delete().where(HlmObjectLease.lease_owner == self.owner).execute()
+        except Exception as e:
+            db_logger.error(f'Could not release the object leases: {e}')
+
+    def _claim(self, key: str, lease: HlmObjectLease, expires: datetime):
+        """
+        Take the lease of the key, unless another instance took it since it was read.
+
+        Returns:
+            (bool): Whether the lease was claimed.
+        """
+        if lease is None:
+            try:
+                with database.atomic():
+                    HlmObjectLease.create(lease_key=key, lease_owner=self.owner, lease_expires=expires)
+                return True
+            except IntegrityError:
+                return False
+        return HlmObjectLease.update(lease_owner=self.owner, lease_expires=expires).where(
+            (HlmObjectLease.lease_key == key) & (HlmObjectLease.lease_owner == lease.lease_owner) &
+            (HlmObjectLease.lease_expires == lease.lease_expires)).execute() == 1
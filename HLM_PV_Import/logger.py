@@ -1,7 +1,15 @@
+"""
+The service loggers. They only get their handlers once setup_logging is called, so importing the service modules
+doesn't create the log files or start the listener thread.
+"""
+import atexit
 import os
+import queue
 import sys
-import logging.config
-from HLM_PV_Import.settings import LoggingFiles
+import threading
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from HLM_PV_Import.settings import LoggingFiles, Logging
 
 
 def setup_log_file(log_path):
@@ -15,12 +23,10 @@ LOG_FILES = {
     'error': LoggingFiles.ERR_LOG,
     'db': LoggingFiles.DB_LOG,
     'pvs': LoggingFiles.PVS_LOG,
-    'service': LoggingFiles.SRV_LOG
+    'service': LoggingFiles.SRV_LOG,
+    'trace': LoggingFiles.TRACE_LOG
 }
 
-for file_path in LOG_FILES.values():
-    setup_log_file(file_path)
-
 LOGGING_CONFIG = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -64,6 +70,15 @@ LOGGING_CONFIG = {
             'formatter': 'verbose',
             'delay': True
         },
+        'trace_file': {
+            'level': 'INFO',
+            'class': 'logging.handlers.TimedRotatingFileHandler',
+            'filename': LOG_FILES['trace'],
+            'when': 'midnight',
+            'interval': 1,
+            'formatter': 'verbose',
+            'delay': True
+        },
         'service_file': {
             'level': 'INFO',
             'class': 'logging.handlers.RotatingFileHandler',
@@ -89,6 +104,11 @@ LOGGING_CONFIG = {
             'level': 'DEBUG',
             'propagate': False
         },
+        'trace': {
+            'handlers': ['trace_file'],
+            'level': 'DEBUG',
+            'propagate': False
+        },
         'exc': {
             'handlers': ['err_file'],
             'level': 'ERROR',
@@ -96,12 +116,127 @@ LOGGING_CONFIG = {
         }
     }
 }
-logging.config.dictConfig(LOGGING_CONFIG)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Puts records on the queue without ever blocking the caller, counting the records dropped when the queue is full.
+    """
+
+    def __init__(self, queue_):
+        super(DroppingQueueHandler, self).__init__(queue_)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class LoggerDispatchListener(QueueListener):
+    """
+    Passes each queued record to the handlers configured for the logger that created it, on the listener thread.
+    """
+
+    def __init__(self, queue_, handlers_by_logger: dict):
+        super(LoggerDispatchListener, self).__init__(queue_)
+        self.handlers_by_logger = handlers_by_logger
+
+    def handle(self, record):
+        record = self.prepare(record)
+        for handler in self.handlers_by_logger.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # wait for space rather than fail when stopping with a full queue
+
+
+def get_logging_config(suffix=None):
+    """
+    Get the logging config, with the suffix added to the log file names, e.g. service.1.log, so that the supervisor
+    worker processes each write and rotate their own files.
+
+    Args:
+        suffix (str, optional): The suffix of the log file names, none if None.
+
+    Returns:
+        (dict): The logging config.
+    """
+    if suffix is None:
+        return LOGGING_CONFIG
+    handlers = {name: dict(handler) for name, handler in LOGGING_CONFIG['handlers'].items()}
+    config = dict(LOGGING_CONFIG, handlers=handlers)
+    for handler in handlers.values():
+        if 'filename' in handler:
+            root, extension = os.path.splitext(handler['filename'])
+            handler['filename'] = f'{root}.{suffix}{extension}'
+    return config
+
+
+def _move_handlers_behind_queue(logger_names):
+    """
+    Replace the handlers of the given loggers with a shared queue handler, so that formatting, file I/O and
+    rotation happen on the listener thread instead of the thread doing the logging.
+
+    Returns:
+        (DroppingQueueHandler, LoggerDispatchListener): The queue handler and the started listener.
+    """
+    log_queue = queue.Queue(maxsize=Logging.QUEUE_SIZE)
+    queue_handler_ = DroppingQueueHandler(log_queue)
+    handlers_by_logger = {}
+    for name in logger_names:
+        logger_ = logging.getLogger(name)
+        handlers_by_logger[name] = list(logger_.handlers)
+        for handler in handlers_by_logger[name]:
+            logger_.removeHandler(handler)
+        logger_.addHandler(queue_handler_)
+
+    listener_ = LoggerDispatchListener(log_queue, handlers_by_logger)
+    listener_.start()
+    atexit.register(listener_.stop)  # flush the queued records on exit
+    return queue_handler_, listener_
+
+
+queue_handler = None  # set up by setup_logging
+listener = None
+
+
+def setup_logging(suffix=None):
+    """
+    Create the log files and set up the log handlers, behind the log queue. Does nothing if already set up.
+
+    Args:
+        suffix (str, optional): The suffix of the log file names of the process, see get_logging_config.
+    """
+    global queue_handler, listener
+    if queue_handler is not None:
+        return
+    from logging.config import dictConfig  # only needed once, when setting up
+    logging_config = get_logging_config(suffix)
+    for handler in logging_config['handlers'].values():
+        if 'filename' in handler:
+            setup_log_file(handler['filename'])
+    dictConfig(logging_config)
+    queue_handler, listener = _move_handlers_behind_queue(logging_config['loggers'])
+
+
+def get_log_queue_depth():
+    return queue_handler.queue.qsize() if queue_handler is not None else 0
+
+
+def get_dropped_log_records():
+    return queue_handler.dropped if queue_handler is not None else 0
+
 
 # Create loggers
 logger = logging.getLogger('log')
 db_logger = logging.getLogger('db')
 pv_logger = logging.getLogger('pv')
+trace_logger = logging.getLogger('trace')
 exc_logger = logging.getLogger('exc')
 
 
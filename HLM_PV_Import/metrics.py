@@ -0,0 +1,237 @@
+"""
+Lightweight metrics registry for the PV import service, served in the Prometheus text exposition format by
+metrics_server.MetricsServer, or dumped to a file by MetricsFileWriter.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from HLM_PV_Import.logger import logger, get_log_queue_depth, get_dropped_log_records
+
+# Default histogram buckets in seconds, suited to DB round trips and import loop iterations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A value that only goes up, e.g. the number of CA updates received.
+    """
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, function=None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function  # if given, called to get the value instead
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self.function() if self.function else self._value
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Gauge:
+    """
+    A value that can go up and down, e.g. the number of stale PVs.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function=None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function  # if given, called to get the value instead
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        return self.function() if self.function else self._value
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Histogram:
+    """
+    Counts observations (e.g. insert latencies) in cumulative buckets, and keeps their count and sum.
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last one is the +Inf bucket
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        """ Observe the time in seconds spent in the with block. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def cumulative_buckets(self):
+        """
+        Returns:
+            (list): The (upper bound, cumulative count) pairs, ending with the +Inf bucket.
+        """
+        return self._cumulative(self._snapshot()[0])
+
+    def samples(self):
+        counts, sum_, count = self._snapshot()  # consistent with each other, taken under the lock
+        samples = [(f'{self.name}_bucket{{le="{_format_value(bound)}"}}', cumulative)
+                   for bound, cumulative in self._cumulative(counts)]
+        samples.append((f'{self.name}_sum', sum_))
+        samples.append((f'{self.name}_count', count))
+        return samples
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def _cumulative(self, counts: list):
+        buckets = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        return buckets
+
+
+class MetricsRegistry:
+    """
+    Holds the service metrics and renders them in the text exposition format.
+    Registering a metric name twice returns the existing metric.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f'Metric {name} is already registered as a {metric.type_name}.')
+            return metric
+
+    def counter(self, name: str, documentation: str, function=None):
+        return self._register(Counter, name, documentation, function=function)
+
+    def gauge(self, name: str, documentation: str, function=None):
+        return self._register(Gauge, name, documentation, function=function)
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, buckets=buckets)
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self):
+        """
+        Render all registered metrics.
+
+        Returns:
+            (str): The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for sample_name, value in metric.samples():
+                lines.append(f'{sample_name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+registry.counter('hlm_log_records_dropped_total', 'Number of log records dropped because the log queue was full.',
+                 function=get_dropped_log_records)
+registry.gauge('hlm_log_queue_depth', 'Number of log records waiting to be written.',
+               function=get_log_queue_depth)
+
+
+class MetricsFileWriter:
+    """
+    Periodically dumps the registry to a file, replacing the previous dump.
+    """
+
+    def __init__(self, path: str, interval: float, metrics_registry: MetricsRegistry = registry):
+        self.path = path
+        self.interval = interval
+        self.registry = metrics_registry
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='MetricsFileWriter', daemon=True)
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self.write()
+
+    def write(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f'Could not write metrics to {self.path}: {e}')
@@ -0,0 +1,56 @@
+"""
+HTTP server of the metrics registry, for Prometheus to scrape. Enabled with the [Metrics] Port setting, and only
+imported then, so that http.server is not loaded otherwise.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from HLM_PV_Import.logger import logger
+from HLM_PV_Import.metrics import MetricsRegistry, registry
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the scrapes of /metrics with the rendered registry of the server.
+    """
+
+    # noinspection PyPep8Naming
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format_, *args):
+        pass  # do not write every scrape to stderr
+
+
+class MetricsServer:
+    """
+    Serves the registry over HTTP on a local port, in a daemon thread.
+    """
+
+    def __init__(self, port: int, host: str = '127.0.0.1', metrics_registry: MetricsRegistry = registry):
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.registry = metrics_registry
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='MetricsServer', daemon=True)
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        logger.info(f'Serving metrics on http://{self.httpd.server_address[0]}:{self.port}/metrics')
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
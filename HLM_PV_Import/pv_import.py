@@ -3,27 +3,52 @@ from HLM_PV_Import.user_config import UserConfig
 from HLM_PV_Import.settings import PvImportConfig
 from HLM_PV_Import.logger import logger, pv_logger
 from HLM_PV_Import.settings import CA
-from HLM_PV_Import.db_func import add_measurement, get_obj_id_and_create_if_not_exist
+from HLM_PV_Import.db_func import add_measurement, get_obj_id_and_create_if_not_exist, get_object_types, \
+    get_object_display_formats, get_last_measurement_date, UNVALIDATED
+from HLM_PV_Import.db_health import db_health, DBUnavailableError
+from HLM_PV_Import.db_writer import MeasurementWriter
+from HLM_PV_Import.metrics import registry
+from HLM_PV_Import.tracing import tracer
+from HLM_PV_Import.clock import clock
+from HLM_PV_Import.calibration import ObjectCalibrations
+from HLM_PV_Import.validation import ObjectLimits
+from shared.const import MeaStatistics
 from collections import defaultdict
 import time
 
-LOOP_TIMER = PvImportConfig.LOOP_TIMER   # The timer between each PV import loop
 EXTERNAL_PVS_UPDATE_INTERVAL = 3600
 EXTERNAL_PVS_TASK = 'External PVs'
 ONE_MINUTE_IN_SECONDS = 60
 
+LOOP_DURATION = registry.histogram('hlm_import_loop_seconds', 'Time spent in each PV import loop, excluding the wait.')
+DUE_OBJECTS = registry.gauge('hlm_import_due_objects', 'Number of objects due for a measurement in the last loop.')
+SKIPPED_OBJECTS = registry.counter('hlm_import_skipped_objects_total',
+                                   'Number of due objects skipped because none of their PVs had values.')
+STALE_PVS = registry.gauge('hlm_stale_pvs', 'Number of monitored PVs whose data is stale.')
+
 
 class PvImport:
-    def __init__(self, pv_monitors: PvMonitors, user_config: UserConfig, external_pvs_list: list):
+    def __init__(self, pv_monitors: PvMonitors, user_config: UserConfig, external_pvs_list: list,
+                 measurement_writer: MeasurementWriter = None):
         self.pv_monitors = pv_monitors
         self.config = user_config
         self.external_pvs_list = external_pvs_list  # Configurations for PVs not part of the Helium Recovery PLC
+        self.measurement_writer = measurement_writer  # If given, measurements are added by its workers
         self.tasks = {}
+        self._plans = {}  # the measurement plan of each object
+        self.heartbeat = None  # shared value set to the time of each loop, when run by the supervisor
+        self.lease_manager = None  # if set, only the objects it holds the leases of are imported
+        self.calibrations = ObjectCalibrations()  # the calibrations of the objects types, if enabled
+        self.limits = ObjectLimits()  # the limits of the objects measurements, if validation is enabled
+        self._db_was_available = True
         self.running = False
 
-        # Initialize tasks
+        # Initialize tasks, and the measurement plans so the PV statistics are accumulated from the start
         for obj_id in self.config.object_ids:
             self.tasks[obj_id] = 0
+            self._plans[obj_id] = self._get_measurement_plan(
+                self.config.get_entry_measurement_pvs(obj_id, full_names=True),
+                self.config.get_entry_statistics(obj_id))
         self.tasks[EXTERNAL_PVS_TASK] = 0
 
     def start(self):
@@ -33,50 +58,216 @@ class PvImport:
         self.running = True  # in case it was previously stopped
 
         while self.running:
-            time.sleep(LOOP_TIMER)
+            clock.sleep(PvImportConfig.LOOP_TIMER)  # The timer between each PV import loop
+            tracer.poll()
 
-            # Helium Recovery PLC Measurements
-            for object_id in self.config.object_ids:
-                # Check the object's next logging time in tasks, if not yet then go to next object_id
-                if self.tasks[object_id] > time.time():
-                    continue
-                # If object is ready to be updated, set curr time + log period in minutes as next run, then proceed
-                self.tasks[object_id] = time.time() + (ONE_MINUTE_IN_SECONDS * self.config.logging_periods[object_id])
+            with LOOP_DURATION.time(), tracer.span('loop'):
+                self._renew_leases()
+                self._sweep_stale_pvs()
 
-                # Get the object measurement PVs names
-                object_meas = self.config.get_entry_measurement_pvs(object_id, full_names=True)
+                if self._db_available():
+                    try:
+                        # Helium Recovery PLC Measurements
+                        self._import_objects()
 
-                # Get the measurement PV values
-                mea_values = self._get_mea_values(object_meas)
+                        # External (Non-PLC) Measurements
+                        self._import_external_pvs()
+                    except DBUnavailableError as e:
+                        logger.warning(f'{e} The due measurements will be added once it is available.')
 
-                # If none of the measurement PVs values were found in the PV data,
-                # skip to the next object.
-                if all(value is None for value in mea_values.values()):
-                    logger.warning(f'No PV values for measurement of object {object_id}, skipping. ')
-                    continue
+            self._beat()
+
+        if self.measurement_writer is not None:
+            self.measurement_writer.stop()
+        self._release_leases()
+
+    def _db_available(self):
+        """
+        Whether the DB is available to add the due measurements, logging when it stops and starts being. While it is
+        not, the objects stay due, so they are measured as soon as it is.
+        """
+        available = db_health.healthy
+        if available != self._db_was_available:
+            if available:
+                logger.info('Database available, resuming the import.')
+            else:
+                logger.warning('Database unavailable, pausing the import.')
+            self._db_was_available = available
+        return available
+
+    def _beat(self):
+        if self.heartbeat is not None:
+            self.heartbeat.value = time.time()  # the real time, compared by the supervisor process
 
-                # Create a new measurement with the PV values for the object
-                add_measurement(object_id=object_id, mea_values=mea_values)
+    def get_lease_keys(self):
+        """
+        Returns:
+            (list): The keys of the leases to share with the other instances, the object IDs and the external PVs task.
+        """
+        return self.config.object_ids + ([EXTERNAL_PVS_TASK] if self.external_pvs_list else [])
 
-            # External (Non-PLC) Measurements
+    def _renew_leases(self):
+        if self.lease_manager is not None:
+            with tracer.span('leases'):
+                held = self.lease_manager.held
+                self.lease_manager.renew_if_due()
+                self._schedule_acquired_objects(self.lease_manager.held - held)
 
-            # Update external PV measurements only every 'EXTERNAL_PVS_UPDATE_INTERVAL' seconds
-            if self.tasks[EXTERNAL_PVS_TASK] > time.time():
+    def _schedule_acquired_objects(self, acquired_keys: set):
+        """
+        Schedule the next measurement of the objects whose lease was just acquired, e.g. taken over from an instance
+        that stopped, one logging period after their last measurement, rather than measuring them right away.
+        """
+        for object_id in self.config.object_ids:
+            if str(object_id) not in acquired_keys:
                 continue
-            # noinspection PyTypeChecker
-            self.tasks[EXTERNAL_PVS_TASK] = time.time() + EXTERNAL_PVS_UPDATE_INTERVAL
+            try:
+                last_date = get_last_measurement_date(object_id)
+            except DBUnavailableError as e:
+                logger.warning(f'Could not get the last measurement of object {object_id}: {e}')
+                continue
+            if last_date is not None:
+                next_time = last_date.timestamp() + ONE_MINUTE_IN_SECONDS * self.config.logging_periods[object_id]
+                self.tasks[object_id] = max(self.tasks[object_id], next_time)
+
+    def _release_leases(self):
+        if self.lease_manager is not None:
+            self.lease_manager.release_all()
+
+    def _is_leased(self, key):
+        return self.lease_manager is None or self.lease_manager.holds(key)
+
+    def _sweep_stale_pvs(self):
+        with tracer.span('stale_sweep'):
+            self.pv_monitors.update_stale_pvs()
+        STALE_PVS.set(len(self.pv_monitors.get_stale_pvs()))
 
-            for external_pvs_config in self.external_pvs_list:
-                for obj_name, mea_pvs in external_pvs_config.pv_config.items():
+    def _import_objects(self):
+        """
+        Add a measurement for each configured object whose logging period has passed, dated when the values are taken.
+        """
+        mea_date = clock.now()
+        measurements = list(self._get_due_objects_measurements())
+        if PvImportConfig.CALIBRATION and measurements:
+            with tracer.span('calibrate'):
+                self._calibrate(measurements)
+        validity = [UNVALIDATED] * len(measurements)
+        if PvImportConfig.VALIDATION and measurements:
+            with tracer.span('validate'):
+                validity = self._validate(measurements)
+
+        for (object_id, mea_values), mea_validity in zip(measurements, validity):
+            # Create a new measurement with the PV values for the object
+            with tracer.span('insert'):
+                self._add_measurement(object_id, mea_values, mea_validity, mea_date)
+            # Only once added (or queued), so the object stays due if the DB is lost in the meantime
+            self._schedule_next_measurement(object_id)
+
+    def _schedule_next_measurement(self, object_id):
+        """
+        Set the next logging time of the object to the current time + its logging period in minutes.
+        """
+        self.tasks[object_id] = clock.time() + (ONE_MINUTE_IN_SECONDS * self.config.logging_periods[object_id])
+
+    def _calibrate(self, measurements: list):
+        """
+        Calibrate the raw values of the due measurements with the calibrations of the objects types, getting the types
+        of the objects not calibrated before.
+        """
+        missing_objects = self.calibrations.get_missing_objects(object_id for object_id, _ in measurements)
+        if missing_objects:
+            self.calibrations.add_objects(missing_objects, get_object_types(missing_objects))
+        self.calibrations.apply(measurements)
+
+    def _validate(self, measurements: list):
+        """
+        Check the values of the due measurements against the limits of their display formats, getting the display
+        formats of the objects not checked before.
+
+        Returns:
+            (list): The MEA_VALID and MEA_STATUS of each measurement.
+        """
+        missing_objects = self.limits.get_missing_objects(object_id for object_id, _ in measurements)
+        if missing_objects:
+            self.limits.add_objects(missing_objects, get_object_display_formats(missing_objects))
+        return self.limits.validate(measurements)
+
+    def _get_due_objects_measurements(self):
+        """
+        Get the measurement values of each configured object whose logging period has passed. The next measurement of
+        the objects skipped for a lack of values is scheduled, the others' once their measurement is added.
+
+        Yields:
+            (tuple): The object ID and its measurement values.
+        """
+        due_objects = 0
+        for object_id in self.config.object_ids:
+            # Check the object's next logging time in tasks, if not yet then go to next object_id
+            if self.tasks[object_id] > clock.time():
+                continue
+            # Leave the objects imported by other instances to them
+            if not self._is_leased(object_id):
+                continue
+            due_objects += 1
+
+            with tracer.span('gather'):
+                # Get the measurement PV values
+                mea_values = self._get_plan_values(self._plans[object_id])
+
+            # If none of the measurement PVs values were found in the PV data,
+            # skip to the next object.
+            if all(value is None for value in mea_values.values()):
+                logger.warning(f'No PV values for measurement of object {object_id}, skipping. ')
+                SKIPPED_OBJECTS.inc()
+                self._schedule_next_measurement(object_id)
+                continue
+
+            yield object_id, mea_values
+
+        DUE_OBJECTS.set(due_objects)
+
+    def _import_external_pvs(self):
+        """
+        Add measurements for the external PVs objects, every 'EXTERNAL_PVS_UPDATE_INTERVAL' seconds. The next ones are
+        scheduled once all of them are added (or queued), so they are all added again if the DB is lost in between.
+        """
+        if self.tasks[EXTERNAL_PVS_TASK] > clock.time() or not self._is_leased(EXTERNAL_PVS_TASK):
+            return
+
+        mea_date = clock.now()
+        for obj_name, objects_type, comment, mea_values in self._get_external_measurements():
+            with tracer.span('lookup'):
+                obj_id = get_obj_id_and_create_if_not_exist(obj_name, objects_type, comment)
+
+            with tracer.span('insert'):
+                self._add_measurement(obj_id, mea_values, mea_date=mea_date)
+
+        # noinspection PyTypeChecker
+        self.tasks[EXTERNAL_PVS_TASK] = clock.time() + EXTERNAL_PVS_UPDATE_INTERVAL
+
+    def _get_external_measurements(self):
+        """
+        Get the measurement values of the external PVs objects.
+
+        Yields:
+            (tuple): The object name, type and comment, and its measurement values.
+        """
+        for external_pvs_config in self.external_pvs_list:
+            for obj_name, mea_pvs in external_pvs_config.pv_config.items():
+                with tracer.span('gather'):
                     mea_values = self._get_mea_values({f'{i+1}': pv for i, pv in enumerate(mea_pvs)},
                                                       ignore_stale_pvs=True)
-                    if all(value is None for value in mea_values.values()):
-                        continue
+                if all(value is None for value in mea_values.values()):
+                    continue
 
-                    comment = f'Non-PLC PVs ({external_pvs_config.name})'
-                    obj_id = get_obj_id_and_create_if_not_exist(obj_name, external_pvs_config.objects_type, comment)
+                comment = f'Non-PLC PVs ({external_pvs_config.name})'
+                yield obj_name, external_pvs_config.objects_type, comment, mea_values
 
-                    add_measurement(object_id=obj_id, mea_values=mea_values)
+    def _add_measurement(self, object_id, mea_values, validity=UNVALIDATED, mea_date=None):
+        if self.measurement_writer is not None:
+            self.measurement_writer.add_measurement(object_id, mea_values, validity, mea_date)
+        else:
+            add_measurement(object_id=object_id, mea_values=mea_values, validity=validity, mea_date=mea_date)
 
     def stop(self):
         """
@@ -86,8 +277,7 @@ class PvImport:
 
     def _get_mea_values(self, meas_pv_config: dict, ignore_stale_pvs: bool = False):
         """
-        Iterate through the list of PVs, get the values from the PV monitor data dict, and add them to the
-        measurement values.
+        Get the values of the measurement PVs from the PV monitors data.
 
         Args:
             meas_pv_config (dict): The Measurement No./PV Name configuration.
@@ -96,25 +286,61 @@ class PvImport:
         Returns:
             (defaultdict): The measurement values.
         """
-        mea_values = defaultdict(lambda: None)
+        return self._get_plan_values(self._get_measurement_plan(meas_pv_config), ignore_stale_pvs)
+
+    def _get_measurement_plan(self, meas_pv_config: dict, meas_statistics: dict = None):
+        """
+        Args:
+            meas_pv_config (dict): The Measurement No./PV Name configuration.
+            meas_statistics (dict, optional): The Measurement No./Statistic configuration, for the measurements whose
+                value is not the PV's last value.
+
+        Returns:
+            (list): The measurement number, PV name, PV monitors handle, statistic and PV statistics (None for the last
+                value) of each measurement with an assigned PV.
+        """
+        plan = []
         for mea_number, pv_name in meas_pv_config.items():
-            # If the measurement doesn't have an assigned PV, go to the next one.
+            # If the measurement doesn't have an assigned PV, leave it out
             if not pv_name:
                 continue
+            handle = self.pv_monitors.get_handle(pv_name)
+            statistic = (meas_statistics or {}).get(mea_number, MeaStatistics.LAST)
+            pv_statistics = self.pv_monitors.add_statistics(handle) if statistic != MeaStatistics.LAST else None
+            plan.append((mea_number, pv_name, handle, statistic, pv_statistics))
+        return plan
 
-            # Add the PV value to the measurements. If the PV does not exist in the PV monitors data dict,
-            # then skip it. This could happen because of a monitor not receiving updates from the existing PV.
-            try:
+    def _get_plan_values(self, plan: list, ignore_stale_pvs: bool = False):
+        """
+        Get the values of the measurement plan PVs from the PV monitors data, and add them to the measurement values.
 
-                # If the PV data is stale, then ignore it. If Add Stale PVs setting is enabled, add it anyway.
-                # If called with 'ignore stale PVs' set to True, don't add stale PVs, no matter the CA settings.
-                if self.pv_monitors.pv_data_is_stale(pv_name) and not CA.ADD_STALE_PVS and not ignore_stale_pvs:
-                    continue
+        Args:
+            plan (list): The measurement plan, see _get_measurement_plan.
+            ignore_stale_pvs (bool): Don't add stale PVs to values, no matter the CA settings.
 
-                pv_value = self.pv_monitors.get_pv_data(pv_name)
-                mea_values[mea_number] = pv_value
-            except Exception as e:
-                pv_logger.warning(f'No PV data found for {e}')
+        Returns:
+            (defaultdict): The measurement values.
+        """
+        mea_values = defaultdict(lambda: None)
+        values = self.pv_monitors.get_values([handle for _, _, handle, _, _ in plan])
+        for (mea_number, pv_name, handle, statistic, pv_statistics), pv_value in zip(plan, values):
+            # If the PV has no data, skip it. This could happen because of a monitor not receiving updates from the
+            # existing PV.
+            if not self.pv_monitors.has_data(handle):
+                pv_logger.warning(f"No PV data found for '{pv_name}'")
                 continue
 
+            # If the PV data is stale, then ignore it. If Add Stale PVs setting is enabled, add it anyway.
+            # If called with 'ignore stale PVs' set to True, don't add stale PVs, no matter the CA settings.
+            if self.pv_monitors.handle_is_stale(handle) and not CA.ADD_STALE_PVS and not ignore_stale_pvs:
+                continue
+
+            if pv_statistics is not None:
+                statistics = pv_statistics.take()
+                # Without updates since the last measurement, the PV is still at its last value
+                if statistics[MeaStatistics.COUNT] or statistic == MeaStatistics.COUNT:
+                    pv_value = statistics[statistic]
+
+            mea_values[mea_number] = pv_value
+
         return mea_values
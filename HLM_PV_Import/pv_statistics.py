@@ -0,0 +1,46 @@
+"""
+Streaming statistics of PV updates, accumulated in the monitor callback between measurements.
+"""
+import threading
+
+from shared.const import MeaStatistics
+
+
+class PvStatistics:
+    """
+    Min, max, mean and count of the values added since the statistics were last taken, in constant memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # values are added on the CA threads and taken on the import loop thread
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    def add(self, value: float):
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            if self._min is None or value < self._min:
+                self._min = value
+            if self._max is None or value > self._max:
+                self._max = value
+
+    def take(self):
+        """
+        Get the statistics of the values added since they were last taken, and start over.
+
+        Returns:
+            (dict): The statistics, see MeaStatistics. Min, max and mean are None if no values were added.
+        """
+        with self._lock:
+            count, total, min_, max_ = self._count, self._sum, self._min, self._max
+            self._count, self._sum, self._min, self._max = 0, 0.0, None, None
+
+        return {
+            MeaStatistics.MIN: min_,
+            MeaStatistics.MAX: max_,
+            MeaStatistics.MEAN: total / count if count else None,
+            MeaStatistics.COUNT: count
+        }
@@ -0,0 +1,137 @@
+"""
+Check that the HLM DB has the indexes the service's frequent queries need (declared in the models' Meta.indexes), and
+optionally create the missing ones. Uses the service's DB settings unless given other credentials.
+
+Example: `python -m HLM_PV_Import.schema_check --explain` then `python -m HLM_PV_Import.schema_check --create`
+"""
+import argparse
+import sys
+
+from peewee import SqliteDatabase
+
+from shared.db_models import database, initialize_database_from_option, is_database, GamMeasurement, \
+    GamObjectrelation, GamObject
+from shared.const import DBTypeIDs
+
+# The models whose declared indexes are needed by the import's queries
+INDEXED_MODELS = (GamMeasurement, GamObjectrelation, GamObject)
+
+
+def get_required_indexes(models=INDEXED_MODELS):
+    """
+    Returns:
+        (list): The table and column names of each index declared in the models' Meta.indexes.
+    """
+    required = []
+    for model in models:
+        for field_names, _ in model._meta.indexes:
+            columns = tuple(model._meta.fields[name].column_name for name in field_names)
+            required.append((model._meta.table_name, columns))
+    return required
+
+
+def find_index(table: str, columns: tuple):
+    """
+    Get the name of an index on the table that can be used to look up the given columns, i.e. that starts with them.
+    Secondary indexes implicitly end with the primary key (in InnoDB, and the rowid in SQLite), so e.g. an index on
+    (MEA_OBJECT_ID) can be used to look up (MEA_OBJECT_ID, MEA_ID).
+
+    Returns:
+        (str): The index name, None if there isn't one.
+    """
+    columns = [column.lower() for column in columns]
+    primary_key = [column.lower() for column in database.get_primary_keys(table)]
+    for index in database.get_indexes(table):
+        index_columns = [column.lower() for column in index.columns]
+        index_columns += [column for column in primary_key if column not in index_columns]
+        if index_columns[:len(columns)] == columns:
+            return index.name
+    return None
+
+
+def create_index(table: str, columns: tuple):
+    """
+    Returns:
+        (str): The name of the created index.
+    """
+    name = f'{table}_{"_".join(columns)}'.lower()
+    quoted_columns = ', '.join(column.join(database.quote) for column in columns)
+    database.execute_sql(f'CREATE INDEX {name.join(database.quote)} ON {table.join(database.quote)} '
+                         f'({quoted_columns})')
+    return name
+
+
+def check_indexes(create: bool = False):
+    """
+    Check that the required indexes exist, creating the missing ones if asked to.
+
+    Returns:
+        (list): The table, columns and index name (None if missing) of each required index.
+    """
+    results = []
+    for table, columns in get_required_indexes():
+        name = find_index(table, columns)
+        if name is None and create:
+            name = create_index(table, columns)
+        results.append((table, columns, name))
+    return results
+
+
+def get_hot_queries():
+    """
+    Returns:
+        (dict): Queries like the ones run for each measurement, by their description.
+    """
+    return {
+        'last measurement of an object': (GamMeasurement.select()
+                                          .where(GamMeasurement.mea_object == 1)
+                                          .order_by(GamMeasurement.mea_date.desc(), GamMeasurement.mea_id.desc())
+                                          .limit(1)),
+        'current module of an object': (GamObjectrelation.select(GamObjectrelation.or_object_id_assigned)
+                                        .join(GamObject,
+                                              on=GamObjectrelation.or_object_id_assigned == GamObject.ob_id)
+                                        .where(GamObjectrelation.or_object == 1,
+                                               GamObjectrelation.or_date_removal.is_null(),
+                                               GamObject.ob_objecttype == DBTypeIDs.SLD)
+                                        .order_by(GamObjectrelation.or_id.desc())
+                                        .limit(1)),
+        'object by name': GamObject.select(GamObject.ob_id).where(GamObject.ob_name == '').limit(1)
+    }
+
+
+def explain(query):
+    """
+    Returns:
+        (list): The rows of the DB's query plan for the query.
+    """
+    sql, params = query.sql()
+    prefix = 'EXPLAIN QUERY PLAN' if is_database(database, SqliteDatabase) else 'EXPLAIN'
+    return list(database.execute_sql(f'{prefix} {sql}', params).fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--create', action='store_true', help='create the missing indexes')
+    parser.add_argument('--explain', action='store_true', help='print the query plans of the frequent queries')
+    parser.add_argument('--mysql', metavar='USER:PASS@HOST/NAME', help='DB to check instead of the service DB')
+    args = parser.parse_args()
+
+    initialize_database_from_option(args.mysql)
+
+    results = check_indexes(create=args.create)
+    for table, columns, name in results:
+        print(f'{table} ({", ".join(columns)}): {name if name else "MISSING"}')
+
+    if args.explain:
+        for description, query in get_hot_queries().items():
+            print(f'\n{description}:')
+            for row in explain(query):
+                print(f'  {row}')
+
+    if not all(name for _, _, name in results):
+        print('\nSome indexes are missing, run with --create to create them.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
+"""
+The service settings. They are read from settings.ini the first time they are used, not on import, so that importing
+the service modules has no side effects.
+"""
 import sys
 import os
 import configparser
-import win32serviceutil
+from functools import lru_cache
 from shared.const import *
 
 if getattr(sys, 'frozen', False):
@@ -23,17 +27,58 @@ else:
 
 PVConfig.PATH = os.path.join(BASE_PATH, PVConfig.FILE)
 
-config = configparser.ConfigParser()
-config.read(os.path.join(BASE_PATH, 'settings.ini'))
+
+@lru_cache(maxsize=None)
+def get_config():
+    """
+    Returns:
+        (ConfigParser): The service settings file, read the first time it is needed.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(BASE_PATH, 'settings.ini'))
+    return config
+
+
+def get_service_option(option):
+    """
+    Get an option stored with the service registration, e.g. the DB credentials.
+    """
+    import win32serviceutil  # Windows only, and only needed by the service itself
+    return win32serviceutil.GetServiceCustomOption(Service.NAME, option)
+
+
+class Setting:
+    """
+    A settings class attribute, got from the settings file the first time it is accessed.
+    """
+    _UNSET = object()
+
+    def __init__(self, getter):
+        """
+        Args:
+            getter (callable): Gets the setting value from the settings file ConfigParser.
+        """
+        self.getter = getter
+        self.value = self._UNSET
+
+    def __get__(self, instance, owner):
+        if self.value is self._UNSET:
+            self.value = self.getter(get_config())
+        return self.value
 
 
 class CA:
-    EPICS_CA_ADDR_LIST = config['ChannelAccess']['EPICS_CA_ADDR_LIST']  # Epics channel access address list
-    CONN_TIMEOUT = config['ChannelAccess'].getfloat('ConnectionTimeout')
-    STALE_AFTER = config['ChannelAccess'].getfloat('PvStaleAfter')
-    ADD_STALE_PVS = config['ChannelAccess'].getboolean('AddStalePvs')
-    PV_PREFIX = config['ChannelAccess']['PV_PREFIX'] if config['ChannelAccess']['PV_PREFIX'] else ''
-    PV_DOMAIN = config['ChannelAccess']['PV_DOMAIN'] if config['ChannelAccess']['PV_DOMAIN'] else ''
+    # Epics channel access address list
+    EPICS_CA_ADDR_LIST = Setting(lambda c: c['ChannelAccess']['EPICS_CA_ADDR_LIST'])
+    CONN_TIMEOUT = Setting(lambda c: c['ChannelAccess'].getfloat('ConnectionTimeout'))
+    STALE_AFTER = Setting(lambda c: c['ChannelAccess'].getfloat('PvStaleAfter'))
+    ADD_STALE_PVS = Setting(lambda c: c['ChannelAccess'].getboolean('AddStalePvs'))
+    # The monitor events subscribed to, e.g. log for the archive deadband (ADEL)
+    MONITOR_EVENTS = Setting(lambda c: c.get('ChannelAccess', 'MonitorEvents', fallback='value,alarm'))
+    # File to record all PV updates to, to replay them offline (see ca_recording), not recorded if empty
+    RECORD_UPDATES = Setting(lambda c: c.get('ChannelAccess', 'RecordUpdates', fallback=''))
+    PV_PREFIX = Setting(lambda c: c['ChannelAccess']['PV_PREFIX'] if c['ChannelAccess']['PV_PREFIX'] else '')
+    PV_DOMAIN = Setting(lambda c: c['ChannelAccess']['PV_DOMAIN'] if c['ChannelAccess']['PV_DOMAIN'] else '')
 
 
 class LoggingFiles:
@@ -42,6 +87,12 @@ class LoggingFiles:
     DB_LOG = os.path.join(LOGS_DIR, 'db', 'db.log')
     PVS_LOG = os.path.join(LOGS_DIR, 'pvs', 'pvs.log')
     SRV_LOG = os.path.join(LOGS_DIR, 'service', 'service.log')
+    TRACE_LOG = os.path.join(LOGS_DIR, 'trace', 'trace.log')
+
+
+class Logging:
+    # Records waiting to be written, then dropped
+    QUEUE_SIZE = Setting(lambda c: c.getint('Logging', 'QueueSize', fallback=10000))
 
 
 class Service:
@@ -52,12 +103,48 @@ class Service:
 
 # the HLM GAM DB
 class HEDB:
-    HOST = config['HeRecoveryDB']['Host']
-    NAME = config['HeRecoveryDB']['Name']
-    USER = win32serviceutil.GetServiceCustomOption(Service.NAME, 'DB_HE_USER')
-    PASS = win32serviceutil.GetServiceCustomOption(Service.NAME, 'DB_HE_PASS')
+    HOST = Setting(lambda c: c['HeRecoveryDB']['Host'])
+    NAME = Setting(lambda c: c['HeRecoveryDB']['Name'])
+    # Max open DB connections, 0 for no limit
+    POOL_SIZE = Setting(lambda c: c.getint('HeRecoveryDB', 'PoolSize', fallback=0))
+    USER = Setting(lambda _: get_service_option('DB_HE_USER'))
+    PASS = Setting(lambda _: get_service_option('DB_HE_PASS'))
 
 
 # PV Import Configuration
 class PvImportConfig:
-    LOOP_TIMER = config['PVImport'].getfloat('LoopTimer')
+    LOOP_TIMER = Setting(lambda c: c['PVImport'].getfloat('LoopTimer'))
+    ENGINE = Setting(lambda c: c.get('PVImport', 'Engine', fallback=ImportEngines.THREADING))  # one of ImportEngines
+    # Writer threads of the threading engine, 0 writes in the loop
+    WRITER_WORKERS = Setting(lambda c: c.getint('PVImport', 'WriterWorkers', fallback=0))
+    # Import worker processes, 0 imports in the service process
+    PROCESSES = Setting(lambda c: c.getint('PVImport', 'Processes', fallback=0))
+    # Share the objects with other service instances
+    LEASES = Setting(lambda c: c.getboolean('PVImport', 'Leases', fallback=False))
+    # Convert the raw values with the calibration curves of the objects types
+    CALIBRATION = Setting(lambda c: c.getboolean('PVImport', 'Calibration', fallback=False))
+    # Check the values against the limits of their display formats, setting the measurements MEA_VALID and MEA_STATUS
+    VALIDATION = Setting(lambda c: c.getboolean('PVImport', 'Validation', fallback=False))
+
+
+# Metrics exposition
+class Metrics:
+    PORT = Setting(lambda c: c.getint('Metrics', 'Port', fallback=0))  # 0 disables the HTTP endpoint
+    DUMP_FILE = Setting(lambda c: c.get('Metrics', 'DumpFile', fallback=''))  # empty disables the file dump
+    DUMP_INTERVAL = Setting(lambda c: c.getfloat('Metrics', 'DumpInterval', fallback=60))
+
+
+# Local status & control channel for the Service Manager. Any local process can connect to the port, so the commands
+# (e.g. reload_config) need the token, if set. The status can be read without it.
+class Status:
+    PORT = Setting(lambda c: c.getint('Status', 'Port', fallback=0))  # 0 disables the status channel
+    TOKEN = Setting(lambda c: c.get('Status', 'Token', fallback=''))  # empty allows the commands without a token
+
+
+# Import loop tracing & profiling, can be switched on at runtime with the flag files
+class Tracing:
+    ENABLED = Setting(lambda c: c.getboolean('Tracing', 'Enabled', fallback=False))  # trace even without the flag file
+    # Seconds between span reports
+    REPORT_INTERVAL = Setting(lambda c: c.getfloat('Tracing', 'ReportInterval', fallback=300))
+    TRACE_FLAG = os.path.join(BASE_PATH, 'trace.flag')
+    PROFILE_FLAG = os.path.join(BASE_PATH, 'profile.flag')
@@ -0,0 +1,140 @@
+"""
+Local status and control channel of the PV import service, for the Service Manager to follow the service live instead
+of polling its files. Enabled with the [Status] Port setting.
+
+Clients connect over TCP to the local port, and exchange JSON messages, one per line. The service pushes a status
+message on connect and then every push interval, e.g.
+
+    {"type": "status", "time": 1614556800.0, "monitored_pvs": 120, "stale_pvs": 2, ...}
+
+Clients send commands, e.g. {"command": "reload_config", "token": "..."}, which are answered with a reply message, e.g.
+
+    {"type": "reply", "command": "reload_config", "ok": true}
+
+The "status" command is answered with a status message right away. Any local process can connect, so if the server has
+a token (the [Status] Token setting), the other commands are only run for the messages with the same token.
+"""
+import hmac
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from HLM_PV_Import.logger import logger, log_exception
+
+PUSH_INTERVAL = 2  # seconds between the status messages pushed to each client
+MAX_MESSAGE_SIZE = 64 * 1024  # bytes, clients sending longer lines are disconnected
+
+
+class _StatusRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Pushes the status to a client, and answers its commands, until it disconnects or the server is stopped.
+    """
+
+    def handle(self):
+        status_server = self.server.status_server
+        buffer = b''
+        next_push = 0
+        try:
+            while not status_server.stopping:
+                now = time.monotonic()
+                if now >= next_push:
+                    self._send(status_server.get_status_message())
+                    next_push = now + status_server.interval
+                self.request.settimeout(next_push - now if next_push > now else status_server.interval)
+                try:
+                    data = self.request.recv(4096)
+                except socket.timeout:
+                    continue
+                if not data:
+                    return  # the client disconnected
+                buffer += data
+                *lines, buffer = buffer.split(b'\n')
+                if len(buffer) > MAX_MESSAGE_SIZE:
+                    return
+                for line in lines:
+                    if line.strip():
+                        self._send(status_server.handle_command(line))
+        except OSError:
+            pass  # the connection was reset
+
+    def _send(self, message: dict):
+        self.request.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+class StatusServer:
+    """
+    Serves the service status and commands on a local port, in daemon threads.
+    """
+
+    def __init__(self, port: int, get_status, commands: dict = None, host: str = '127.0.0.1',
+                 interval: float = PUSH_INTERVAL, token: str = ''):
+        """
+        Args:
+            port (int): The port to listen on, 0 to use any free port.
+            get_status (callable): Returns the status, as a JSON serializable dict.
+            commands (dict, optional): The command names and the functions running them, which may return a dict of
+                values to add to the reply.
+            host (str, optional): The address to listen on, Defaults to the local host only.
+            interval (float, optional): The seconds between the status messages pushed to each client.
+            token (str, optional): The token the command messages need, other than status. If empty, none is needed.
+        """
+        self.get_status = get_status
+        self.commands = commands or {}
+        self.interval = interval
+        self.token = token
+        self.stopping = False
+        self.tcp_server = socketserver.ThreadingTCPServer((host, port), _StatusRequestHandler)
+        self.tcp_server.daemon_threads = True
+        self.tcp_server.status_server = self
+        self._thread = threading.Thread(target=self.tcp_server.serve_forever, name='StatusServer', daemon=True)
+
+    @property
+    def port(self):
+        return self.tcp_server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        logger.info(f'Serving the service status on {self.tcp_server.server_address[0]}:{self.port}')
+
+    def stop(self):
+        self.stopping = True
+        self.tcp_server.shutdown()
+        self.tcp_server.server_close()
+
+    def get_status_message(self):
+        return {'type': 'status', 'time': time.time(), **self.get_status()}
+
+    def handle_command(self, line: bytes):
+        """
+        Run the command of a client message.
+
+        Returns:
+            (dict): The reply to send back.
+        """
+        try:
+            message = json.loads(line)
+            command, token = message['command'], message.get('token', '')
+            if not isinstance(command, str) or not isinstance(token, str):
+                raise TypeError
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {'type': 'reply', 'command': None, 'ok': False, 'error': 'Invalid message.'}
+
+        if command == 'status':
+            return self.get_status_message()
+        if self.token and not hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8')):
+            logger.warning(f'Refused the {command} command from the status channel, with an invalid token.')
+            return {'type': 'reply', 'command': command, 'ok': False, 'error': 'Invalid token.'}
+        func = self.commands.get(command)
+        if func is None:
+            return {'type': 'reply', 'command': command, 'ok': False, 'error': f'Unknown command {command!r}.'}
+        try:
+            logger.info(f'Running the {command} command from the status channel.')
+            result = func()
+        except Exception as e:
+            logger.error(f'The {command} command failed: {e}')
+            log_exception(*sys.exc_info())
+            return {'type': 'reply', 'command': command, 'ok': False, 'error': str(e)}
+        return {'type': 'reply', 'command': command, 'ok': True, **(result or {})}
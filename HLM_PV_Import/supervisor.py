@@ -0,0 +1,187 @@
+"""
+Supervisor mode, running the PV import in a number of worker processes, each importing a shard of the configured
+objects with its own PV monitors and DB connections, so that the import is not limited to one core by the GIL.
+Enabled with the [PVImport] Processes setting.
+"""
+import multiprocessing
+import threading
+import time
+
+from HLM_PV_Import.logger import logger
+from HLM_PV_Import.metrics import registry
+
+# The workers are started as new processes on every platform, as they are on Windows, rather than forked with the
+# supervisor's log handlers and threads
+mp_context = multiprocessing.get_context('spawn')
+
+CHECK_INTERVAL = 5  # seconds between worker health checks
+HEARTBEAT_TIMEOUT = 300  # seconds without an import loop after which a worker is considered hung and restarted
+RESTART_DELAY = 10  # min seconds between restarts of the same worker, so a failing worker doesn't spin
+STOP_TIMEOUT = 30  # seconds a worker has to finish its loop once asked to stop, after which it is terminated
+METRICS_INTERVAL = 2  # seconds between the reports of a worker's metrics to the supervisor
+
+# The import metrics reported by the workers, and how the supervisor combines the values of all workers
+WORKER_METRICS = {
+    'hlm_monitored_pvs': sum,
+    'hlm_stale_pvs': sum,
+    'hlm_measurements_added_total': sum,
+    'hlm_writer_queue_depth': sum,
+    'hlm_db_last_insert_timestamp_seconds': max,
+    'hlm_db_healthy': min,
+}
+
+WORKERS_ALIVE = registry.gauge('hlm_supervisor_workers_alive', 'Number of running and responsive import workers.')
+WORKER_RESTARTS = registry.counter('hlm_supervisor_worker_restarts_total',
+                                   'Number of import workers restarted after exiting or hanging.')
+
+
+def _run_worker(shard_index: int, shard_count: int, heartbeat, metrics, stop_event):
+    """
+    The worker process target, importing the objects of its shard until the stop event is set.
+    """
+    import HLM_PV_Import.__main__ as main_  # imported in the worker process only
+    main_.bootstrap(log_suffix=str(shard_index))  # each worker logs to its own files
+
+    def stop_when_asked():
+        stop_event.wait()
+        main_.stop()
+
+    def report_metrics():
+        while not stop_event.wait(METRICS_INTERVAL):
+            metrics[:] = [registry.get(name).value for name in WORKER_METRICS]
+
+    threading.Thread(target=stop_when_asked, name='stop_listener', daemon=True).start()
+    threading.Thread(target=report_metrics, name='metrics_reporter', daemon=True).start()
+    main_.run_import(shard_index, shard_count, heartbeat)
+
+
+class Worker:
+    """
+    An import worker process, the heartbeat it updates on each import loop, and the values of its WORKER_METRICS.
+    """
+
+    def __init__(self, shard_index: int, shard_count: int, stop_event):
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.stop_event = stop_event
+        self.heartbeat = mp_context.Value('d', 0.0)
+        self.metrics = mp_context.Array('d', len(WORKER_METRICS))
+        self.process = None
+        self.started = 0.0
+
+    def start(self):
+        self.heartbeat.value = 0.0
+        self.metrics[:] = [0.0] * len(WORKER_METRICS)
+        self.process = mp_context.Process(target=_run_worker, name=f'pv_import_{self.shard_index}',
+                                          args=(self.shard_index, self.shard_count, self.heartbeat, self.metrics,
+                                                self.stop_event),
+                                          daemon=True)
+        self.process.start()
+        self.started = time.time()
+        logger.info(f'Started import worker {self.shard_index}/{self.shard_count} (pid {self.process.pid}).')
+
+    def is_healthy(self, now: float):
+        """
+        Whether the worker is running, and has run an import loop recently, or is still starting up.
+        """
+        if not self.process.is_alive():
+            return False
+        return now - max(self.heartbeat.value, self.started) < HEARTBEAT_TIMEOUT
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        """
+        Wait for the worker to exit once the stop event is set, terminating it if it doesn't in time.
+        """
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning(f'Import worker {self.shard_index} did not stop in time, terminating it.')
+            self.process.terminate()
+            self.process.join()
+
+
+class Supervisor:
+    """
+    Start a worker process per shard of the configured objects, restarting the workers that exit or stop running
+    import loops, until stopped. The import metrics of the supervisor process are the combined ones of its workers.
+    """
+
+    def __init__(self, processes: int):
+        self._stop_event = mp_context.Event()
+        self.workers = [Worker(i, processes, self._stop_event) for i in range(processes)]
+        self.running = False
+        self._workers_lock = threading.Lock()  # held while checking or restarting the workers
+        WORKERS_ALIVE.function = lambda: sum(worker.is_healthy(time.time()) for worker in self.workers)
+        for name in WORKER_METRICS:
+            metric = registry.get(name)
+            if metric is not None:
+                metric.function = lambda name_=name: self.get_worker_metric(name_)
+
+    def get_worker_metric(self, name: str):
+        """
+        Returns:
+            (float): The value of the worker metric, one of the WORKER_METRICS, combined for all workers.
+        """
+        index = list(WORKER_METRICS).index(name)
+        return WORKER_METRICS[name](worker.metrics[index] for worker in self.workers)
+
+    def run(self):
+        """
+        Start the workers and supervise them, returning once stopped.
+        """
+        self.running = True
+        for worker in self.workers:
+            worker.start()
+
+        while self.running:
+            time.sleep(CHECK_INTERVAL)
+            self.check_workers()
+
+        for worker in self.workers:
+            worker.stop()
+        logger.info('Stopped all import workers.')
+
+    def check_workers(self):
+        """
+        Restart the workers that have exited or hung.
+        """
+        with self._workers_lock:
+            self._check_workers()
+
+    def _check_workers(self):
+        now = time.time()
+        for worker in self.workers:
+            if not self.running or worker.is_healthy(now) or now - worker.started < RESTART_DELAY:
+                continue
+            if worker.process.is_alive():
+                logger.error(f'Import worker {worker.shard_index} has not run an import loop in '
+                             f'{HEARTBEAT_TIMEOUT}s, restarting it.')
+                worker.process.terminate()
+                worker.process.join()
+            else:
+                logger.error(f'Import worker {worker.shard_index} exited with code {worker.process.exitcode}, '
+                             f'restarting it.')
+            WORKER_RESTARTS.inc()
+            worker.start()
+
+    def restart_workers(self):
+        """
+        Stop all the workers after their current import loop and start them again, e.g. to load a new PV config.
+        """
+        with self._workers_lock:
+            if not self.running:
+                return
+            self._stop_event.set()
+            for worker in self.workers:
+                worker.stop()
+            if not self.running:
+                return  # stopped in the meantime
+            self._stop_event.clear()
+            for worker in self.workers:
+                worker.start()
+
+    def stop(self):
+        """
+        Ask the workers to stop after their current import loop, and stop supervising them.
+        """
+        self.running = False
+        self._stop_event.set()
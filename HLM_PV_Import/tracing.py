@@ -0,0 +1,203 @@
+"""
+Timing spans and on-demand profiling for the PV import loop.
+
+Tracing is switched on at runtime by creating the trace flag file in the service directory, and profiling by creating
+the profile flag file (write 'pyinstrument' in it to use pyinstrument instead of cProfile, if installed).
+Removing a flag file switches it off again. Span statistics are written periodically to the trace log.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from HLM_PV_Import.logger import trace_logger, log_exception
+from HLM_PV_Import.metrics import Histogram
+from HLM_PV_Import.settings import Tracing, LoggingFiles
+
+SPAN_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROFILE_TOP_ENTRIES = 30
+REPORT_INTERVAL = 300  # seconds between span reports, until configured from the settings
+
+
+class SpanStats:
+    """
+    Aggregated durations of one span name.
+    """
+
+    def __init__(self, name):
+        self.histogram = Histogram(name, '', buckets=SPAN_BUCKETS)
+        self.max = 0.0
+
+    def add(self, duration):
+        self.histogram.observe(duration)
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, fraction):
+        """ Upper bound of the bucket containing the given fraction of observations. """
+        threshold = fraction * self.histogram.count
+        for bound, cumulative in self.histogram.cumulative_buckets():
+            if cumulative >= threshold:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        count = self.histogram.count
+        mean = self.histogram.sum / count if count else 0
+        return (f'count={count} total={self.histogram.sum:.3f}s mean={mean * 1000:.2f}ms '
+                f'p50<={self.percentile(0.5) * 1000:.2f}ms p95<={self.percentile(0.95) * 1000:.2f}ms '
+                f'max={self.max * 1000:.2f}ms')
+
+
+class Tracer:
+    """
+    Records span durations while enabled, and starts/stops profiling based on the flag files. Spans can be recorded
+    from any thread.
+    """
+
+    def __init__(self, trace_flag: str = Tracing.TRACE_FLAG, profile_flag: str = Tracing.PROFILE_FLAG,
+                 report_interval: float = REPORT_INTERVAL, enabled: bool = False):
+        self.trace_flag = trace_flag
+        self.profile_flag = profile_flag
+        self.report_interval = report_interval
+        self.always_enabled = enabled
+        self.enabled = enabled
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._last_report = time.time()
+        self._profiler = None
+        self._profiler_type = None
+
+    def configure(self, enabled: bool, report_interval: float):
+        """
+        Set whether to trace even without the trace flag file, and the seconds between span reports.
+        """
+        self.always_enabled = enabled
+        self.enabled = self.enabled or enabled
+        self.report_interval = report_interval
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Time the with block under the given span name, if tracing is enabled.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, duration: float):
+        with self._stats_lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = SpanStats(name)
+            stats.add(duration)
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def check_flags(self):
+        """
+        Returns:
+            (tuple): Whether the trace flag file and the profile flag file exist.
+        """
+        return os.path.exists(self.trace_flag), os.path.exists(self.profile_flag)
+
+    def poll(self, flags: tuple = None):
+        """
+        Check the flag files and write the span report if due. Meant to be called once per import loop, from the
+        thread running the loop (profilers only follow the thread they were started in). Errors are logged rather
+        than raised, so that tracing can't stop the import.
+
+        Args:
+            flags (tuple, optional): The flag files existence, see check_flags, e.g. checked on another thread so as
+                not to block the loop. Checked here if None.
+        """
+        try:
+            self._poll(*(flags if flags is not None else self.check_flags()))
+        except Exception as e:
+            trace_logger.error(f'Tracing poll failed: {e}')
+            log_exception(*sys.exc_info())
+
+    def _poll(self, trace_requested: bool, profile_requested: bool):
+        was_enabled = self.enabled
+        self.enabled = self.always_enabled or trace_requested
+        if self.enabled != was_enabled:
+            trace_logger.info(f'Tracing {"enabled" if self.enabled else "disabled"}.')
+            if not self.enabled:
+                self.write_report()
+
+        if self.enabled and time.time() - self._last_report >= self.report_interval:
+            self.write_report()
+
+        if profile_requested and self._profiler is None:
+            self._start_profiler()
+        elif not profile_requested and self._profiler is not None:
+            self._stop_profiler()
+
+    def write_report(self):
+        """
+        Write the span statistics since the last report to the trace log, then reset them.
+        """
+        self._last_report = time.time()
+        with self._stats_lock:
+            stats, self._stats = self._stats, {}
+        if not stats:
+            return
+        lines = [f'{name}: {span_stats.summary()}' for name, span_stats in sorted(stats.items())]
+        trace_logger.info('Span timings:\n' + '\n'.join(lines))
+
+    def _start_profiler(self):
+        with open(self.profile_flag) as f:
+            requested = f.read().strip().lower()
+
+        self._profiler_type = 'cProfile'
+        if requested == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+                self._profiler = Profiler()
+                self._profiler_type = 'pyinstrument'
+            except ImportError:
+                trace_logger.warning('pyinstrument is not installed, falling back to cProfile.')
+
+        if self._profiler_type == 'cProfile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+        trace_logger.info(f'Started {self._profiler_type} profiling.')
+
+    def _stop_profiler(self):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        profiles_dir = os.path.dirname(LoggingFiles.TRACE_LOG)
+
+        if self._profiler_type == 'pyinstrument':
+            self._profiler.stop()
+            output_path = os.path.join(profiles_dir, f'profile_{timestamp}.html')
+            with open(output_path, 'w') as f:
+                f.write(self._profiler.output_html())
+            summary = self._profiler.output_text()
+        else:
+            self._profiler.disable()
+            output_path = os.path.join(profiles_dir, f'profile_{timestamp}.prof')
+            self._profiler.dump_stats(output_path)
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP_ENTRIES)
+            summary = stream.getvalue()
+
+        trace_logger.info(f'Stopped {self._profiler_type} profiling, saved to {output_path}\n{summary}')
+        self._profiler = None
+        self._profiler_type = None
+
+
+tracer = Tracer()
@@ -4,7 +4,9 @@ from HLM_PV_Import.settings import PVConfig, CA
 from HLM_PV_Import.ca_wrapper import get_connected_pvs
 from HLM_PV_Import.db_func import get_object
 import json
+import zlib
 
+from shared.const import MeaStatistics
 from shared.utils import get_full_pv_name
 
 
@@ -14,8 +16,14 @@ class UserConfig:
     including config schema and content validation.
     """
 
-    def __init__(self):
-        self.entries = self._get_all_entries()
+    def __init__(self, shard_index: int = 0, shard_count: int = 1):
+        """
+        Args:
+            shard_index (int, optional): Only keep the entries of this shard of the objects, see get_shard.
+            shard_count (int, optional): The number of shards the objects are split into, Defaults to 1 (all entries).
+        """
+        self.entries = [entry for entry in self._get_all_entries()
+                        if get_shard(entry[PVConfig.OBJ], shard_count) == shard_index]
         self.object_ids = [entry[PVConfig.OBJ] for entry in self.entries]
         self.logging_periods = {entry[PVConfig.OBJ]: entry[PVConfig.LOG_PERIOD] for entry in self.entries}
 
@@ -23,6 +31,7 @@ class UserConfig:
         try:
             self._check_entries_have_object_ids()
             self._check_entries_have_measurement_pvs()
+            self._check_entries_statistics()
             self._check_no_duplicate_object_ids()
             self._check_objects_exist()
             self._check_measurement_pvs_connect()
@@ -105,6 +114,23 @@ class UserConfig:
         if objects_with_no_pvs:
             raise PVConfigurationException(f'Objects {objects_with_no_pvs} have no measurement PVs.')
 
+    def _check_entries_statistics(self):
+        """
+        Verifies that the entries measurement statistics, if any, are valid.
+
+        Raises:
+            PVConfigurationException: If one or more entries have an invalid statistic.
+        """
+        invalid = {}
+        for obj_id in self.object_ids:
+            statistics = self.get_entry_statistics(obj_id)
+            if any(statistic not in MeaStatistics.ALL for statistic in statistics.values()):
+                invalid[obj_id] = statistics
+
+        if invalid:
+            raise PVConfigurationException(f'Objects have invalid measurement statistics: {invalid}, '
+                                           f'expected one of: {", ".join(MeaStatistics.ALL)}.')
+
     def get_measurement_pvs(self, no_duplicates=True, full_names=False):
         """
         Gets a list of the measurement PVs, ignoring empty/null measurements.
@@ -149,6 +175,19 @@ class UserConfig:
         return {key: get_full_pv_name(val, prefix=CA.PV_PREFIX, domain=CA.PV_DOMAIN)
                 if full_names else val for key, val in entry_meas.items() if val}
 
+    def get_entry_statistics(self, object_id):
+        """
+        Get the statistics to add as measurement values of the entry with the given object ID, if it has any.
+
+        Args:
+            object_id (str): The object ID.
+
+        Returns:
+            (dict): The statistics, in measurement number/statistic pairs. Measurements not included get the last value.
+        """
+        entry = next((x for x in self.entries if x[PVConfig.OBJ] == object_id), {})
+        return entry.get(PVConfig.STATS) or {}
+
     @staticmethod
     def _get_all_entries():
         """
@@ -173,6 +212,21 @@ class UserConfig:
             return data
 
 
+def get_shard(object_id, shard_count: int):
+    """
+    Get the shard an object is imported by when the objects are split between a number of import processes. The
+    same on every process and run, unlike the built-in hash of strings.
+
+    Args:
+        object_id (int): The object ID.
+        shard_count (int): The number of shards.
+
+    Returns:
+        (int): The shard index.
+    """
+    return zlib.crc32(str(object_id).encode()) % shard_count
+
+
 class PVConfigurationException(ValueError):
     """
     There is a problem with the PV configuration.
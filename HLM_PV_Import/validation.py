@@ -0,0 +1,115 @@
+"""
+Validation of the measurement values against the limits of their display format (gam_displayformat), set on the
+object, its type or its class for each measurement number. Enabled with the [PVImport] Validation setting.
+
+Measurements with a value outside of its lower/upper limits are added as not valid (MEA_VALID 0), with the
+OUT_OF_RANGE status, and ones with a value beyond its alarm limits with the ALARM status, see MeaStatus.
+"""
+import numbers
+
+import numpy as np
+
+from HLM_PV_Import.logger import pv_logger
+from shared.const import MeaStatus
+
+MEASUREMENT_NUMBERS = ('1', '2', '3', '4', '5')
+LIMIT_FIELDS = ('df_lowerlimit', 'df_upperlimit', 'df_alarmlow', 'df_alarmhigh')
+LOWER, UPPER, ALARM_LOW, ALARM_HIGH = range(len(LIMIT_FIELDS))  # the rows of the limits arrays
+
+
+def get_limits(display_formats: list):
+    """
+    Get the limits of the measurement values from their display formats.
+
+    Args:
+        display_formats (list): The display format (GamDisplayformat) of each measurement number, None if it doesn't
+            have one.
+
+    Returns:
+        (numpy.ndarray): The lower, upper, alarm low and alarm high limits (rows) of each measurement (columns), NaN
+            for the limits not set.
+    """
+    limits = np.full((len(LIMIT_FIELDS), len(MEASUREMENT_NUMBERS)), np.nan)
+    for column, display_format in enumerate(display_formats):
+        if display_format is None:
+            continue
+        for row, field in enumerate(LIMIT_FIELDS):
+            limit = getattr(display_format, field)
+            if limit is not None:
+                limits[row, column] = float(limit)
+    return limits
+
+
+def _to_float(value):
+    return float(value) if isinstance(value, numbers.Real) else np.nan
+
+
+class ObjectLimits:
+    """
+    The limits of the measurement values of the imported objects, resolved once per object, checked for all the
+    measurements of an import loop at once.
+    """
+
+    def __init__(self):
+        self._limits = {}  # object ID and the limits of its measurements, None if it has none
+
+    def get_missing_objects(self, object_ids):
+        """
+        Returns:
+            (list): The IDs of the objects whose limits are not known yet.
+        """
+        return [object_id for object_id in object_ids if object_id not in self._limits]
+
+    def add_objects(self, object_ids, display_formats: dict):
+        """
+        Add the limits of the objects.
+
+        Args:
+            object_ids (list): The object IDs.
+            display_formats (dict): The object IDs and the display formats of their measurements, see
+                db_func.get_object_display_formats. Objects not found don't get limits.
+        """
+        for object_id in object_ids:
+            limits = get_limits(display_formats.get(object_id, []))
+            self._limits[object_id] = None if np.isnan(limits).all() else limits
+
+    def validate(self, measurements: list):
+        """
+        Check the values of the measurements against their limits, with one comparison of all the values. Values that
+        are not numbers are not checked.
+
+        Args:
+            measurements (list): The object ID and measurement values of each measurement.
+
+        Returns:
+            (list): The MEA_VALID and MEA_STATUS of each measurement, MeaStatus.OK for the objects without limits.
+        """
+        validity = [(1, MeaStatus.OK)] * len(measurements)
+        checked = [(index, limits) for index, limits in enumerate(self._limits.get(object_id)
+                                                                  for object_id, _ in measurements)
+                   if limits is not None]
+        if not checked:
+            return validity
+
+        indexes = [index for index, _ in checked]
+        limits = np.stack([object_limits for _, object_limits in checked])  # measurement, limit, measurement number
+        values = np.array([[_to_float(measurements[index][1].get(number)) for number in MEASUREMENT_NUMBERS]
+                           for index in indexes])
+
+        # Comparisons with NaN are false, so missing values and limits never flag a measurement
+        with np.errstate(invalid='ignore'):
+            out_of_range = ((values < limits[:, LOWER]) | (values > limits[:, UPPER])).any(axis=1)
+            alarm = ((values < limits[:, ALARM_LOW]) | (values > limits[:, ALARM_HIGH])).any(axis=1)
+
+        for index, is_out_of_range, is_alarm in zip(indexes, out_of_range.tolist(), alarm.tolist()):
+            if is_out_of_range:
+                validity[index] = (0, MeaStatus.OUT_OF_RANGE)
+            elif is_alarm:
+                validity[index] = (1, MeaStatus.ALARM)
+            else:
+                continue
+            object_id, mea_values = measurements[index]
+            pv_logger.warning(f'Measurement of object {object_id} has values '
+                              f'{"out of range" if is_out_of_range else "beyond the alarm limits"}: '
+                              f'{dict(mea_values)}')
+        return validity
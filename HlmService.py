@@ -1,3 +1,5 @@
+import multiprocessing
+import os
 import servicemanager
 import socket
 import sys
@@ -46,16 +48,21 @@ class PVImportService(win32serviceutil.ServiceFramework):
 
     @staticmethod
     def main():
+        main_.bootstrap()
         logger.info("Starting service")
+        if not getattr(sys, 'frozen', False):
+            # Run by pythonservice.exe, which can't run the supervisor workers
+            multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'python.exe'))
         main_.main()
 
     @staticmethod
     def stop():
         logger.info("Stop request received")
-        main_.pv_import.stop()
+        main_.stop()
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # the supervisor workers are started by re-running the bundled executable
     if len(sys.argv) == 1:
         servicemanager.Initialize()
         servicemanager.PrepareToHostSingle(PVImportService)
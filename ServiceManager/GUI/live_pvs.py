@@ -0,0 +1,175 @@
+import time
+from datetime import datetime
+
+from PyQt5.QtCore import Qt, QTimer, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtGui import QColor, QShowEvent
+from PyQt5.QtWidgets import QDialog, QHeaderView
+from PyQt5 import uic
+
+from ServiceManager.constants import live_pvs_ui
+from ServiceManager.live_pvs import LivePvMonitors
+from ServiceManager.logger import manager_logger
+from ServiceManager.settings import Settings
+
+FRAME_INTERVAL = 200  # msec between refreshes of the table with the updates received in the meantime
+
+
+class LivePvColumn:
+    PV = 0
+    VALUE = 1
+    LAST_UPDATE = 2
+    OBJECTS = 3
+
+
+class LivePvTableModel(QAbstractTableModel):
+    """ The config measurement PVs and their last value, updated in one pass per refresh. """
+
+    HEADERS = ('PV', 'Value', 'Last Update', 'Objects')
+
+    def __init__(self, pvs: dict, *args, **kwargs):
+        """
+        Args:
+            pvs (dict): The full PV names and the IDs of the objects using them.
+        """
+        super(LivePvTableModel, self).__init__(*args, **kwargs)
+        self.pv_names = list(pvs)
+        self.object_ids = [', '.join(str(object_id) for object_id in object_ids) for object_ids in pvs.values()]
+        self.values = [None] * len(self.pv_names)
+        self.update_times = [None] * len(self.pv_names)
+        self.connected = [False] * len(self.pv_names)
+        self._rows = {pv_name: row for row, pv_name in enumerate(self.pv_names)}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.pv_names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            if column == LivePvColumn.PV:
+                return self.pv_names[row]
+            if column == LivePvColumn.VALUE:
+                return '' if self.values[row] is None else str(self.values[row])
+            if column == LivePvColumn.LAST_UPDATE:
+                update_time = self.update_times[row]
+                return datetime.fromtimestamp(update_time).strftime('%H:%M:%S') if update_time else ''
+            if column == LivePvColumn.OBJECTS:
+                return self.object_ids[row]
+        elif role == Qt.ForegroundRole and not self.connected[row]:
+            return QColor('gray')
+        elif role == Qt.ToolTipRole and not self.connected[row]:
+            return 'Disconnected' if self.update_times[row] else 'Not connected yet'
+        return None
+
+    def apply_updates(self, updates: dict):
+        """
+        Set the values of the updated PVs, and refresh the rows in between the first and last updated rows at once.
+
+        Args:
+            updates (dict): The names of the updated PVs and their value and update time, or None if they
+                disconnected.
+        """
+        first_row, last_row = len(self.pv_names), -1
+        for pv_name, update in updates.items():
+            row = self._rows.get(pv_name)
+            if row is None:
+                continue
+            if update is None:
+                self.connected[row] = False
+            else:
+                self.values[row], self.update_times[row] = update
+                self.connected[row] = True
+            first_row, last_row = min(first_row, row), max(last_row, row)
+        if last_row >= 0:
+            # noinspection PyUnresolvedReferences
+            self.dataChanged.emit(self.index(first_row, 0), self.index(last_row, len(self.HEADERS) - 1))
+
+
+class LivePvFilterModel(QSortFilterProxyModel):
+    """ Filters the PVs by name or object ID, the columns that don't change with the updates. """
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        pattern = self.filterRegExp()
+        model = self.sourceModel()
+        return pattern.isEmpty() or any(pattern.indexIn(model.data(model.index(source_row, column))) != -1
+                                        for column in (LivePvColumn.PV, LivePvColumn.OBJECTS))
+
+
+class UILivePVs(QDialog):
+    """
+    Live values of the measurement PVs of the PV config. The PVs are monitored while the window is open, and the table
+    refreshed every FRAME_INTERVAL with the updates received since, so the GUI stays responsive with thousands of
+    PVs updating fast.
+    """
+
+    def __init__(self):
+        super(UILivePVs, self).__init__()
+        uic.loadUi(uifile=live_pvs_ui, baseinstance=self)
+        # noinspection PyTypeChecker
+        self.setWindowFlags(self.windowFlags() ^ Qt.WindowContextHelpButtonHint)
+
+        # region Attributes
+        self.monitors = None
+        self.model = None
+        self.last_rate_check = (0, 0.0)  # updates received and time of the last update rate calculation
+        self.updates_per_second = 0
+        # endregion
+
+        self.proxy_model = LivePvFilterModel(self)
+        self.proxy_model.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.proxy_model.setDynamicSortFilter(False)  # don't sort & filter the updated rows again on every refresh
+        self.pv_table.setModel(self.proxy_model)
+        self.pv_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.pv_table.sortByColumn(LivePvColumn.PV, Qt.AscendingOrder)
+        self.filter_bar.textChanged.connect(self.proxy_model.setFilterFixedString)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.finished.connect(self.stop_monitors)  # closed, or Esc pressed
+
+    def showEvent(self, event: QShowEvent):
+        super(UILivePVs, self).showEvent(event)
+        self.start_monitors()
+
+    def start_monitors(self):
+        if self.monitors is not None:
+            return
+        ca_settings = Settings.Service.CA
+        pvs = {}
+        for pv_name, object_ids in Settings.Service.PVConfig.get_measurement_pvs().items():
+            pvs.setdefault(ca_settings.get_full_pv_name(pv_name), []).extend(object_ids)
+
+        self.model = LivePvTableModel(pvs, self)
+        self.proxy_model.setSourceModel(self.model)
+        self.pv_table.resizeColumnToContents(LivePvColumn.PV)
+
+        manager_logger.info(f'Monitoring {len(pvs)} PVs for the live PV values.')
+        self.monitors = LivePvMonitors(list(pvs))
+        self.monitors.start()
+        self.last_rate_check = (0, time.monotonic())
+        self.refresh_timer.start(FRAME_INTERVAL)
+
+    def stop_monitors(self):
+        self.refresh_timer.stop()
+        if self.monitors is not None:
+            self.monitors.stop()
+            self.monitors = None
+
+    def refresh(self):
+        """ Apply the updates received since the last refresh, at most one per PV. """
+        self.model.apply_updates(self.monitors.take_updates())
+
+        updates_received, now = self.monitors.updates_received, time.monotonic()
+        last_updates_received, last_check = self.last_rate_check
+        if now - last_check >= 1:
+            self.updates_per_second = (updates_received - last_updates_received) / (now - last_check)
+            self.last_rate_check = (updates_received, now)
+        self.summary_lbl.setText(f'{sum(self.model.connected)}/{len(self.model.pv_names)} PVs connected, '
+                                 f'{self.updates_per_second:.0f} updates/s')
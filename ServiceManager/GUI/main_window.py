@@ -18,9 +18,12 @@ from ServiceManager.GUI.general_settings import UIGeneralSettings
 from ServiceManager.GUI.ca_settings import UICASettings
 from ServiceManager.GUI.service_path_dlg import UIServicePathDialog
 from ServiceManager.GUI.config_entry import UIConfigEntryDialog
+from ServiceManager.GUI.live_pvs import UILivePVs
 from ServiceManager.utilities import is_admin, set_colored_text, setup_button
-from ServiceManager.GUI.main_window_threads import ServiceLogUpdaterThread, ServiceStatusCheckThread
+from ServiceManager.GUI.main_window_threads import ServiceLogUpdaterThread, ServiceStatusCheckThread, \
+    ServiceStatusSubscriberThread
 from ServiceManager.db_func import db_connected, get_object_name, get_object_type
+from shared.ca_context import ca_context
 from shared.const import SERVICE_NAME
 from shared.utils import get_object_module
 
@@ -48,6 +51,7 @@ class UIMainWindow(QMainWindow):
         self.ca_settings_w = UICASettings()                 # "Channel Access" dialogue window
         self.service_dir_path_w = UIServicePathDialog()     # "Service Directory" dialogue window
         self.config_entry_w = UIConfigEntryDialog()         # Add/Edit Configuration Entry dialogue window
+        self.live_pvs_w = UILivePVs()                       # "Live PV Values" window
         # endregion
 
         # region External windows setup
@@ -76,6 +80,8 @@ class UIMainWindow(QMainWindow):
         self.ca_settings_action.triggered.connect(lambda _: self.trigger_window(self.ca_settings_w))
         self.service_directory_action.triggered.connect(self.trigger_service_directory)
         self.open_pv_config_action.triggered.connect(self.trigger_open_pv_config)
+        self.live_pvs_action.triggered.connect(lambda _: self.trigger_window(self.live_pvs_w))
+        self.reload_service_config_action.triggered.connect(self.reload_service_config)
         # endregion
 
         # region Setup widgets
@@ -148,9 +154,21 @@ class UIMainWindow(QMainWindow):
         self.thread_service_log.start()
         # endregion
 
+        # region Service Status Channel Thread
+        # noinspection PyTypeChecker
+        self.thread_service_channel = ServiceStatusSubscriberThread()
+        self.thread_service_channel.status_received.connect(self.update_service_live_status)
+        self.thread_service_channel.reply_received.connect(self.show_service_reply)
+        self.thread_service_channel.connection_changed.connect(self.update_service_channel_connection)
+        self.thread_service_channel.start()
+        # endregion
+
         # QThreads graceful exit on app close
         QApplication.instance().aboutToQuit.connect(self.thread_service_status.stop)
         QApplication.instance().aboutToQuit.connect(self.thread_service_log.stop)
+        QApplication.instance().aboutToQuit.connect(self.thread_service_channel.stop)
+        QApplication.instance().aboutToQuit.connect(self.live_pvs_w.stop_monitors)
+        QApplication.instance().aboutToQuit.connect(ca_context.disconnect)
         # endregion
 
         # region Service Log Widgets
@@ -213,6 +231,8 @@ class UIMainWindow(QMainWindow):
         self.thread_service_status.start()
         self.thread_service_status.update_status()
 
+        self.thread_service_channel.reconnect()
+
     # endregion
 
     # region Service control buttons slots
@@ -454,6 +474,39 @@ class UIMainWindow(QMainWindow):
         self.service_details_username.setText(service['username'])
         self.service_details_binpath.setText(service['binpath'])
 
+    def update_service_live_status(self, status: dict):
+        last_insert = datetime.fromtimestamp(status['last_insert_time']).strftime('%Y-%m-%d %H:%M:%S') \
+            if status['last_insert_time'] else 'none yet'
+        # The values are the combined ones of the import workers, in supervisor mode
+        text = f"{status['monitored_pvs']:g} PVs monitored, {status['stale_pvs']:g} stale, " \
+               f"last measurement added: {last_insert}, writer queue: {status['writer_queue_depth']:g}"
+        if not status['db_healthy']:
+            text += ', DB unavailable'
+        if status['supervisor']:
+            text = f"{status['workers_alive']} import workers alive, {text}"
+        self.service_details_live_status.setText(text)
+        self.service_details_live_status.setToolTip('Stale PVs:\n' + '\n'.join(status['stale_pv_names'])
+                                                    if status['stale_pv_names'] else '')
+
+    def update_service_channel_connection(self, connected: bool):
+        self.reload_service_config_action.setEnabled(connected)
+        if not connected:
+            self.service_details_live_status.clear()
+            self.service_details_live_status.setToolTip('')
+
+    def reload_service_config(self):
+        try:
+            self.thread_service_channel.send_command('reload_config')
+        except OSError as e:
+            QMessageBox.warning(self, 'Reload Service PV Config', f'Could not reach the service: {e}', QMessageBox.Ok)
+
+    def show_service_reply(self, reply: dict):
+        if reply['ok']:
+            manager_logger.info(f"Service ran the {reply['command']} command.")
+        else:
+            manager_logger.error(f"Service command {reply['command']} failed: {reply['error']}")
+            QMessageBox.warning(self, 'Service Command Failed', reply['error'], QMessageBox.Ok)
+
     def update_service_control_btns(self, service_status):
         stopped = service_status == psutil.STATUS_STOPPED
         running = service_status == psutil.STATUS_RUNNING
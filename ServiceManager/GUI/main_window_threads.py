@@ -1,16 +1,19 @@
 import os
+import threading
 import time
 import psutil
 from collections import deque, defaultdict
 from PyQt5.QtCore import QTimer, QThread, QEventLoop, pyqtSignal
 from ServiceManager.logger import manager_logger
 from ServiceManager.settings import Settings
+from ServiceManager.status_client import StatusClient, CONNECT_TIMEOUT
 from ServiceManager.utilities import is_admin
 from shared.const import SERVICE_NAME
 
 SERVICE_NOT_FOUND = 'service-not-found'
 SERVICE_LOG_UPDATE_INTERVAL = 1000      # msec
 SERVICE_STATUS_CHECK_INTERVAL = 5000    # msec
+STATUS_CHANNEL_RECONNECT_INTERVAL = 5   # sec
 
 
 class ServiceLogUpdaterThread(QThread):
@@ -118,3 +121,76 @@ class ServiceStatusCheckThread(QThread):
 
     def stop(self):
         self.exit()
+
+
+class ServiceStatusSubscriberThread(QThread):
+    """ Receives the live status pushed by the service on its status channel, reconnecting while it is not running. """
+
+    # Custom signals
+    status_received = pyqtSignal(dict)
+    reply_received = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+
+    def __init__(self, *args, **kwargs):
+        QThread.__init__(self, *args, **kwargs)
+        self.client = None
+        self.running = False
+        self._reconnect = threading.Event()
+
+    def run(self):
+        self.running = True
+        while self.running:
+            port = Settings.Service.Status.port if Settings.Service else 0
+            if port:
+                self.client = StatusClient(port, token=Settings.Service.Status.token)
+                try:
+                    self.client.connect()
+                except OSError:
+                    pass  # the service is not running, or not yet listening
+                else:
+                    self.connection_changed.emit(True)
+                    try:
+                        self.receive_messages()
+                    finally:
+                        self.client.close()
+                        self.connection_changed.emit(False)
+            self._reconnect.wait(STATUS_CHANNEL_RECONNECT_INTERVAL)
+            self._reconnect.clear()
+
+    def receive_messages(self):
+        """ Receive the messages until disconnected, skipping the malformed ones. """
+        while self.running:
+            try:
+                message = self.client.receive()
+            except ValueError as e:
+                manager_logger.warning(f'Malformed message on the service status channel: {e}')
+                continue
+            if message is None:
+                break
+            if not isinstance(message, dict):
+                manager_logger.warning(f'Unexpected message on the service status channel: {message!r}')
+                continue
+            if message.get('type') == 'status':
+                self.status_received.emit(message)
+            elif message.get('type') == 'reply':
+                self.reply_received.emit(message)
+
+    def send_command(self, command: str):
+        """
+        Raises:
+            OSError: If not connected to the service.
+        """
+        if self.client is None:
+            raise ConnectionError('Not connected to the service status channel.')
+        self.client.send_command(command)
+
+    def reconnect(self):
+        """ Connect again, e.g. once the service settings have changed. """
+        if self.client is not None:
+            self.client.close()
+        self._reconnect.set()
+
+    def stop(self):
+        self.running = False
+        self.reconnect()
+        self.wait(CONNECT_TIMEOUT * 1000)
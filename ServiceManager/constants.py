@@ -30,6 +30,7 @@ general_settings_ui = os.path.join(GUI_DIR_PATH, 'layouts', 'GeneralSettings.ui'
 ca_settings_ui = os.path.join(GUI_DIR_PATH, 'layouts', 'CASettings.ui')
 service_path_dlg_ui = os.path.join(GUI_DIR_PATH, 'layouts', 'ServicePathDialog.ui')
 config_entry_ui = os.path.join(GUI_DIR_PATH, 'layouts', 'ConfigEntry.ui')
+live_pvs_ui = os.path.join(GUI_DIR_PATH, 'layouts', 'LivePVs.ui')
 # endregion
 
 
@@ -63,15 +64,40 @@ SERVICE_SETTINGS_TEMPLATE = {
         'ConnectionTimeout': '2',
         'PvStaleAfter': '7200',
         'AddStalePvs': 'False',
+        'MonitorEvents': 'value,alarm',
+        'RecordUpdates': '',
         'PV_PREFIX': '',
         'PV_DOMAIN': ''
     },
     'PVImport': {
-        'LoopTimer': '5'
+        'LoopTimer': '5',
+        'Engine': 'threading',
+        'WriterWorkers': '0',
+        'Processes': '0',
+        'Leases': 'False',
+        'Calibration': 'False',
+        'Validation': 'False'
     },
     'HeRecoveryDB': {
         'Host': '',
-        'Name': ''
+        'Name': '',
+        'PoolSize': '0'
+    },
+    'Metrics': {
+        'Port': '0',
+        'DumpFile': '',
+        'DumpInterval': '60'
+    },
+    'Status': {
+        'Port': '0',
+        'Token': ''
+    },
+    'Tracing': {
+        'Enabled': 'False',
+        'ReportInterval': '300'
+    },
+    'Logging': {
+        'QueueSize': '10000'
     }
 }
 # endregion
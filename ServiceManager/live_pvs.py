@@ -0,0 +1,83 @@
+"""
+Live values of the measurement PVs of the PV config, for the Live PV Values window.
+"""
+import threading
+import time
+from functools import partial
+
+from shared.ca_context import ca_context
+
+DISCONNECTED = object()  # the update stashed when a PV disconnects
+
+
+def decode_value(response):
+    value = response.data[0] if len(response.data) == 1 else list(response.data)
+    return value.decode('utf-8', errors='replace') if isinstance(value, bytes) else value
+
+
+class LivePvMonitors:
+    """
+    Subscribe to PVs on the shared context, and keep the last update of each until the GUI takes them. The updates are
+    received on the caproto threads and never touch the GUI, which takes the updates received since it last did at
+    its own pace, at most one per PV, so it handles the same work whether the PVs update once a minute or many times
+    a second.
+    """
+
+    def __init__(self, pv_names: list):
+        self.pv_names = pv_names
+        self.subscriptions = []
+        self.updates_received = 0
+        self._pvs = []
+        self._callbacks = []  # caproto only keeps weak references to the callbacks
+        self._tokens = []  # the PV, subscription and the tokens of our callbacks, to remove only ours
+        self._pending = {}  # PV name and its last update response and time, or DISCONNECTED, not yet taken
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Subscribe to the PVs, which connect in the background.
+        """
+        self._pvs = ca_context.acquire_pvs(*self.pv_names)
+        for pv in self._pvs:
+            connection_callback = partial(self._connection_callback, pv.name)
+            update_callback = partial(self._update_callback, pv.name)
+            self._callbacks.extend((connection_callback, update_callback))
+            connection_token = pv.connection_state_callback.add_callback(connection_callback)
+            sub = pv.subscribe()
+            self._tokens.append((pv, sub, connection_token, sub.add_callback(update_callback)))
+            self.subscriptions.append(sub)
+
+    def stop(self):
+        """
+        Remove our callbacks from the PVs and release them.
+        """
+        for pv, sub, connection_token, update_token in self._tokens:
+            pv.connection_state_callback.remove_callback(connection_token)
+            sub.remove_callback(update_token)
+        self._tokens.clear()
+        self.subscriptions.clear()
+        self._callbacks.clear()
+        ca_context.release_pvs(self._pvs)
+        self._pvs = []
+
+    def _update_callback(self, pv_name, sub, response):
+        with self._lock:
+            self._pending[pv_name] = (response, time.time())
+            self.updates_received += 1
+
+    def _connection_callback(self, pv_name, pv, state):
+        if state != 'connected':
+            with self._lock:
+                self._pending[pv_name] = DISCONNECTED
+
+    def take_updates(self):
+        """
+        Take the updates received since the last call, decoding only the last one of each PV.
+
+        Returns:
+            (dict): The names of the updated PVs and their value and update time, or None if they disconnected.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return {pv_name: None if update is DISCONNECTED else (decode_value(update[0]), update[1])
+                for pv_name, update in pending.items()}
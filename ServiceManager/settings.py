@@ -89,6 +89,7 @@ class ServiceSettings:
         # Instantiate inner classes
         self.HeliumDB = _HeliumDB(self.config_parser, self.update)
         self.CA = _CA(self.config_parser, self.update)
+        self.Status = _Status(self.config_parser)
         self.Logging = _Logging(self.service_path)
         self.PVConfig = _PVConfig(self.service_path, self.config_parser)
 
@@ -176,6 +177,20 @@ class _PVConfig:
         """
         return [entry[self.OBJ] for entry in self.get_entries()]
 
+    def get_measurement_pvs(self):
+        """
+        Get the measurement PVs of the PV config, ignoring empty ones.
+
+        Returns:
+            (dict): The PV names, in the order of the entries, and the IDs of the objects using them.
+        """
+        pvs = {}
+        for entry in self.get_entries():
+            for pv_name in entry[self.MEAS].values():
+                if pv_name:
+                    pvs.setdefault(pv_name, []).append(entry[self.OBJ])
+        return pvs
+
     def add_entry(self, new_entry: dict, overwrite: bool = False):
         """
         Add a new record config entry to PV Config.
@@ -189,7 +204,8 @@ class _PVConfig:
             overwritten = False
             for index, entry in enumerate(data):
                 if entry[self.OBJ] == new_entry[self.OBJ]:
-                    data[index] = new_entry
+                    # Keep the entry settings not edited by the manager, e.g. the measurement statistics
+                    data[index] = {**entry, **new_entry}
                     overwritten = True
                     break
             if not overwritten:
@@ -302,6 +318,19 @@ class _HeliumDB:
             manager_logger.error(e)
 
 
+class _Status:
+    def __init__(self, config_parser):
+        self.config_parser = config_parser
+
+    @property
+    def port(self):
+        return self.config_parser.getint('Status', 'Port', fallback=0)
+
+    @property
+    def token(self):
+        return self.config_parser.get('Status', 'Token', fallback='')
+
+
 class _CA:
     def __init__(self, config_parser, update):
         self.config_parser = config_parser
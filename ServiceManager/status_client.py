@@ -0,0 +1,84 @@
+"""
+Client of the service status channel, see HLM_PV_Import.status_server for the protocol.
+"""
+import json
+import socket
+import threading
+
+CONNECT_TIMEOUT = 2  # seconds
+
+
+class StatusClient:
+    """
+    A connection to the status channel of the service, receiving the status it pushes and the replies to the commands
+    sent.
+    """
+
+    def __init__(self, port: int, host: str = '127.0.0.1', token: str = ''):
+        """
+        Args:
+            port (int): The port of the status channel.
+            host (str, optional): The address of the service, Defaults to the local host.
+            token (str, optional): The token of the service status channel, sent with the commands.
+        """
+        self.address = (host, port)
+        self.token = token
+        self._socket = None
+        self._file = None
+        self._send_lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._socket is not None
+
+    def connect(self):
+        """
+        Raises:
+            OSError: If the service could not be reached, e.g. it is not running or the status channel is disabled.
+        """
+        self._socket = socket.create_connection(self.address, timeout=CONNECT_TIMEOUT)
+        self._socket.settimeout(None)
+        self._file = self._socket.makefile('rb')
+
+    def close(self):
+        """
+        Close the connection, which can be done from another thread to stop waiting in receive.
+        """
+        sock, self._socket = self._socket, None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # already disconnected
+        sock.close()
+
+    def receive(self):
+        """
+        Wait for the next message from the service.
+
+        Returns:
+            (dict): The message, or None if the connection was closed.
+        """
+        try:
+            line = self._file.readline()
+        except (OSError, ValueError):
+            line = b''  # closed by close
+        if not line:
+            self._file.close()
+            return None
+        return json.loads(line)
+
+    def send_command(self, command: str):
+        """
+        Send a command to the service, e.g. 'reload_config'. Its reply is received with the pushed messages.
+
+        Raises:
+            OSError: If not connected.
+        """
+        sock = self._socket
+        if sock is None:
+            raise ConnectionError('Not connected to the service status channel.')
+        with self._send_lock:
+            message = {'command': command, 'token': self.token} if self.token else {'command': command}
+            sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
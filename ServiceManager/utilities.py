@@ -8,14 +8,13 @@ from PyQt5.QtWidgets import QMessageBox, QPushButton
 
 from ServiceManager.constants import ASSETS_PATH
 from ServiceManager.logger import manager_logger
-from caproto.sync.client import read
-
+from shared.ca_context import ca_context
 from shared.const import DBClassIDs
 
 
 def test_pv_connection(name: str, timeout: int = 1):
     """
-    Tests whether CA can connect to a PV and get its value.
+    Tests whether CA can connect to a PV and get its value, through the shared context.
 
     Args:
         name (str): The PV.
@@ -26,7 +25,7 @@ def test_pv_connection(name: str, timeout: int = 1):
     """
 
     try:
-        read(pv_name=name, timeout=timeout)
+        ca_context.read(pv_name=name, timeout=timeout)
         return True
     except Exception as e:
         manager_logger.error(e)
@@ -0,0 +1,3 @@
+"""
+Performance benchmarks for the HLM PV Import service, run with e.g. `python -m benchmarks.import_throughput`.
+"""
@@ -0,0 +1,65 @@
+"""
+Micro-benchmark of the PvMonitors monitor callback path, fed with synthetic updates (no network involved).
+
+Example: `python -m benchmarks.callback_throughput --pvs 5000 --updates 1000000`
+"""
+import argparse
+import itertools
+import time
+
+from benchmarks import common
+
+
+class _FakePV:
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeSubscription:
+    def __init__(self, name):
+        self.pv = _FakePV(name)
+
+
+class _FakeResponse:
+    def __init__(self, value):
+        self.data = [value]
+
+
+def run(args):
+    from HLM_PV_Import.ca_wrapper import PvMonitors
+
+    names = [f'BENCH:SIM:PV{i}' for i in range(args.pvs)]
+    monitors = PvMonitors(names)  # the monitors are not started, so the shared context is not used
+    subscriptions = [(monitors.get_handle(name), _FakeSubscription(name)) for name in names]
+    values = [_FakeResponse(str(i).encode() if args.bytes else float(i)) for i in range(100)]
+    updates = [(handle, sub, response) for (handle, sub), response in
+               zip(itertools.islice(itertools.cycle(subscriptions), args.updates), itertools.cycle(values))]
+
+    callback = monitors._callback_f
+    start = time.perf_counter()
+    for handle, sub, response in updates:
+        callback(handle, sub, response)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'pvs': args.pvs,
+        'updates': args.updates,
+        'calls_per_s': args.updates / elapsed,
+        'ns_per_call': elapsed / args.updates * 1e9,
+        'rss_mb': common.rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pvs', type=int, default=1000, help='number of PVs (default: %(default)s)')
+    parser.add_argument('--updates', type=int, default=500000, help='number of updates (default: %(default)s)')
+    parser.add_argument('--bytes', action='store_true', help='send string (bytes) values instead of floats')
+    common.add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    common.finish(run(args), args, 'Monitor callback throughput')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Shared helpers for the benchmarks: database stand-in, object set-up, configuration and reporting.
+"""
+import json
+import os
+import sys
+import tempfile
+
+import psutil
+from peewee import SqliteDatabase
+
+from shared import db_models
+from shared.const import DBClassIDs
+from shared.db_models import GamNetwork, GamImage, GamDisplayformat, GamDisplaygroup, GamFunction, GamObjectclass, \
+    GamObjecttype, GamObject, GamCoordinate, GamMeasurement, GamObjectrelation
+
+MODELS = [GamNetwork, GamImage, GamDisplayformat, GamDisplaygroup, GamFunction, GamObjectclass, GamObjecttype,
+          GamObject, GamCoordinate, GamMeasurement, GamObjectrelation]
+
+# Report key endings for which a higher value is better, all others are considered better when lower
+HIGHER_IS_BETTER = ('updates_per_s', 'measurements_per_s', 'calls_per_s', 'rows_per_s')
+
+
+class _BenchmarkSqliteDatabase(SqliteDatabase):
+    """
+    SQLite database whose transactions take the write lock when they begin. With several writers, a deferred
+    transaction that reads before it writes fails with 'database is locked' instead of waiting for the lock.
+    """
+
+    def begin(self, lock_type=None):
+        super().begin(lock_type or 'IMMEDIATE')
+
+
+def setup_database(mysql: str = None, pool_size: int = 0):
+    """
+    Set up the benchmark database as the service database and start the DB health prober.
+
+    Args:
+        mysql (str, optional): Local MySQL stand-in as 'user:password@host/name'. If not given, a temporary SQLite
+            file is used (rather than an in-memory one, so that it is shared by all threads).
+        pool_size (int, optional): Max pooled MySQL connections, 0 for no pooling.
+
+    Returns:
+        (peewee.Database): The database.
+    """
+    if mysql:
+        db_models.initialize_database_from_option(mysql, pool_size=pool_size)
+    else:
+        db_file = os.path.join(tempfile.mkdtemp(prefix='hlm_bench_'), 'bench.db')
+        db_models.database.initialize(
+            _BenchmarkSqliteDatabase(db_file, pragmas={'journal_mode': 'wal', 'synchronous': 'off'}))
+    database = db_models.database
+
+    database.connect(reuse_if_open=True)
+    database.create_tables(MODELS, safe=True)
+
+    from HLM_PV_Import.db_health import db_health
+    db_health.start()
+    return database
+
+
+def create_objects(object_count: int, object_class: int = DBClassIDs.VESSEL):
+    """
+    Create the given number of objects, of a class that has modules so the usual module lookups take place.
+
+    Returns:
+        (list): The object IDs.
+    """
+    function = GamFunction.create(of_name='Benchmark')
+    GamObjectclass.get_or_create(oc_id=object_class,
+                                 defaults={'oc_name': 'Benchmark', 'oc_function': function, 'oc_positiontype': 0})
+    object_type = GamObjecttype.create(ot_name='Benchmark', ot_objectclass=object_class)
+    return [GamObject.insert(ob_name=f'Benchmark {i}', ob_objecttype=object_type).execute()
+            for i in range(object_count)]
+
+
+def create_entries(object_ids: list, pv_names: list, pvs_per_object: int, logging_period: float):
+    """
+    Create PV configuration entries, assigning the PVs to the objects in turn.
+
+    Args:
+        object_ids (list): The object IDs.
+        pv_names (list): The measurement PV names.
+        pvs_per_object (int): Measurement PVs per object, max 5.
+        logging_period (float): Logging period in seconds.
+
+    Returns:
+        (list): The configuration entries.
+    """
+    entries = []
+    for index, object_id in enumerate(object_ids):
+        measurements = {f'{i + 1}': pv_names[(index * pvs_per_object + i) % len(pv_names)]
+                        for i in range(pvs_per_object)}
+        entries.append({'object_id': object_id, 'logging_period': logging_period / 60, 'measurements': measurements})
+    return entries
+
+
+def make_user_config(entries: list):
+    """
+    Get a UserConfig with the given entries, without reading the config file or running the config checks.
+    """
+    from HLM_PV_Import.user_config import UserConfig
+
+    class BenchmarkConfig(UserConfig):
+        # noinspection PyMissingConstructor
+        def __init__(self):
+            self.entries = entries
+            self.object_ids = [entry['object_id'] for entry in entries]
+            self.logging_periods = {entry['object_id']: entry['logging_period'] for entry in entries}
+
+    return BenchmarkConfig()
+
+
+def percentiles(values: list, fractions=(0.5, 0.95, 0.99)):
+    """
+    Returns:
+        (dict): The nearest-rank percentiles of the values, keyed 'p50', 'p95' etc.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {f'p{round(f * 100)}': None for f in fractions}
+    return {f'p{round(f * 100)}': ordered[min(len(ordered) - 1, int(f * len(ordered)))] for f in fractions}
+
+
+def rss_mb():
+    return psutil.Process().memory_info().rss / 1024 ** 2
+
+
+def print_report(title: str, report: dict):
+    print(f'\n{title}')
+    width = max(len(key) for key in report)
+    for key, value in report.items():
+        print(f'  {key.ljust(width)}  {value:.6g}' if isinstance(value, float) else f'  {key.ljust(width)}  {value}')
+
+
+def check_against_baseline(report: dict, baseline_path: str, max_regression: float):
+    """
+    Compare the report to a previously saved one.
+
+    Args:
+        report (dict): The benchmark results.
+        baseline_path (str): The saved results.
+        max_regression (float): The allowed relative regression per result, e.g. 0.1 for 10%.
+
+    Returns:
+        (list): Descriptions of the results that regressed by more than allowed.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for key, base in baseline.items():
+        value = report.get(key)
+        if not isinstance(base, (int, float)) or not isinstance(value, (int, float)) or not base:
+            continue
+        change = (value - base) / abs(base)
+        if key.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > max_regression:
+            regressions.append(f'{key}: {value:.6g} vs baseline {base:.6g} ({change:+.1%} worse)')
+    return regressions
+
+
+def save_report(report: dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+
+def add_baseline_arguments(parser):
+    parser.add_argument('--save', metavar='PATH', help='save the results as JSON, e.g. to use as a baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='fail if results regressed compared to this JSON file')
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help='allowed relative regression against the baseline (default: %(default)s)')
+
+
+def finish(report: dict, args, title: str):
+    """
+    Print and save the report, and exit with status 1 if it regressed compared to the baseline.
+    """
+    print_report(title, report)
+    if args.save:
+        save_report(report, args.save)
+    if args.baseline:
+        regressions = check_against_baseline(report, args.baseline, args.max_regression)
+        if regressions:
+            print('\nRegressions against baseline:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+        print('\nNo regressions against baseline.')
@@ -0,0 +1,181 @@
+"""
+End-to-end benchmark of PvMonitors + PvImport against a simulated IOC, or a replayed recording of real PV updates,
+and a SQLite (or local MySQL) database.
+
+Reports CA updates handled and measurements inserted per second, insert and loop latency percentiles, and memory.
+Example: `python -m benchmarks.import_throughput --pvs 1000 --rate 10 --objects 200 --duration 60`
+or `python -m benchmarks.import_throughput --replay updates.rec --speed 10 --objects 200 --duration 60`
+"""
+import argparse
+import os
+import threading
+import time
+import tracemalloc
+
+from benchmarks import common
+from shared.const import ImportEngines
+from benchmarks.sim_ioc import start_ioc_process, get_pv_names, DEFAULT_INTERFACE
+
+PV_PREFIX = 'BENCH'
+PV_DOMAIN = 'SIM'
+
+
+def run(args):
+    if args.replay:
+        from HLM_PV_Import.ca_recording import get_recorded_pv_names
+
+        # The recorded PVs are given the simulated PV names, for the objects to be configured with
+        recorded_names = get_recorded_pv_names(args.replay)
+        args.pvs = len(recorded_names)
+        names = dict(zip(recorded_names, get_pv_names(args.pvs, prefix=f'{PV_PREFIX}:{PV_DOMAIN}:')))
+        return _run_import(args, rename=names.get)
+
+    os.environ['EPICS_CA_ADDR_LIST'] = DEFAULT_INTERFACE
+    os.environ['EPICS_CA_AUTO_ADDR_LIST'] = 'NO'
+
+    ioc = start_ioc_process(args.pvs, args.rate, prefix=f'{PV_PREFIX}:{PV_DOMAIN}:')
+    try:
+        return _run_import(args)
+    finally:
+        ioc.terminate()
+        ioc.join()
+
+
+def _run_import(args, rename=None):
+    # Imported here so the CA environment is set up before the client is
+    from HLM_PV_Import import pv_import, async_import, ca_wrapper, db_func, db_writer
+    from HLM_PV_Import.ca_recording import ReplaySource
+    from HLM_PV_Import.settings import CA, PvImportConfig
+
+    CA.PV_PREFIX = PV_PREFIX
+    CA.PV_DOMAIN = PV_DOMAIN
+    PvImportConfig.LOOP_TIMER = args.loop_timer
+
+    common.setup_database(args.mysql, args.pool_size)
+    object_ids = common.create_objects(args.objects)
+    short_names = [name.split(':')[-1] for name in get_pv_names(args.pvs)]
+    entries = common.create_entries(object_ids, short_names, args.pvs_per_object, args.logging_period)
+    config = common.make_user_config(entries)
+
+    # Time each measurement insert as seen by the import loop, or by the writer workers (their batches timed per
+    # measurement, as in the insert latency histogram)
+    insert_latencies = []
+    add_measurement, add_measurements = pv_import.add_measurement, db_writer.add_measurements
+
+    def timed_add_measurement(*args_, **kwargs):
+        start = time.perf_counter()
+        add_measurement(*args_, **kwargs)
+        insert_latencies.append(time.perf_counter() - start)
+
+    def timed_add_measurements(measurements):
+        start = time.perf_counter()
+        add_measurements(measurements)
+        insert_latencies.extend([(time.perf_counter() - start) / len(measurements)] * len(measurements))
+
+    pv_import.add_measurement = timed_add_measurement
+    async_import.add_measurement = timed_add_measurement
+    db_writer.add_measurement = timed_add_measurement
+    db_writer.add_measurements = timed_add_measurements
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = common.rss_mb()
+
+    pv_names = config.get_measurement_pvs(no_duplicates=True, full_names=True)
+    replay = None
+    if args.engine == ImportEngines.ASYNCIO:
+        # The monitors start with the event loop, so the warm-up is part of the run
+        importer = async_import.AsyncPvImport(async_import.AsyncPvMonitors(pv_names), config, [])
+        import_target = importer.run
+    else:
+        monitors = ca_wrapper.PvMonitors(pv_names)
+        if rename is not None:
+            replay = ReplaySource(args.replay, monitors, args.speed, rename)
+            replay.start()
+        else:
+            monitors.start_monitors()
+        time.sleep(args.warmup)
+        measurement_writer = None
+        if args.writers:
+            measurement_writer = db_writer.MeasurementWriter(args.writers)
+            measurement_writer.start()
+        importer = pv_import.PvImport(monitors, config, [], measurement_writer)
+        import_target = importer.start
+
+    updates_before = ca_wrapper.CA_UPDATES.value
+    measurements_before = db_func.MEASUREMENTS_ADDED.value
+    loop_count_before = pv_import.LOOP_DURATION.count
+    loop_sum_before = pv_import.LOOP_DURATION.sum
+
+    import_thread = threading.Thread(target=import_target, daemon=True)
+    start = time.perf_counter()
+    import_thread.start()
+    time.sleep(args.duration)
+    importer.stop()
+    import_thread.join()
+    elapsed = time.perf_counter() - start
+    if replay is not None:
+        replay.stop()
+    pv_import.add_measurement = add_measurement
+    async_import.add_measurement = add_measurement
+    db_writer.add_measurement = add_measurement
+    db_writer.add_measurements = add_measurements
+
+    loop_count = pv_import.LOOP_DURATION.count - loop_count_before
+    report = {
+        'engine': args.engine,
+        'writers': args.writers,
+        'pvs': args.pvs,
+        'objects': args.objects,
+        'elapsed_s': elapsed,
+        'updates_per_s': (ca_wrapper.CA_UPDATES.value - updates_before) / elapsed,
+        'measurements_per_s': (db_func.MEASUREMENTS_ADDED.value - measurements_before) / elapsed,
+        'mean_loop_ms': (pv_import.LOOP_DURATION.sum - loop_sum_before) / loop_count * 1000 if loop_count else None,
+    }
+    for key, value in common.percentiles(insert_latencies).items():
+        report[f'insert_{key}_ms'] = value * 1000 if value is not None else None
+    report['rss_mb'] = common.rss_mb()
+    report['rss_growth_mb'] = report['rss_mb'] - rss_before
+    if args.tracemalloc:
+        report['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pvs', type=int, default=100, help='number of simulated PVs (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=1, help='updates per second of each PV (default: %(default)s)')
+    parser.add_argument('--objects', type=int, default=100, help='number of objects (default: %(default)s)')
+    parser.add_argument('--pvs-per-object', type=int, default=1, choices=range(1, 6),
+                        help='measurement PVs per object (default: %(default)s)')
+    parser.add_argument('--logging-period', type=float, default=5,
+                        help='logging period of the objects in seconds (default: %(default)s)')
+    parser.add_argument('--loop-timer', type=float, default=1,
+                        help='wait between import loops in seconds (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=30, help='measured run time in seconds (default: %(default)s)')
+    parser.add_argument('--warmup', type=float, default=3,
+                        help='time to let the monitors connect before measuring (default: %(default)s)')
+    parser.add_argument('--engine', default=ImportEngines.THREADING,
+                        choices=[ImportEngines.THREADING, ImportEngines.ASYNCIO],
+                        help='import engine to run (default: %(default)s)')
+    parser.add_argument('--writers', type=int, default=0,
+                        help='DB writer workers of the threading engine, 0 to write in the loop (default: %(default)s)')
+    parser.add_argument('--mysql', metavar='USER:PASS@HOST/NAME', help='use a local MySQL DB instead of SQLite')
+    parser.add_argument('--pool-size', type=int, default=0,
+                        help='max pooled MySQL connections, 0 for no pooling (default: %(default)s)')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay a recording of PV updates (see HLM_PV_Import.ca_recording) instead of the IOC')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='replay speed, relative to the recording, 0 for as fast as possible (default: %(default)s)')
+    parser.add_argument('--tracemalloc', action='store_true', help='also report the peak traced Python memory')
+    common.add_baseline_arguments(parser)
+    args = parser.parse_args()
+    if args.replay and args.engine == ImportEngines.ASYNCIO:
+        parser.error('recordings can only be replayed with the threading engine')
+
+    common.finish(run(args), args, 'PV import throughput')
+
+
+if __name__ == '__main__':
+    main()
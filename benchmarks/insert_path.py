@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of the per-row CPU cost of adding measurements, through the peewee path (add_measurement) and the
+batched executemany path (add_measurements), against a SQLite (or local MySQL) database. Logging is disabled.
+
+Example: `python -m benchmarks.insert_path --rows 20000 --batch-size 100`
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime
+
+from benchmarks import common
+
+
+def _measure(func, batches):
+    """
+    Returns:
+        (float, float): The CPU and wall time taken to call the function with each batch.
+    """
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for batch in batches:
+        func(batch)
+    return time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+
+def run(args):
+    from HLM_PV_Import import db_func
+    from shared.db_models import GamMeasurement
+
+    common.setup_database(args.mysql)
+    object_ids = common.create_objects(args.objects)
+    logging.disable(logging.INFO)
+
+    def measurement():
+        return random.choice(object_ids), {'1': random.uniform(0, 100), '2': random.uniform(0, 100),
+                                           '3': None, '4': None, '5': None}
+
+    measurements = [measurement() for _ in range(args.rows)]
+    batches = [measurements[i:i + args.batch_size] for i in range(0, args.rows, args.batch_size)]
+    mea_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [(object_id, mea_date, mea_date, 'benchmark', values['1'], values['2'], None, None, None, 1, None, 0)
+            for object_id, values in measurements]
+    row_batches = [rows[i:i + args.batch_size] for i in range(0, args.rows, args.batch_size)]
+
+    def peewee_path(batch):
+        for object_id, mea_values in batch:
+            db_func.add_measurement(object_id=object_id, mea_values=dict(mea_values))
+
+    def fast_path(batch):
+        db_func.add_measurements([(object_id, dict(mea_values)) for object_id, mea_values in batch])
+
+    def peewee_insert(batch):
+        with db_func.database.atomic():
+            for row in batch:
+                GamMeasurement.insert(**dict(zip(db_func.MEASUREMENT_INSERT_COLUMNS, row))).execute()
+
+    def fast_insert(batch):
+        with db_func.database.atomic():
+            db_func.insert_measurement_rows(batch)
+
+    report = {'rows': args.rows, 'batch_size': args.batch_size}
+    for name, func, func_batches in (('peewee_path', peewee_path, batches), ('fast_path', fast_path, batches),
+                                     ('peewee_insert', peewee_insert, row_batches),
+                                     ('fast_insert', fast_insert, row_batches)):
+        cpu, wall = _measure(func, func_batches)
+        report[f'{name}_cpu_us_per_row'] = cpu / args.rows * 1e6
+        report[f'{name}_rows_per_s'] = args.rows / wall
+    logging.disable(logging.NOTSET)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='measurements added per path (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=100, help='measurements per batch (default: %(default)s)')
+    parser.add_argument('--objects', type=int, default=100, help='number of objects (default: %(default)s)')
+    parser.add_argument('--mysql', metavar='USER:PASS@HOST/NAME', help='use a local MySQL DB instead of SQLite')
+    common.add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    common.finish(run(args), args, 'Measurement insert path')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Simulated CA IOC publishing synthetic PVs at a configurable update rate.
+
+Can be run standalone, e.g. `python -m benchmarks.sim_ioc --pvs 1000 --rate 10`.
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import time
+
+from caproto import ChannelDouble
+from caproto.asyncio.server import Context
+
+DEFAULT_PREFIX = 'BENCH:SIM:'
+DEFAULT_INTERFACE = '127.0.0.1'
+
+
+def get_pv_names(pv_count: int, prefix: str = DEFAULT_PREFIX):
+    return [f'{prefix}PV{i}' for i in range(pv_count)]
+
+
+async def _update_pvs(channels: list, rate: float):
+    """ Write a new value to every channel, rate times per second. """
+    period = 1 / rate
+    next_update = time.monotonic()
+    tick = 0
+    while True:
+        tick += 1
+        for index, channel in enumerate(channels):
+            await channel.write(50 + 50 * math.sin((tick + index) / 10))
+        next_update += period
+        await asyncio.sleep(max(0.0, next_update - time.monotonic()))
+
+
+async def _serve(pv_count: int, rate: float, prefix: str, interface: str):
+    pvdb = {name: ChannelDouble(value=0) for name in get_pv_names(pv_count, prefix)}
+    ctx = Context(pvdb, interfaces=[interface])
+    updater = asyncio.ensure_future(_update_pvs(list(pvdb.values()), rate))
+    try:
+        await ctx.run()
+    finally:
+        updater.cancel()
+
+
+def run_ioc(pv_count: int, rate: float, prefix: str = DEFAULT_PREFIX, interface: str = DEFAULT_INTERFACE):
+    """
+    Serve the synthetic PVs until the process is terminated.
+
+    Args:
+        pv_count (int): Number of PVs to publish.
+        rate (float): Updates per second of each PV.
+        prefix (str, optional): The PV names prefix.
+        interface (str, optional): The interface to serve on.
+    """
+    asyncio.run(_serve(pv_count, rate, prefix, interface))
+
+
+def start_ioc_process(pv_count: int, rate: float, prefix: str = DEFAULT_PREFIX, interface: str = DEFAULT_INTERFACE):
+    """
+    Start the simulated IOC in a separate process, so it does not compete for the GIL with the code under test.
+
+    Returns:
+        (multiprocessing.Process): The started IOC process, terminate it when done.
+    """
+    process = multiprocessing.Process(target=run_ioc, args=(pv_count, rate, prefix, interface), daemon=True)
+    process.start()
+    return process
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pvs', type=int, default=100, help='number of PVs to publish')
+    parser.add_argument('--rate', type=float, default=1, help='updates per second of each PV')
+    parser.add_argument('--prefix', default=DEFAULT_PREFIX, help='PV names prefix')
+    parser.add_argument('--interface', default=DEFAULT_INTERFACE, help='interface to serve on')
+    args = parser.parse_args()
+    run_ioc(args.pvs, args.rate, args.prefix, args.interface)
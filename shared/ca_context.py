@@ -0,0 +1,148 @@
+"""
+The process-wide caproto threading client Context, shared by everything in the process that uses Channel Access.
+
+Each Context starts its own threads and search sockets and connects its own channels and circuits, so the PVs are
+acquired from the one Context of the registry instead, and released when no longer needed. A PV acquired again
+reuses its channel without a new search. Once released by all of its users for IDLE_TIMEOUT, the channel of a PV is
+cleared, and the circuits left without PVs in use are disconnected.
+"""
+import threading
+import time
+from collections import Counter
+
+from caproto.threading.client import Context
+
+IDLE_TIMEOUT = 30  # seconds a released PV keeps its channel, to be reused without a new search
+READ_TIMEOUT = 1
+
+
+class ContextRegistry:
+    """
+    Hands out the PVs of a shared Context, keeping count of the users of each PV. The PVs of the Context must only be
+    acquired through the registry, or their channels might be torn down while in use.
+    """
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._context = None  # created when the first PVs are acquired
+        self._users = Counter()  # name of each PV in use and its number of users
+        self._released = {}  # name of each PV no longer in use and the time it was released
+        self._collect_timer = None
+        self._lock = threading.RLock()
+
+    def acquire_pvs(self, *names, timeout=None):
+        """
+        Get the PVs with the given names, which connect in the background if they are not connected already.
+
+        Args:
+            *names (str): The full PV names.
+            timeout (float, optional): The default timeout of the new PVs operations, the Context's if None.
+
+        Returns:
+            (list): The PVs (caproto.threading.client.PV), to be released with release_pvs.
+        """
+        with self._lock:
+            if self._context is None:
+                self._context = Context()
+            if timeout is None:
+                pvs = self._context.get_pvs(*names)
+            else:
+                pvs = self._context.get_pvs(*names, timeout=timeout)
+            for pv in pvs:
+                self._users[pv.name] += 1
+                self._released.pop(pv.name, None)
+            return pvs
+
+    def release_pvs(self, pvs: list):
+        """
+        Release PVs acquired with acquire_pvs. The channels of the PVs no longer in use are torn down after the idle
+        timeout, unless acquired again in the meantime.
+
+        Args:
+            pvs (list): The PVs.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for pv in pvs:
+                if self._users[pv.name] > 1:
+                    self._users[pv.name] -= 1
+                    continue
+                self._users.pop(pv.name, None)
+                self._released[pv.name] = now
+            if self._released:
+                self._schedule_collect()
+
+    def read(self, pv_name: str, timeout: float = READ_TIMEOUT):
+        """
+        Read the value of a PV, through the shared Context.
+
+        Returns:
+            (caproto.ReadNotifyResponse): The read response.
+
+        Raises:
+            CaprotoTimeoutError: If the PV did not connect or respond within the timeout.
+        """
+        pv, = self.acquire_pvs(pv_name, timeout=timeout)
+        try:
+            pv.wait_for_connection(timeout=timeout)
+            return pv.read(timeout=timeout)
+        finally:
+            self.release_pvs([pv])
+
+    def collect_unused(self, idle_for: float = None):
+        """
+        Clear the channels of the PVs released for at least idle_for seconds, and disconnect the circuits without PVs
+        in use or recently released. Run by a timer after PVs are released.
+
+        Args:
+            idle_for (float, optional): Seconds since the release of the PVs, the idle timeout if None.
+        """
+        with self._lock:
+            self._collect_timer = None
+            if self._context is None:
+                return
+            idle_for = self.idle_timeout if idle_for is None else idle_for
+            now = time.monotonic()
+            expired = {name for name, released in self._released.items() if now - released >= idle_for}
+            for name in expired:
+                del self._released[name]
+
+            ctx = self._context
+            # Drop the PVs from the Context cache, so that acquiring them again creates new channels
+            with ctx.pv_cache_lock:
+                idle_pvs = [ctx.pvs.pop(key) for key in list(ctx.pvs) if key[0] in expired]
+                for pv in idle_pvs:
+                    ctx.pvs_needing_circuits.get(pv.name, set()).discard(pv)
+            for pv in idle_pvs:
+                pv.go_idle()
+
+            for key, circuit in list(ctx.circuit_managers.items()):
+                if not any(pv.name in self._users or pv.name in self._released for pv in list(circuit.pvs.values())):
+                    circuit.disconnect()
+                    ctx.circuit_managers.pop(key, None)
+
+            if self._released:
+                self._schedule_collect()
+
+    def disconnect(self):
+        """
+        Disconnect the shared Context, e.g. when the process stops. A new one is created if PVs are acquired again.
+        """
+        with self._lock:
+            if self._collect_timer is not None:
+                self._collect_timer.cancel()
+                self._collect_timer = None
+            if self._context is not None:
+                self._context.disconnect()
+                self._context = None
+            self._users.clear()
+            self._released.clear()
+
+    def _schedule_collect(self):
+        if self._collect_timer is None:
+            self._collect_timer = threading.Timer(self.idle_timeout, self.collect_unused)
+            self._collect_timer.daemon = True
+            self._collect_timer.start()
+
+
+ca_context = ContextRegistry()
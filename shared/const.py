@@ -9,9 +9,27 @@ class PVConfig:
     OBJ = 'object_id'
     MEAS = 'measurements'
     LOG_PERIOD = 'logging_period'
+    STATS = 'statistics'  # optional, the statistic of each measurement PV, see MeaStatistics
     PATH = None  # set in Service/Manager settings
 
 
+# Statistics of the PV updates since the last measurement, that can be added as the measurement value
+class MeaStatistics:
+    LAST = 'last'  # the last value, the default
+    MIN = 'min'
+    MAX = 'max'
+    MEAN = 'mean'
+    COUNT = 'count'  # number of updates
+    ALL = (LAST, MIN, MAX, MEAN, COUNT)
+
+
+# MEA_STATUS of the measurements checked against their display format limits, see the [PVImport] Validation setting
+class MeaStatus:
+    OK = 0
+    ALARM = 1  # a value is beyond its alarm limits
+    OUT_OF_RANGE = 2  # a value is outside of its lower/upper limits, the measurement is added as not valid
+
+
 class DBClassIDs:
     VESSEL = 2
     CRYOSTAT = 4
@@ -24,3 +42,9 @@ class DBTypeIDs:
     SLD = 18  # Software Level Device
     GCM = 16  # Gas Counter Module
     MERCURY_CRYOSTAT = 28
+
+
+# PV Import engines, see the [PVImport] Engine setting
+class ImportEngines:
+    THREADING = 'threading'  # caproto threading client and a sleeping import loop
+    ASYNCIO = 'asyncio'  # caproto asyncio client and the import loop on one event loop, DB calls on a writer thread
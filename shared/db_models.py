@@ -1,18 +1,67 @@
-from peewee import MySQLDatabase, AutoField, CharField, DecimalField, TextField, IntegerField, SQL, Model, \
-    ForeignKeyField, DateTimeField
+from peewee import MySQLDatabase, DatabaseProxy, AutoField, CharField, DecimalField, TextField, IntegerField, SQL, \
+    Model, ForeignKeyField, DateTimeField
+from playhouse.pool import PooledMySQLDatabase
 from playhouse.shortcuts import ReconnectMixin
 
+POOL_TIMEOUT = 60  # time in s to wait for a free pooled connection when the pool is full, before raising an error
+
 
 # noinspection PyAbstractClass
 class ReconnectMySQLDatabase(ReconnectMixin, MySQLDatabase):
     pass
 
 
-database = ReconnectMySQLDatabase(None)
+# noinspection PyAbstractClass
+class ReconnectPooledMySQLDatabase(ReconnectMixin, PooledMySQLDatabase):
+    pass
+
+
+database = DatabaseProxy()
+database.initialize(ReconnectMySQLDatabase(None))
+
+
+def initialize_database(name, user, password, host, port=3306, pool_size=0):
+    """
+    Set up the database connection parameters. Each thread uses its own connection.
+
+    Args:
+        pool_size (int, optional): If more than 0, the connections are taken from a pool of at most this many
+            connections shared by all threads, and checked to still be usable before being reused. If 0, the
+            connections aren't pooled.
+    """
+    if isinstance(database.obj, ReconnectPooledMySQLDatabase) and not database.deferred:
+        database.close_all()  # don't reuse connections opened with the previous parameters
+    if pool_size > 0:
+        database.initialize(ReconnectPooledMySQLDatabase(name, max_connections=pool_size, timeout=POOL_TIMEOUT,
+                                                         user=user, password=password, host=host, port=port))
+    else:
+        database.initialize(ReconnectMySQLDatabase(name, user=user, password=password, host=host, port=port))
 
 
-def initialize_database(name, user, password, host, port=3306):
-    database.init(name, user=user, password=password, host=host, port=port)
+def is_database(db, database_class):
+    """
+    Whether the database, or the database behind it if it is the proxy, is of the given class.
+    """
+    return isinstance(db.obj if isinstance(db, DatabaseProxy) else db, database_class)
+
+
+def initialize_database_from_option(mysql: str = None, pool_size=0):
+    """
+    Set up the database connection parameters for the command line tools, from their --mysql option, or the service's
+    DB settings if not given.
+
+    Args:
+        mysql (str, optional): The DB credentials as 'USER:PASS@HOST/NAME'.
+        pool_size (int, optional): The max number of pooled connections, 0 for no pooling.
+    """
+    if mysql:
+        credentials, location = mysql.rsplit('@', 1)
+        user, password = credentials.split(':', 1)
+        host, name = location.split('/', 1)
+    else:
+        from HLM_PV_Import.settings import HEDB  # only loaded when the service settings are used
+        user, password, host, name = HEDB.USER, HEDB.PASS, HEDB.HOST, HEDB.NAME
+    initialize_database(name=name, user=user, password=password, host=host, pool_size=pool_size)
 
 
 class UnknownField(object):
@@ -205,6 +254,9 @@ class GamObject(BaseModel):
 
     class Meta:
         table_name = 'gam_object'
+        indexes = (
+            (('ob_name',), False),  # get_obj_id_and_create_if_not_exist
+        )
 
 
 class GamCoordinate(BaseModel):
@@ -235,6 +287,9 @@ class GamMeasurement(BaseModel):
 
     class Meta:
         table_name = 'gam_measurement'
+        indexes = (
+            (('mea_object', 'mea_date'), False),  # the last measurement of an object
+        )
 
 
 class GamObjectrelation(BaseModel):
@@ -250,3 +305,19 @@ class GamObjectrelation(BaseModel):
 
     class Meta:
         table_name = 'gam_objectrelation'
+        indexes = (
+            (('or_object', 'or_date_removal'), False),  # the current module of an object
+        )
+
+
+class HlmObjectLease(BaseModel):
+    """
+    Which PV import service instance imports each object, when several share the database. Not part of the GAM schema,
+    created by the service when leases are enabled.
+    """
+    lease_key = CharField(column_name='LEASE_KEY', primary_key=True)
+    lease_owner = CharField(column_name='LEASE_OWNER')
+    lease_expires = DateTimeField(column_name='LEASE_EXPIRES')
+
+    class Meta:
+        table_name = 'hlm_object_lease'
@@ -42,7 +42,22 @@ def need_connection(func):
 @need_connection
 def get_object_module(object_id: int, object_class: int = None):
     """
-    Get the module of the object with the given ID.
+    Get the module of the object with the given ID, if the DB connection is usable.
+
+    Args:
+        object_id (int): The object ID whose relations to check for the module.
+        object_class (int, optional): The object's class ID, if None it will be queried.
+
+    Returns:
+        (GamObject): The module object.
+    """
+    return find_object_module(object_id, object_class)
+
+
+def find_object_module(object_id: int, object_class: int = None):
+    """
+    Get the module of the object with the given ID, without checking the DB connection first (i.e. a lost connection
+    raises the DB error, for the caller to handle).
 
     Args:
         object_id (int): The object ID whose relations to check for the module.
@@ -64,7 +79,6 @@ def get_object_module(object_id: int, object_class: int = None):
         return None
 
 
-@need_connection
 def _get_module_object(object_id: int, module_type: int):
     try:
         gcm_relation = GamObjectrelation.select(GamObjectrelation.or_object_id_assigned)
@@ -2,10 +2,10 @@ from typing import ContextManager
 
 from peewee import SqliteDatabase
 from shared.db_models import BaseModel, GamNetwork, GamImage, GamDisplayformat, GamDisplaygroup, GamFunction,\
-    GamObjectclass, GamObjecttype, GamObject, GamCoordinate, GamMeasurement, GamObjectrelation
+    GamObjectclass, GamObjecttype, GamObject, GamCoordinate, GamMeasurement, GamObjectrelation, HlmObjectLease
 
 MODELS = [BaseModel, GamNetwork, GamImage, GamDisplayformat, GamDisplaygroup, GamFunction,
-          GamObjectclass, GamObjecttype, GamObject, GamCoordinate, GamMeasurement, GamObjectrelation]
+          GamObjectclass, GamObjecttype, GamObject, GamCoordinate, GamMeasurement, GamObjectrelation, HlmObjectLease]
 
 # use an in-memory SQLite for tests.
 database = SqliteDatabase(':memory:')
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import unittest
+from datetime import datetime
+
+from mock import patch, MagicMock, AsyncMock
+
+from HLM_PV_Import.async_import import AsyncPvImport, AsyncPvMonitors, DbWriter
+from HLM_PV_Import.clock import clock, Clock, SimulatedClock
+from HLM_PV_Import.db_func import UNVALIDATED
+from HLM_PV_Import.settings import PvImportConfig
+
+
+class TestAsyncPvImport(unittest.TestCase):
+
+    def setUp(self):
+        self.pv_monitors = MagicMock()
+        self.pv_monitors.handle_is_stale.return_value = False
+        self.pv_monitors.has_data.return_value = True
+        self.pv_monitors.get_values.return_value = [5]
+        self.config = MagicMock()
+        self.config.object_ids = [1]
+        self.config.logging_periods = {1: 1}
+        self.config.get_entry_measurement_pvs.return_value = {'1': 'PV1'}
+        self.config.get_entry_statistics.return_value = {}
+        self.db_writer = MagicMock()
+        self.db_writer.add_measurement = AsyncMock()
+        self.db_writer.call = AsyncMock(side_effect=lambda func, *args, **kwargs: func(*args, **kwargs))
+        self.pv_import = AsyncPvImport(self.pv_monitors, self.config, [], db_writer=self.db_writer)
+
+    def test_GIVEN_due_object_WHEN_import_objects_THEN_measurement_written_dated_when_read(self):
+        clock.use(SimulatedClock(datetime(2021, 1, 1).timestamp()))
+        self.addCleanup(clock.use, Clock())
+
+        asyncio.run(self.pv_import._import_objects_async())
+
+        self.db_writer.add_measurement.assert_awaited_once_with(object_id=1, mea_values={'1': 5}, validity=UNVALIDATED,
+                                                                mea_date=datetime(2021, 1, 1))
+
+    def test_GIVEN_object_not_due_WHEN_import_objects_THEN_no_measurement_written(self):
+        asyncio.run(self.pv_import._import_objects_async())
+        asyncio.run(self.pv_import._import_objects_async())
+
+        self.db_writer.add_measurement.assert_awaited_once()
+
+    @patch.object(PvImportConfig, 'LOOP_TIMER', 0)
+    def test_GIVEN_running_WHEN_stopped_THEN_start_returns(self):
+        self.db_writer.add_measurement.side_effect = lambda **kwargs: self.pv_import.stop()
+
+        asyncio.run(asyncio.wait_for(self.pv_import._import_loop(), timeout=5))
+
+        self.assertFalse(self.pv_import.running)
+        self.pv_monitors.update_stale_pvs.assert_called_once()
+
+    @patch.object(PvImportConfig, 'LOOP_TIMER', 0)
+    def test_GIVEN_heartbeat_and_leases_WHEN_loop_THEN_run_on_db_writer(self):
+        self.pv_import.heartbeat = MagicMock()
+        self.pv_import.lease_manager = MagicMock()
+        self.db_writer.add_measurement.side_effect = lambda **kwargs: self.pv_import.stop()
+
+        asyncio.run(asyncio.wait_for(self.pv_import._import_loop(), timeout=5))
+
+        called = [call.args[0] for call in self.db_writer.call.await_args_list]
+        self.assertIn(self.pv_import._renew_leases, called)
+        self.assertIn(self.pv_import._beat, called)
+        self.pv_import.lease_manager.renew_if_due.assert_called_once()
+
+
+class TestAsyncPvMonitors(unittest.TestCase):
+
+    def test_GIVEN_update_WHEN_async_callback_THEN_data_stored(self):
+        pvm = AsyncPvMonitors([])
+        sub, response = MagicMock(), MagicMock()
+        sub.pv.name = 'PV1'
+        response.data = [1.5]
+
+        asyncio.run(pvm._get_async_callback(pvm.get_handle('PV1'))(sub, response))
+
+        self.assertEqual(1.5, pvm.get_pv_data('PV1'))
+
+
+class TestDbWriter(unittest.TestCase):
+
+    @patch('HLM_PV_Import.async_import.db_connect')
+    @patch('HLM_PV_Import.async_import.add_measurement')
+    def test_WHEN_add_measurement_THEN_called_on_writer_thread(self, mock_add_measurement, _):
+        mock_add_measurement.side_effect = lambda **kwargs: threading.current_thread().name
+        writer = DbWriter()
+        self.addCleanup(writer.close)
+
+        thread_name = asyncio.run(writer.add_measurement(object_id=1, mea_values={'1': 5}))
+
+        mock_add_measurement.assert_called_once_with(object_id=1, mea_values={'1': 5}, validity=UNVALIDATED,
+                                                     mea_date=None)
+        self.assertTrue(thread_name.startswith('db_writer'))
@@ -0,0 +1,188 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from mock import patch, MagicMock
+
+from tests import mock_database
+from HLM_PV_Import import db_func
+from HLM_PV_Import.backfill import Backfill, read_archiver_csv, read_archives
+from shared.const import DBClassIDs, PVConfig, MeaStatus
+
+START = datetime(2021, 3, 1).timestamp()
+
+
+def _entry(object_id, measurements, logging_period=1, statistics=None):
+    entry = {PVConfig.OBJ: object_id, PVConfig.MEAS: measurements, PVConfig.LOG_PERIOD: logging_period}
+    if statistics:
+        entry[PVConfig.STATS] = statistics
+    return entry
+
+
+class TestReadArchives(unittest.TestCase):
+
+    def _write_archive(self, content):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_GIVEN_archiver_csv_WHEN_read_THEN_samples_with_nanoseconds_AND_invalid_samples_none(self):
+        path = self._write_archive('secs,val,sevr,stat,nanos\n100,1.5,0,0,500000000\n160,2,3904,0,0\n170,x,0,0,0\n')
+
+        samples = list(read_archiver_csv(path, 'PV1'))
+
+        self.assertEqual([(100.5, 'PV1', 1.5), (160.0, 'PV1', None)], samples)
+
+    def test_GIVEN_two_archives_WHEN_read_archives_THEN_samples_merged_by_time(self):
+        first = self._write_archive('100,1,0,0,0\n300,3,0,0,0\n')
+        second = self._write_archive('200,2,0,0,0\n400,4,0,0,0\n')
+
+        samples = list(read_archives({'PV1': first, 'PV2': second}))
+
+        self.assertEqual([1, 2, 3, 4], [value for _, _, value in samples])
+
+
+@patch('builtins.print')
+@patch('HLM_PV_Import.db_func.database', new=mock_database.database)
+@patch('HLM_PV_Import.backfill.database', new=mock_database.database)
+@patch('shared.utils.database', new=mock_database.database)
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        db = mock_database.Database()
+        db.__enter__()
+        self.addCleanup(db.__exit__, None, None, None)
+
+    @staticmethod
+    def _create_object(name, object_class=DBClassIDs.VESSEL):
+        function = mock_database.GamFunction.create(of_name='test')
+        mock_database.GamObjectclass.get_or_create(
+            oc_id=object_class, defaults={'oc_name': 'test', 'oc_function': function, 'oc_positiontype': 0})
+        object_type = mock_database.GamObjecttype.create(ot_name='test', ot_objectclass=object_class)
+        return mock_database.GamObject.insert(ob_name=name, ob_objecttype=object_type).execute()
+
+    @staticmethod
+    def _get_measurements(object_id):
+        return list(mock_database.GamMeasurement
+                    .select(mock_database.GamMeasurement.mea_date, mock_database.GamMeasurement.mea_value1,
+                            mock_database.GamMeasurement.mea_value2, mock_database.GamMeasurement.mea_value5)
+                    .where(mock_database.GamMeasurement.mea_object == object_id)
+                    .order_by(mock_database.GamMeasurement.mea_id)
+                    .tuples())
+
+    @staticmethod
+    def _date(seconds):
+        return datetime.fromtimestamp(START + seconds)
+
+    def test_GIVEN_samples_WHEN_run_THEN_last_values_added_every_logging_period(self, _):
+        object_id = self._create_object('vessel')
+        backfill = Backfill([_entry(object_id, {'1': 'HLM:LVL', '2': 'HLM:PRES'})],
+                            ['TE:NDW:HLM:LVL', 'TE:NDW:HLM:PRES'], chunk_size=2)
+
+        backfill.run([(START, 'TE:NDW:HLM:LVL', 10.0), (START + 30, 'TE:NDW:HLM:PRES', 1.0),
+                      (START + 90, 'TE:NDW:HLM:LVL', 20.0), (START + 180, 'TE:NDW:HLM:LVL', 30.0)])
+
+        self.assertEqual([(self._date(60), 10, 1, None), (self._date(120), 20, 1, None),
+                          (self._date(180), 30, 1, None)],
+                         [(date, float(v1), float(v2), v5) for date, v1, v2, v5 in self._get_measurements(object_id)])
+        self.assertEqual(3, backfill.measurements_added)
+
+    def test_GIVEN_start_and_end_WHEN_run_THEN_only_measurements_in_between_added(self, _):
+        object_id = self._create_object('vessel')
+        backfill = Backfill([_entry(object_id, {'1': 'LVL'})], ['LVL'],
+                            start=datetime.fromtimestamp(START + 120), end=datetime.fromtimestamp(START + 240))
+
+        backfill.run([(START + seconds, 'LVL', float(seconds)) for seconds in range(0, 400, 30)])
+
+        self.assertEqual([self._date(120), self._date(180)], [row[0] for row in self._get_measurements(object_id)])
+
+    def test_GIVEN_max_statistic_WHEN_run_THEN_max_of_period_added(self, _):
+        object_id = self._create_object('vessel')
+        backfill = Backfill([_entry(object_id, {'1': 'LVL'}, statistics={'1': 'max'})], ['LVL'])
+
+        backfill.run([(START, 'LVL', 5.0), (START + 10, 'LVL', 50.0), (START + 20, 'LVL', 7.0),
+                      (START + 60, 'LVL', 1.0)])
+
+        self.assertEqual([50], [float(row[1]) for row in self._get_measurements(object_id)])
+
+    def test_GIVEN_gas_counter_with_previous_measurement_WHEN_run_THEN_litres_calculated_from_previous(self, _):
+        object_id = self._create_object('gas counter', DBClassIDs.GAS_COUNTER)
+        mock_database.GamMeasurement.create(mea_object=object_id, mea_date='2000-01-01 00:00:00', mea_value1=100)
+        backfill = Backfill([_entry(object_id, {'1': 'REV'})], ['REV'])
+
+        backfill.run([(START, 'REV', 110.0), (START + 90, 'REV', 130.0), (START + 150, 'REV', 150.0)])
+
+        self.assertEqual([round(10 * 1.321, 2), round(20 * 1.321, 2)],
+                         [float(row[3]) for row in self._get_measurements(object_id)[1:]])
+
+    def test_GIVEN_gas_counter_gap_bridged_by_import_WHEN_backfilled_THEN_litres_counted_once_AND_import_continues(
+            self, _):
+        object_id = self._create_object('gas counter', DBClassIDs.GAS_COUNTER)
+        # The import measured before and after an outage, the measurement after it counting the litres of the gap
+        mock_database.GamMeasurement.create(mea_object=object_id, mea_date=self._date(0), mea_value1=100)
+        mock_database.GamMeasurement.create(mea_object=object_id, mea_date=self._date(300), mea_value1=150,
+                                            mea_value5=round(50 * 1.321, 2))
+        backfill = Backfill([_entry(object_id, {'1': 'REV'})], ['REV'], start=self._date(60), end=self._date(300))
+
+        backfill.run([(START, 'REV', 100.0), (START + 30, 'REV', 110.0), (START + 90, 'REV', 120.0),
+                      (START + 150, 'REV', 130.0), (START + 210, 'REV', 140.0), (START + 270, 'REV', 145.0)])
+        db_func.add_measurement(object_id, {'1': 160, '2': None, '3': None, '4': None, '5': None})
+
+        measurements = [(float(v1), v5) for _, v1, _, v5 in sorted(self._get_measurements(object_id))]
+        self.assertEqual([100, 110, 120, 130, 140, 150, 160], [revolutions for revolutions, _ in measurements])
+        self.assertEqual([round((current[0] - previous[0]) * 1.321, 2)
+                          for previous, current in zip(measurements, measurements[1:])],
+                         [float(litres) for _, litres in measurements[1:]])
+
+    def test_GIVEN_dry_run_WHEN_run_THEN_measurements_counted_but_not_added(self, _):
+        object_id = self._create_object('vessel')
+        backfill = Backfill([_entry(object_id, {'1': 'LVL'})], ['LVL'], dry_run=True)
+
+        backfill.run([(START, 'LVL', 1.0), (START + 60, 'LVL', 2.0)])
+
+        self.assertEqual(1, backfill.measurements_added)
+        self.assertEqual([], self._get_measurements(object_id))
+
+    def test_GIVEN_measurement_in_db_WHEN_run_THEN_measurement_less_than_half_a_period_away_skipped(self, _):
+        object_id = self._create_object('vessel')
+        mock_database.GamMeasurement.create(mea_object=object_id, mea_date=self._date(65), mea_value1=0)
+        backfill = Backfill([_entry(object_id, {'1': 'LVL'})], ['LVL'])
+
+        backfill.run([(START + seconds, 'LVL', float(seconds)) for seconds in range(0, 200, 30)])
+
+        self.assertEqual([self._date(65), self._date(120), self._date(180)],
+                         sorted(row[0] for row in self._get_measurements(object_id)))
+        self.assertEqual(2, backfill.measurements_added)
+        self.assertEqual(1, backfill.measurements_skipped)
+
+    def test_GIVEN_calibration_and_validation_WHEN_run_THEN_values_calibrated_and_validated(self, _):
+        object_id = self._create_object('vessel')
+        object_type = MagicMock(ot_id=1, ot_name='type', ot_calib_name=None, ot_calib_x='0;100', ot_calib_y='0;50',
+                                ot_calib_npoints=2)
+        display_format = MagicMock(df_lowerlimit=0, df_upperlimit=20, df_alarmlow=None, df_alarmhigh=None)
+        backfill = Backfill([_entry(object_id, {'1': 'LVL'})], ['LVL'], calibrate=True, validate=True)
+
+        with patch('HLM_PV_Import.backfill.get_object_types', return_value={object_id: object_type}), \
+                patch('HLM_PV_Import.backfill.get_object_display_formats',
+                      return_value={object_id: [display_format, None, None, None, None]}):
+            backfill.run([(START, 'LVL', 10.0), (START + 90, 'LVL', 60.0), (START + 120, 'LVL', 60.0)])
+
+        measurements = (mock_database.GamMeasurement
+                        .select(mock_database.GamMeasurement.mea_value1, mock_database.GamMeasurement.mea_valid,
+                                mock_database.GamMeasurement.mea_status)
+                        .order_by(mock_database.GamMeasurement.mea_date)
+                        .tuples())
+        self.assertEqual([(5, 1, MeaStatus.OK), (30, 0, MeaStatus.OUT_OF_RANGE)],
+                         [(float(value), int(valid), int(status)) for value, valid, status in measurements])
+
+    def test_GIVEN_entry_without_archived_pvs_WHEN_created_THEN_object_ignored(self, _):
+        backfill = Backfill([_entry(1, {'1': 'LVL'}), _entry(2, {'1': 'OTHER'})], ['LVL'])
+
+        self.assertEqual([1], list(backfill.plans))
+
+
+if __name__ == '__main__':
+    unittest.main()
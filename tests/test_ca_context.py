@@ -0,0 +1,107 @@
+import unittest
+
+from mock import patch, MagicMock
+
+from shared.ca_context import ContextRegistry
+
+
+class FakeContext:
+    """ Caches the PVs by name and priority like the caproto Context, with all of them on one circuit. """
+
+    def __init__(self):
+        self.pvs = {}
+        self.pvs_needing_circuits = {}
+        self.pv_cache_lock = MagicMock()
+        self.circuit = MagicMock()
+        self.circuit.pvs = {}
+        self.circuit_managers = {('127.0.0.1', 0): self.circuit}
+        self.disconnect = MagicMock()
+
+    def get_pvs(self, *names, timeout=None):
+        pvs = []
+        for name in names:
+            if (name, 0) not in self.pvs:
+                pv = MagicMock()
+                pv.name = name
+                self.pvs[(name, 0)] = pv
+                self.circuit.pvs[len(self.circuit.pvs)] = pv
+            pvs.append(self.pvs[(name, 0)])
+        return pvs
+
+
+@patch('shared.ca_context.Context', new=FakeContext)
+class TestContextRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ContextRegistry(idle_timeout=60)
+        self.addCleanup(self.registry.disconnect)
+
+    def test_GIVEN_pvs_acquired_by_two_users_WHEN_acquire_THEN_same_context_and_pvs(self):
+        first = self.registry.acquire_pvs('PV1', 'PV2')
+        second = self.registry.acquire_pvs('PV2')
+
+        self.assertIs(first[1], second[0])
+
+    def test_GIVEN_pv_released_by_one_of_two_users_WHEN_collect_unused_THEN_channel_kept(self):
+        pv, = self.registry.acquire_pvs('PV1')
+        self.registry.acquire_pvs('PV1')
+        self.registry.release_pvs([pv])
+
+        self.registry.collect_unused(idle_for=0)
+
+        pv.go_idle.assert_not_called()
+
+    def test_GIVEN_pv_released_WHEN_acquired_again_before_collect_THEN_channel_reused(self):
+        pv, = self.registry.acquire_pvs('PV1')
+        self.registry.release_pvs([pv])
+
+        again, = self.registry.acquire_pvs('PV1')
+        self.registry.collect_unused(idle_for=0)
+
+        self.assertIs(pv, again)
+        pv.go_idle.assert_not_called()
+
+    def test_GIVEN_pvs_released_WHEN_collect_unused_THEN_channels_cleared_and_unused_circuit_disconnected(self):
+        pvs = self.registry.acquire_pvs('PV1', 'PV2')
+        ctx = self.registry._context
+        self.registry.release_pvs(pvs)
+
+        self.registry.collect_unused(idle_for=0)
+
+        for pv in pvs:
+            pv.go_idle.assert_called_once()
+        self.assertEqual({}, ctx.pvs)
+        ctx.circuit.disconnect.assert_called_once()
+        self.assertEqual({}, ctx.circuit_managers)
+
+    def test_GIVEN_pv_released_recently_WHEN_collect_unused_THEN_channel_kept_until_idle_timeout(self):
+        pv, = self.registry.acquire_pvs('PV1')
+        ctx = self.registry._context
+        self.registry.release_pvs([pv])
+
+        self.registry.collect_unused()
+
+        pv.go_idle.assert_not_called()
+        ctx.circuit.disconnect.assert_not_called()
+
+    def test_GIVEN_pv_WHEN_read_THEN_value_read_and_pv_released(self):
+        value = self.registry.read('PV1', timeout=2)
+
+        pv = self.registry._context.pvs[('PV1', 0)]
+        pv.wait_for_connection.assert_called_once_with(timeout=2)
+        self.assertIs(pv.read.return_value, value)
+        self.assertIn('PV1', self.registry._released)
+
+    def test_WHEN_disconnect_THEN_context_disconnected_and_new_one_created_when_needed(self):
+        self.registry.acquire_pvs('PV1')
+        ctx = self.registry._context
+
+        self.registry.disconnect()
+        self.registry.acquire_pvs('PV1')
+
+        ctx.disconnect.assert_called_once()
+        self.assertIsNot(ctx, self.registry._context)
+
+
+if __name__ == '__main__':
+    unittest.main()
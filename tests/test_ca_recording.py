@@ -0,0 +1,108 @@
+import os
+import tempfile
+import time
+import unittest
+
+from mock import patch, MagicMock
+
+from HLM_PV_Import.ca_recording import UpdateRecorder, ReplaySource, RecordingError, read_recording, \
+    get_recorded_pv_names
+from HLM_PV_Import.ca_wrapper import PvMonitors
+
+
+def _response(value):
+    response = MagicMock()
+    response.data = [value]
+    return response
+
+
+class TestCaRecording(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.rec')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def _record(self, updates):
+        recorder = UpdateRecorder(self.path)
+        for timestamp, pv_name, value in updates:
+            recorder.record(pv_name, _response(value), timestamp)
+        recorder.close()
+        return recorder
+
+    def test_GIVEN_updates_of_each_type_WHEN_recorded_THEN_read_back_in_order(self):
+        updates = [(100.25, 'PV1', 1.5), (101.0, 'PV2', 7), (102.0, 'PV1', -2.0), (103.0, 'PV3', b'text')]
+
+        recorder = self._record(updates)
+
+        self.assertEqual(4, recorder.updates_recorded)
+        self.assertEqual(updates, list(read_recording(self.path)))
+        self.assertEqual(['PV1', 'PV2', 'PV3'], get_recorded_pv_names(self.path))
+
+    def test_GIVEN_unsupported_value_WHEN_recorded_THEN_skipped(self):
+        recorder = self._record([(100.0, 'PV1', [1, 2]), (101.0, 'PV1', 3.0)])
+
+        self.assertEqual(1, recorder.updates_recorded)
+        self.assertEqual([(101.0, 'PV1', 3.0)], list(read_recording(self.path)))
+
+    def test_GIVEN_last_record_cut_short_WHEN_read_THEN_previous_records_read(self):
+        self._record([(100.0, 'PV1', 1.0), (101.0, 'PV1', 2.0)])
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+
+        self.assertEqual([(100.0, 'PV1', 1.0)], list(read_recording(self.path)))
+
+    def test_GIVEN_not_a_recording_WHEN_read_THEN_error(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'secs,val\n')
+
+        with self.assertRaises(RecordingError):
+            list(read_recording(self.path))
+
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_GIVEN_recorder_WHEN_monitor_update_THEN_recorded(self, _):
+        pvm = PvMonitors(['PV1'])
+        pvm.recorder = UpdateRecorder(self.path)
+
+        pvm._callback_f(pvm.get_handle('PV1'), MagicMock(), _response(4.5))
+        pvm.recorder.close()
+
+        self.assertEqual([('PV1', 4.5)], [(pv_name, value) for _, pv_name, value in read_recording(self.path)])
+
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_GIVEN_recording_WHEN_replayed_THEN_monitors_have_renamed_pvs_last_values(self, _):
+        self._record([(100.0, 'PV1', 1.0), (100.5, 'PV2', b'on'), (101.0, 'PV1', 2.0)])
+        pvm = PvMonitors(['SIM:PV1', 'SIM:PV2'])
+
+        replay = ReplaySource(self.path, pvm, speed=0, rename=lambda name: f'SIM:{name}')
+        replay.run()
+
+        self.assertEqual(3, replay.updates_replayed)
+        self.assertEqual(2.0, pvm.get_pv_data('SIM:PV1'))
+        self.assertEqual('on', pvm.get_pv_data('SIM:PV2'))
+
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_GIVEN_speed_WHEN_replayed_THEN_recorded_pace_accelerated(self, _):
+        self._record([(100.0, 'PV1', 1.0), (102.0, 'PV1', 2.0)])
+        pvm = PvMonitors(['PV1'])
+
+        start = time.monotonic()
+        ReplaySource(self.path, pvm, speed=10).run()
+
+        self.assertAlmostEqual(0.2, time.monotonic() - start, delta=0.15)
+
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_GIVEN_replay_started_WHEN_stopped_THEN_returns_before_end(self, _):
+        self._record([(100.0, 'PV1', 1.0), (1100.0, 'PV1', 2.0)])
+        pvm = PvMonitors(['PV1'])
+        replay = ReplaySource(self.path, pvm)
+
+        replay.start()
+        time.sleep(0.1)
+        replay.stop()
+
+        self.assertEqual(1, replay.updates_replayed)
+
+
+if __name__ == '__main__':
+    unittest.main()
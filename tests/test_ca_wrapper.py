@@ -1,8 +1,11 @@
 import unittest
 
-from mock import patch
+from mock import patch, MagicMock
+from caproto import SubscriptionType
 from HLM_PV_Import import ca_wrapper
 from HLM_PV_Import.ca_wrapper import PvMonitors
+from HLM_PV_Import.clock import clock
+from HLM_PV_Import.settings import CA
 from parameterized import parameterized
 from caproto.threading import client
 
@@ -15,8 +18,8 @@ class TestWrapper(unittest.TestCase):
         ({'1': False, '2': False, '3': False, '4': False, '5': False}, []),
         ({'1': True}, ['1']), ({'1': False}, [])
     ])
-    @patch('HLM_PV_Import.ca_wrapper.Context')
-    def test_WHEN_get_connected_pvs_THEN_return_correct_list(self, pvs_param, expected, mock_ctx):
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_WHEN_get_connected_pvs_THEN_return_correct_list(self, pvs_param, expected, mock_ca_context):
         # Arrange
         class TestPV:
             def __init__(self, name_, connected_):
@@ -26,20 +29,21 @@ class TestWrapper(unittest.TestCase):
         for name, connected in pvs_param.items():
             pvs.append(TestPV(name_=name, connected_=connected))
 
-        mock_ctx.return_value.get_pvs.return_value = pvs
+        mock_ca_context.acquire_pvs.return_value = pvs
 
         # Act
         result = ca_wrapper.get_connected_pvs(pv_list=[], timeout=0)
 
         # Assert
         self.assertEqual(expected, result)
+        mock_ca_context.release_pvs.assert_called_once_with(pvs)
 
 
 class TestPvMonitors(unittest.TestCase):
 
     def setUp(self):
-        patcher = patch('HLM_PV_Import.ca_wrapper.Context')
-        self.mock_ctx = patcher.start().return_value
+        patcher = patch('HLM_PV_Import.ca_wrapper.ca_context')
+        self.mock_ca_context = patcher.start()
         self.addCleanup(patcher.stop)
         self.pvm = PvMonitors([])
         self.dummy_data = {'PV_name_1': 123, 'PV_name_2': 117.4, 'PV_name_3': 'High', 'PV_name_4': None}
@@ -52,13 +56,13 @@ class TestPvMonitors(unittest.TestCase):
         self.pvm.start_monitors()
 
         # Assert
-        self.mock_ctx.get_pvs.assert_called_with('a', 'b', 'c')
+        self.mock_ca_context.acquire_pvs.assert_called_with('a', 'b', 'c')
 
     @patch.object(client, 'PV')
     def test_WHEN_start_monitors_THEN_subscribe_to_pvs(self, mock_pv):
         # Arrange
         mock_sub = mock_pv.subscribe
-        self.mock_ctx.get_pvs.return_value = [mock_pv]
+        self.mock_ca_context.acquire_pvs.return_value = [mock_pv]
 
         # Act
         self.pvm.start_monitors()
@@ -66,6 +70,20 @@ class TestPvMonitors(unittest.TestCase):
         # Assert
         mock_sub.assert_called()
 
+    @patch.object(client, 'PV')
+    def test_GIVEN_monitors_started_WHEN_stop_monitors_THEN_own_callbacks_removed_and_pvs_released(self, mock_pv):
+        mock_pv.name = 'a'
+        self.mock_ca_context.acquire_pvs.return_value = [mock_pv]
+        self.pvm.start_monitors()
+        sub = self.pvm.subscriptions['a']
+
+        self.pvm.stop_monitors()
+
+        sub.remove_callback.assert_called_once_with(sub.add_callback.return_value)
+        sub.clear.assert_not_called()
+        self.mock_ca_context.release_pvs.assert_called_once_with([mock_pv])
+        self.assertEqual({}, self.pvm.subscriptions)
+
     @parameterized.expand([
         (1, 2, True),
         (1, 3, True),
@@ -73,44 +91,177 @@ class TestPvMonitors(unittest.TestCase):
         (1, 1, False)
     ])
     def test_GIVEN_pv_name_WHEN_check_if_data_is_stale_THEN_correct_check(self, last_update, current_time, expected):
-        with patch('time.time') as mock_time, patch('HLM_PV_Import.ca_wrapper.pv_logger'):
+        with patch.object(clock, 'time') as mock_time, patch('HLM_PV_Import.ca_wrapper.pv_logger'), \
+                patch.object(CA, 'STALE_AFTER', 1):  # set 1 second old as stale data
 
             # Arrange
-            ca_wrapper.STALE_AGE = 1  # set 1 second old as stale data
-            self.pvm._pv_last_update['pv_name'] = last_update
+            handle = self.pvm.get_handle('pv_name')
+            self.pvm._last_updates[handle] = last_update
             mock_time.return_value = current_time
 
             # Act
+            self.pvm.update_stale_pvs()
             result = self.pvm.pv_data_is_stale('pv_name')
 
             # Assert
             self.assertEqual(expected, result)
 
+    def test_GIVEN_stale_pv_WHEN_sweep_repeatedly_THEN_logged_once(self):
+        with patch.object(clock, 'time') as mock_time, patch('HLM_PV_Import.ca_wrapper.pv_logger') as mock_logger, \
+                patch.object(CA, 'STALE_AFTER', 1):
+            # Arrange
+            handle = self.pvm.get_handle('pv_name')
+            self.pvm._last_updates[handle] = 1
+            mock_time.return_value = 3
+
+            # Act
+            first_sweep = self.pvm.update_stale_pvs()
+            second_sweep = self.pvm.update_stale_pvs()
+
+            # Assert
+            self.assertEqual({'pv_name'}, first_sweep)
+            self.assertEqual(set(), second_sweep)
+            self.assertEqual({'pv_name'}, self.pvm.get_stale_pvs())
+            mock_logger.warning.assert_called_once()
+
+    def test_GIVEN_stale_pv_WHEN_update_received_THEN_no_longer_stale(self):
+        with patch.object(clock, 'time') as mock_time, patch('HLM_PV_Import.ca_wrapper.pv_logger') as mock_logger, \
+                patch.object(CA, 'STALE_AFTER', 1), \
+                patch('caproto.threading.client.Subscription') as mock_sub, \
+                patch('caproto._commands.EventAddResponse') as mock_resp:
+            # Arrange
+            handle = self.pvm.get_handle('pv_name')
+            self.pvm._last_updates[handle] = 1
+            mock_time.return_value = 3
+            self.pvm.update_stale_pvs()
+            mock_sub.pv.name = 'pv_name'
+            mock_resp.data = [1]
+
+            # Act
+            self.pvm._callback_f(handle, mock_sub, mock_resp)
+
+            # Assert
+            self.assertFalse(self.pvm.pv_data_is_stale('pv_name'))
+            self.assertEqual(set(), self.pvm.get_stale_pvs())
+            mock_logger.info.assert_called_once()
+
+    def test_GIVEN_update_received_while_sweep_marks_stale_WHEN_sweep_THEN_not_stale(self):
+        pvm = self.pvm
+
+        class UpdatedOnAdd(set):
+            # The update lands after the sweep's check, its stale check having run before the add
+            def add(self, handle):
+                super().add(handle)
+                pvm._last_updates[handle] = 3
+
+        with patch.object(clock, 'time') as mock_time, patch('HLM_PV_Import.ca_wrapper.pv_logger') as mock_logger, \
+                patch.object(CA, 'STALE_AFTER', 1):
+            # Arrange
+            handle = pvm.get_handle('pv_name')
+            pvm._last_updates[handle] = 1
+            pvm._stale_handles = UpdatedOnAdd()
+            mock_time.return_value = 3
+
+            # Act
+            newly_stale = pvm.update_stale_pvs()
+
+            # Assert
+            self.assertEqual(set(), newly_stale)
+            self.assertEqual(set(), pvm.get_stale_pvs())
+            mock_logger.warning.assert_not_called()
+
     def test_WHEN_default_callback_THEN_store_data(self):
         with patch('caproto.threading.client.Subscription') as mock_sub, \
              patch('caproto._commands.EventAddResponse') as mock_resp:
             # Arrange
             mock_sub.pv.name = 'pv_name'
             mock_resp.data = [1]
-            expected_data = {'pv_name': 1}
+            handle = self.pvm.get_handle('pv_name')
 
             # Act
-            self.pvm._callback_f(mock_sub, mock_resp)
+            self.pvm._callback_f(handle, mock_sub, mock_resp)
 
             # Assert
-            self.assertDictEqual(expected_data, self.pvm._pv_data)
+            self.assertEqual(1, self.pvm.get_pv_data('pv_name'))
+            self.assertEqual([1], self.pvm.get_values([handle]))
 
     def test_WHEN_default_callback_THEN_store_update_time(self):
         with patch('caproto.threading.client.Subscription') as mock_sub, \
              patch('caproto._commands.EventAddResponse') as mock_resp, \
-             patch('time.time') as mock_time:
+             patch.object(clock, 'time') as mock_time:
             # Arrange
             mock_time.return_value = 123
             mock_sub.pv.name = 'pv_name'
-            expected_update = {'pv_name': 123}
+            handle = self.pvm.get_handle('pv_name')
 
             # Act
-            self.pvm._callback_f(mock_sub, mock_resp)
+            self.pvm._callback_f(handle, mock_sub, mock_resp)
 
             # Assert
-            self.assertDictEqual(expected_update, self.pvm._pv_last_update)
+            self.assertEqual(123, self.pvm._last_updates[handle])
+
+    def test_GIVEN_pv_list_WHEN_get_handle_THEN_dense_handles_in_list_order(self):
+        pvm = PvMonitors(['a', 'b'])
+
+        self.assertEqual([0, 1, 2, 0], [pvm.get_handle('a'), pvm.get_handle('b'), pvm.get_handle('c'),
+                                        pvm.get_handle('a')])
+
+    def test_GIVEN_updated_pv_WHEN_handle_added_beyond_pv_list_THEN_update_kept(self):
+        pvm = PvMonitors(['a'])
+        response = MagicMock()
+        response.data = [1.5]
+        pvm._callback_f(pvm.get_handle('a'), MagicMock(), response)
+
+        handle = pvm.get_handle('b')
+
+        self.assertTrue(pvm.has_data(pvm.get_handle('a')))
+        self.assertFalse(pvm.has_data(handle))
+
+    def test_GIVEN_no_updates_WHEN_get_pv_data_THEN_key_error(self):
+        self.pvm.get_handle('pv_name')
+
+        with self.assertRaises(KeyError):
+            self.pvm.get_pv_data('pv_name')
+        self.assertFalse(self.pvm.has_data(self.pvm.get_handle('pv_name')))
+
+    def test_GIVEN_bytes_value_WHEN_callback_THEN_value_decoded_when_read(self):
+        handle = self.pvm.get_handle('pv_name')
+        response = MagicMock()
+        response.data = [b'High']
+
+        self.pvm._callback_f(handle, MagicMock(), response)
+
+        self.assertEqual('High', self.pvm.get_pv_data('pv_name'))
+
+    def test_GIVEN_several_updates_WHEN_read_THEN_latest_value(self):
+        handle = self.pvm.get_handle('pv_name')
+        for value in (1, 2, 3):
+            response = MagicMock()
+            response.data = [value]
+            self.pvm._callback_f(handle, MagicMock(), response)
+
+        self.assertEqual([3], self.pvm.get_values([handle]))
+
+    @patch.object(client, 'PV')
+    def test_GIVEN_monitor_mask_WHEN_start_monitors_THEN_subscribed_with_mask(self, mock_pv):
+        self.mock_ca_context.acquire_pvs.return_value = [mock_pv]
+        self.pvm.monitor_mask = SubscriptionType.DBE_LOG
+
+        self.pvm.start_monitors()
+
+        mock_pv.subscribe.assert_called_with(mask=SubscriptionType.DBE_LOG)
+
+
+class TestMonitorMask(unittest.TestCase):
+
+    @parameterized.expand([
+        ('value,alarm', SubscriptionType.DBE_VALUE | SubscriptionType.DBE_ALARM),
+        ('log', SubscriptionType.DBE_LOG),
+        (' Log , Alarm ', SubscriptionType.DBE_LOG | SubscriptionType.DBE_ALARM)
+    ])
+    def test_GIVEN_event_names_WHEN_get_monitor_mask_THEN_mask(self, events, expected):
+        self.assertEqual(expected, ca_wrapper.get_monitor_mask(events))
+
+    def test_GIVEN_invalid_event_name_WHEN_get_monitor_mask_THEN_value_error(self):
+        with self.assertRaises(ValueError):
+            ca_wrapper.get_monitor_mask('value,deadband')
@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+from mock import patch, MagicMock
+
+from tests import mock_database
+from HLM_PV_Import.calibration import Calibration, CalibrationError, ObjectCalibrations, parse_calibration_points
+from HLM_PV_Import.ca_wrapper import PvMonitors
+from HLM_PV_Import.db_func import get_object_types
+from HLM_PV_Import.pv_import import PvImport
+from HLM_PV_Import.settings import PvImportConfig
+
+
+def _object_type(ot_id, x, y, npoints=None):
+    return MagicMock(ot_id=ot_id, ot_name=f'type {ot_id}', ot_calib_name=None, ot_calib_x=x, ot_calib_y=y,
+                     ot_calib_npoints=npoints)
+
+
+class TestCalibration(unittest.TestCase):
+
+    def test_GIVEN_separators_WHEN_parse_points_THEN_values(self):
+        self.assertEqual([0, 1.5, 3], parse_calibration_points('0, 1.5, 3').tolist())
+        self.assertEqual([0, 1.5, 3], parse_calibration_points('0 1.5\t3').tolist())
+        self.assertEqual([0, 1.5, 3], parse_calibration_points('0;1,5;3;').tolist())
+
+    def test_GIVEN_not_a_number_WHEN_parse_points_THEN_error(self):
+        with self.assertRaises(CalibrationError):
+            parse_calibration_points('0, 1, high')
+
+    def test_GIVEN_unsorted_points_WHEN_apply_THEN_interpolated_and_clamped_to_ends(self):
+        calibration = Calibration('level', np.array([100, 0, 50]), np.array([1000, 0, 200]))
+
+        result = calibration.apply(np.array([-10, 0, 25, 75, 100, 150]))
+
+        self.assertEqual([0, 0, 100, 600, 1000, 1000], result.tolist())
+
+    def test_GIVEN_invalid_points_WHEN_calibration_THEN_error(self):
+        for x, y in (([0], [0]), ([0, 1], [0, 1, 2]), ([0, 1, 1], [0, 1, 2])):
+            with self.subTest(x=x, y=y), self.assertRaises(CalibrationError):
+                Calibration('test', np.array(x), np.array(y))
+
+    def test_GIVEN_object_type_WHEN_from_object_type_THEN_calibration_or_none(self):
+        self.assertIsNone(Calibration.from_object_type(_object_type(1, None, None)))
+        self.assertEqual([0, 10], Calibration.from_object_type(_object_type(1, '0;1', '0;10', 2)).y.tolist())
+        with self.assertRaises(CalibrationError):
+            Calibration.from_object_type(_object_type(1, '0;1', '0;10', 3))
+
+    @patch('HLM_PV_Import.calibration.logger')
+    def test_GIVEN_measurements_WHEN_apply_THEN_first_values_of_calibrated_objects_calibrated(self, mock_logger):
+        calibrations = ObjectCalibrations()
+        doubled, invalid = _object_type(1, '0 1', '0 2'), _object_type(2, '0 1', 'x y')
+        calibrations.add_objects([10, 11, 12, 13], {10: doubled, 11: doubled, 12: invalid})
+        measurements = [(10, {'1': 0.25, '2': 5}), (11, {'1': 0.5}), (12, {'1': 0.5}), (13, {'1': 0.5}),
+                        (10, {'1': 'High'})]
+
+        calibrations.apply(measurements)
+
+        self.assertEqual([(10, {'1': 0.5, '2': 5}), (11, {'1': 1.0}), (12, {'1': 0.5}), (13, {'1': 0.5}),
+                          (10, {'1': 'High'})], measurements)
+        self.assertEqual([], calibrations.get_missing_objects([10, 11, 12, 13]))
+        mock_logger.error.assert_called_once()
+
+
+@patch('HLM_PV_Import.db_func.database', new=mock_database.database)
+@patch('shared.utils.database', new=mock_database.database)
+class TestCalibrationImport(unittest.TestCase):
+
+    def setUp(self):
+        db = mock_database.Database()
+        db.__enter__()
+        self.addCleanup(db.__exit__, None, None, None)
+
+        function = mock_database.GamFunction.create(of_name='test')
+        object_class = mock_database.GamObjectclass.create(oc_name='test', oc_function=function, oc_positiontype=0)
+        object_type = mock_database.GamObjecttype.create(ot_name='test', ot_objectclass=object_class,
+                                                         ot_calib_x='0;100', ot_calib_y='0;50', ot_calib_npoints=2)
+        self.object_id = mock_database.GamObject.insert(ob_name='vessel', ob_objecttype=object_type).execute()
+
+    def test_GIVEN_object_ids_WHEN_get_object_types_THEN_types_of_existing_objects(self):
+        object_types = get_object_types([self.object_id, self.object_id + 1])
+
+        self.assertEqual([self.object_id], list(object_types))
+        self.assertEqual('0;100', object_types[self.object_id].ot_calib_x)
+
+    @patch.object(PvImportConfig, 'CALIBRATION', True)
+    @patch('HLM_PV_Import.pv_import.add_measurement')
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_GIVEN_calibration_enabled_WHEN_import_objects_THEN_calibrated_values_added(self, _,
+                                                                                          mock_add_measurement):
+        pv_monitors = PvMonitors(['LVL'])
+        config = MagicMock()
+        config.object_ids = [self.object_id]
+        config.logging_periods = {self.object_id: 1}
+        config.get_entry_measurement_pvs.return_value = {'1': 'LVL', '2': 'LVL'}
+        config.get_entry_statistics.return_value = {}
+        pv_import = PvImport(pv_monitors, config, [])
+        response = MagicMock()
+        response.data = [40.0]
+        pv_monitors._callback_f(pv_monitors.get_handle('LVL'), MagicMock(), response)
+
+        pv_import._import_objects()
+
+        mea_values = mock_add_measurement.call_args[1]['mea_values']
+        self.assertEqual({'1': 20.0, '2': 40.0}, dict(mea_values))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import time
+import unittest
+
+from mock import patch
+
+from HLM_PV_Import.db_health import DBHealth, DBUnavailableError
+
+
+@patch('HLM_PV_Import.db_health.logger')
+class TestDBHealth(unittest.TestCase):
+
+    def setUp(self):
+        self.db_health = DBHealth(probe_interval=0.01, base_wait=0.01)
+        self.addCleanup(self.db_health.stop)
+
+    def test_GIVEN_connection_lost_WHEN_check_THEN_fails_fast(self, _):
+        self.db_health.report_failure(Exception('lost'))
+
+        self.assertRaises(DBUnavailableError, self.db_health.check)
+
+    @patch('HLM_PV_Import.db_health.probe_connection', side_effect=[False, False] + [True] * 1000)
+    def test_GIVEN_connection_lost_WHEN_prober_reconnects_THEN_healthy(self, mock_probe, _):
+        self.db_health.report_failure(Exception('lost'))
+
+        self.db_health.start()
+
+        self.assertTrue(self.db_health.wait_until_healthy(timeout=5))
+        self.db_health.check()
+        self.assertGreaterEqual(mock_probe.call_count, 3)
+
+    @patch('HLM_PV_Import.db_health.probe_connection', return_value=False)
+    def test_GIVEN_healthy_WHEN_probe_fails_THEN_unavailable(self, _, __):
+        self.db_health.start()
+
+        for _ in range(500):
+            if not self.db_health.healthy:
+                break
+            time.sleep(0.01)
+        self.assertRaises(DBUnavailableError, self.db_health.check)
@@ -0,0 +1,109 @@
+import threading
+import unittest
+from datetime import datetime
+
+from mock import patch
+
+from HLM_PV_Import.db_writer import MeasurementWriter, WRITER_ERRORS
+from HLM_PV_Import.clock import clock, Clock, SimulatedClock
+from HLM_PV_Import.db_func import UNVALIDATED, INSERT_LATENCY
+from HLM_PV_Import.db_health import DBUnavailableError
+
+
+class TestMeasurementWriter(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('HLM_PV_Import.db_writer.db_connect')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('HLM_PV_Import.db_writer.add_measurement')
+        self.mock_add_measurement = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('HLM_PV_Import.db_writer.add_measurements')
+        self.mock_add_measurements = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.added = []
+        self.mock_add_measurements.side_effect = lambda measurements: self.added.extend(
+            (object_id, mea_values['1'], threading.current_thread().name) for object_id, mea_values, _, _ in measurements)
+
+    def test_GIVEN_measurements_WHEN_stopped_THEN_all_added_in_order_per_object(self):
+        writer = MeasurementWriter(workers=3)
+        writer.start()
+
+        for value in range(50):
+            for object_id in range(6):
+                writer.add_measurement(object_id, {'1': value})
+        writer.stop()
+
+        self.assertEqual(300, len(self.added))
+        for object_id in range(6):
+            added = [(value, thread) for obj_id, value, thread in self.added if obj_id == object_id]
+            self.assertEqual(list(range(50)), [value for value, _ in added])
+            self.assertEqual(1, len({thread for _, thread in added}))
+
+    def test_GIVEN_measurements_WHEN_added_in_batch_THEN_insert_latency_observed_per_measurement(self):
+        count_before = INSERT_LATENCY.count
+        writer = MeasurementWriter(workers=1)
+        for object_id in range(5):
+            writer.add_measurement(object_id, {'1': 1})
+        writer.start()
+        writer.stop()
+
+        self.assertEqual(5, INSERT_LATENCY.count - count_before)
+
+    def test_GIVEN_batch_fails_WHEN_stopped_THEN_measurements_added_one_by_one_dated_when_queued(self):
+        simulated_clock = SimulatedClock(datetime(2021, 1, 1).timestamp())
+        clock.use(simulated_clock)
+        self.addCleanup(clock.use, Clock())
+        queued = datetime(2021, 1, 1)
+        errors_before = WRITER_ERRORS.value
+        self.mock_add_measurements.side_effect = Exception('test')
+        self.mock_add_measurement.side_effect = [Exception('test'), None]
+        writer = MeasurementWriter(workers=1)
+
+        writer.add_measurement(1, {'1': 1})
+        writer.add_measurement(2, {'1': 2})
+        simulated_clock.advance(60)
+        writer.start()
+        writer.stop()
+
+        self.mock_add_measurements.assert_called_once_with([(1, {'1': 1}, UNVALIDATED, queued),
+                                                            (2, {'1': 2}, UNVALIDATED, queued)])
+        self.assertEqual(2, self.mock_add_measurement.call_count)
+        self.mock_add_measurement.assert_called_with(object_id=2, mea_values={'1': 2}, validity=UNVALIDATED,
+                                                     mea_date=queued)
+        self.assertEqual(errors_before + 1, WRITER_ERRORS.value)
+
+    @patch('HLM_PV_Import.db_writer.logger')
+    def test_GIVEN_db_lost_while_adding_batch_WHEN_available_again_THEN_batch_added(self, _):
+        added = threading.Event()
+        self.mock_add_measurements.side_effect = self._lose_db_once(added)
+        writer = MeasurementWriter(workers=1)
+        writer.add_measurement(1, {'1': 1})
+        writer.start()
+
+        self.assertTrue(added.wait(timeout=5))
+        writer.stop()
+
+        self.assertEqual(2, self.mock_add_measurements.call_count)
+        self.mock_add_measurement.assert_not_called()
+
+    @staticmethod
+    def _lose_db_once(added: threading.Event):
+        calls = []
+
+        def add_measurements(_):
+            calls.append(None)
+            if len(calls) == 1:
+                raise DBUnavailableError('test')
+            added.set()
+
+        return add_measurements
+
+    def test_GIVEN_not_started_WHEN_add_measurement_THEN_counted_in_queue_depth(self):
+        writer = MeasurementWriter(workers=2)
+
+        writer.add_measurement(1, {'1': 1})
+        writer.add_measurement(2, {'1': 1})
+
+        self.assertEqual(2, writer.queue_depth())
@@ -0,0 +1,79 @@
+import csv
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from mock import patch
+
+from tests import mock_database
+from HLM_PV_Import.export import get_export_query, export, stream_rows, CsvExportWriter, ParquetExportWriter, COLUMNS
+
+
+@patch('HLM_PV_Import.export.database', new=mock_database.database)
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        db = mock_database.Database()
+        db.__enter__()
+        self.addCleanup(db.__exit__, None, None, None)
+
+        function = mock_database.GamFunction.create(of_name='test')
+        object_class = mock_database.GamObjectclass.create(oc_name='test', oc_function=function, oc_positiontype=0)
+        object_type = mock_database.GamObjecttype.create(ot_name='test', ot_objectclass=object_class)
+        self.first_id = mock_database.GamObject.insert(ob_name='first', ob_objecttype=object_type).execute()
+        self.second_id = mock_database.GamObject.insert(ob_name='second', ob_objecttype=object_type).execute()
+        for day in range(1, 4):
+            for object_id in (self.first_id, self.second_id):
+                mock_database.GamMeasurement.create(mea_object=object_id, mea_date=datetime(2021, 1, day),
+                                                    mea_value1=day, mea_value2=1.5)
+
+    def _export_csv(self, query, chunk_size=2):
+        file = io.StringIO()
+        count = export(query, CsvExportWriter(file), chunk_size)
+        return count, list(csv.reader(io.StringIO(file.getvalue())))
+
+    def test_GIVEN_no_filters_WHEN_export_csv_THEN_header_and_all_measurements_by_object(self):
+        count, rows = self._export_csv(get_export_query())
+
+        self.assertEqual(6, count)
+        self.assertEqual(list(COLUMNS), rows[0])
+        self.assertEqual(['first'] * 3 + ['second'] * 3, [row[2] for row in rows[1:]])
+
+    def test_GIVEN_measurement_added_later_for_earlier_date_WHEN_export_csv_THEN_in_date_order(self):
+        mock_database.GamMeasurement.create(mea_object=self.first_id, mea_date=datetime(2020, 12, 31), mea_value1=0)
+
+        _, rows = self._export_csv(get_export_query([self.first_id]))
+
+        self.assertEqual(['0', '1', '2', '3'], [row[4] for row in rows[1:]])
+
+    def test_GIVEN_object_and_time_range_WHEN_export_csv_THEN_only_those_measurements(self):
+        _, rows = self._export_csv(get_export_query([self.second_id], datetime(2021, 1, 2), datetime(2021, 1, 3)))
+
+        self.assertEqual([[str(self.second_id), 'second', '2']], [[row[1], row[2], row[4]] for row in rows[1:]])
+
+    def test_GIVEN_chunk_size_WHEN_stream_rows_THEN_rows_fetched_in_chunks(self):
+        chunks = list(stream_rows(get_export_query(), chunk_size=4))
+
+        self.assertEqual([4, 2], [len(chunk) for chunk in chunks])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_GIVEN_measurements_WHEN_export_parquet_THEN_rows_written(self):
+        import pyarrow.parquet
+        fd, path = tempfile.mkstemp(suffix='.parquet')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        writer = ParquetExportWriter(path)
+        export(get_export_query([self.first_id]), writer, chunk_size=2)
+        writer.close()
+
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual([1.0, 2.0, 3.0], table.column('mea_value1').to_pylist())
+        self.assertEqual(datetime(2021, 1, 1), table.column('mea_date').to_pylist()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+import unittest
+
+IMPORT_TIME_BUDGET = 0.5  # seconds, for importing the service entry point and everything it imports
+MODULE = 'HLM_PV_Import.__main__'
+
+# Import the service entry point with -X importtime, and report what importing it did
+CHECK_SCRIPT = f'''
+import json, logging, sys, threading
+import {MODULE}
+from HLM_PV_Import.settings import get_config
+print(json.dumps({{
+    'threads': threading.active_count(),
+    'settings_read': get_config.cache_info().currsize,
+    'log_handlers': sum(len(logging.getLogger(name).handlers) for name in ('log', 'db', 'pv', 'trace', 'exc')),
+    'modules': [name for name in ('asyncio', 'http.server', 'logging.config', 'win32serviceutil') if name in sys.modules]
+}}))
+'''
+
+
+def _import_service():
+    """
+    Returns:
+        (dict, float): The import side effects, and the seconds the import took.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHECK_SCRIPT], capture_output=True, text=True,
+                            check=True)
+    # import time: self [us] | cumulative | imported package
+    cumulative = next(int(line.split('|')[1]) for line in result.stderr.splitlines()
+                      if line.split('|')[-1].strip() == MODULE)
+    return json.loads(result.stdout.splitlines()[-1]), cumulative / 1e6
+
+
+class TestImportTime(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.side_effects, cls.import_time = _import_service()
+
+    def test_WHEN_import_service_THEN_no_threads_started(self):
+        self.assertEqual(1, self.side_effects['threads'])
+
+    def test_WHEN_import_service_THEN_settings_not_read(self):
+        self.assertEqual(0, self.side_effects['settings_read'])
+
+    def test_WHEN_import_service_THEN_logging_not_set_up(self):
+        self.assertEqual(0, self.side_effects['log_handlers'])
+
+    def test_WHEN_import_service_THEN_optional_modules_not_loaded(self):
+        self.assertEqual([], self.side_effects['modules'])
+
+    def test_WHEN_import_service_THEN_within_budget(self):
+        self.assertLess(self.import_time, IMPORT_TIME_BUDGET)
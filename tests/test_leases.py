@@ -0,0 +1,103 @@
+import unittest
+from datetime import timedelta
+
+from mock import patch
+
+from HLM_PV_Import.leases import LeaseManager, LEASE_DURATION, get_db_time
+from tests import mock_database
+
+KEYS = list(range(1, 11))
+
+
+@patch('HLM_PV_Import.leases.logger')
+@patch('HLM_PV_Import.leases.database', new=mock_database.database)
+class TestLeaseManager(unittest.TestCase):
+
+    def setUp(self):
+        db = mock_database.Database()
+        db.__enter__()
+        self.addCleanup(db.__exit__, None, None, None)
+
+    @staticmethod
+    def _expire(manager):
+        mock_database.HlmObjectLease.update(lease_expires=get_db_time() - timedelta(seconds=1)).where(
+            mock_database.HlmObjectLease.lease_owner == manager.owner).execute()
+
+    def test_GIVEN_one_instance_WHEN_renew_THEN_holds_all_leases(self, _):
+        manager = LeaseManager(KEYS)
+
+        manager.renew()
+
+        self.assertTrue(all(manager.holds(key) for key in KEYS))
+
+    def test_GIVEN_second_instance_WHEN_both_renew_THEN_leases_split_between_them(self, _):
+        first, second = LeaseManager(KEYS), LeaseManager(KEYS)
+        first.renew()
+
+        second.renew()
+        first.renew()
+        second.renew()
+
+        self.assertEqual(5, len(first.held))
+        self.assertEqual(5, len(second.held))
+        self.assertEqual({str(key) for key in KEYS}, first.held | second.held)
+
+    def test_GIVEN_instance_stopped_renewing_WHEN_other_renews_THEN_its_leases_taken_over(self, _):
+        first, second = LeaseManager(KEYS), LeaseManager(KEYS)
+        first.renew()
+        second.renew()
+        first.renew()
+        second.renew()
+
+        self._expire(first)
+        second.renew()
+
+        self.assertEqual({str(key) for key in KEYS}, second.held)
+
+    def test_GIVEN_other_group_WHEN_renew_THEN_leases_not_shared(self, _):
+        first, second = LeaseManager(KEYS, group='0/2'), LeaseManager([11, 12], group='1/2')
+        first.renew()
+        second.renew()
+
+        first.renew()
+
+        self.assertEqual(10, len(first.held))
+        self.assertEqual(2, len(second.held))
+
+    def test_GIVEN_leases_WHEN_release_all_THEN_other_instance_can_claim_them(self, _):
+        first, second = LeaseManager(KEYS), LeaseManager(KEYS)
+        first.renew()
+
+        first.release_all()
+        second.renew()
+
+        self.assertFalse(first.holds(1))
+        self.assertEqual(10, len(second.held))
+
+    def test_GIVEN_lease_WHEN_renew_THEN_expires_lease_duration_after_db_time(self, _):
+        manager = LeaseManager(KEYS)
+
+        manager.renew()
+
+        lease = mock_database.HlmObjectLease.get(mock_database.HlmObjectLease.lease_key == '1')
+        self.assertAlmostEqual(0, (get_db_time() + timedelta(seconds=LEASE_DURATION) - lease.lease_expires)
+                               .total_seconds(), delta=2)
+
+    @patch('HLM_PV_Import.leases.time')
+    def test_GIVEN_not_renewed_WHEN_lease_duration_passed_THEN_not_held(self, mock_time, _):
+        mock_time.monotonic.return_value = 1000
+        manager = LeaseManager(KEYS)
+        manager.renew()
+
+        mock_time.monotonic.return_value = 1000 + LEASE_DURATION
+
+        self.assertFalse(manager.holds(1))
+
+    @patch('HLM_PV_Import.leases.db_logger')
+    def test_GIVEN_db_error_WHEN_renew_if_due_THEN_error_logged(self, mock_db_logger, _):
+        manager = LeaseManager(KEYS)
+
+        with patch.object(LeaseManager, 'renew', side_effect=Exception('gone')):
+            manager.renew_if_due()
+
+        mock_db_logger.error.assert_called_once()
@@ -0,0 +1,70 @@
+import unittest
+
+from mock import patch, MagicMock
+
+from ServiceManager.live_pvs import LivePvMonitors
+
+
+def _response(*data):
+    response = MagicMock()
+    response.data = list(data)
+    return response
+
+
+@patch('ServiceManager.live_pvs.ca_context')
+class TestLivePvMonitors(unittest.TestCase):
+
+    def _start(self, mock_ca_context, pv_names):
+        pvs = []
+        for pv_name in pv_names:
+            pv = MagicMock()
+            pv.name = pv_name
+            pvs.append(pv)
+        mock_ca_context.acquire_pvs.return_value = pvs
+        monitors = LivePvMonitors(pv_names)
+        monitors.start()
+        # The update and connection callbacks added to each PV
+        callbacks = {pv.name: (pv.subscribe.return_value.add_callback.call_args[0][0],
+                               pv.connection_state_callback.add_callback.call_args[0][0]) for pv in pvs}
+        return monitors, callbacks
+
+    def test_GIVEN_pvs_WHEN_start_THEN_all_subscribed_on_shared_context(self, mock_ca_context):
+        monitors, _ = self._start(mock_ca_context, ['PV1', 'PV2'])
+
+        mock_ca_context.acquire_pvs.assert_called_once_with('PV1', 'PV2')
+        self.assertEqual(2, len(monitors.subscriptions))
+
+    def test_GIVEN_many_updates_of_a_pv_WHEN_take_updates_THEN_only_last_one_taken(self, mock_ca_context):
+        monitors, callbacks = self._start(mock_ca_context, ['PV1', 'PV2'])
+
+        for value in range(100):
+            callbacks['PV1'][0](MagicMock(), _response(value))
+        callbacks['PV2'][0](MagicMock(), _response(b'on'))
+        updates = monitors.take_updates()
+
+        self.assertEqual({'PV1': 99, 'PV2': 'on'}, {pv_name: value for pv_name, (value, _) in updates.items()})
+        self.assertEqual(101, monitors.updates_received)
+        self.assertEqual({}, monitors.take_updates())
+
+    def test_GIVEN_pv_disconnected_WHEN_take_updates_THEN_none(self, mock_ca_context):
+        monitors, callbacks = self._start(mock_ca_context, ['PV1'])
+
+        callbacks['PV1'][0](MagicMock(), _response(1.5))
+        callbacks['PV1'][1](MagicMock(), 'disconnected')
+
+        self.assertEqual({'PV1': None}, monitors.take_updates())
+
+    def test_GIVEN_started_WHEN_stop_THEN_own_callbacks_removed_and_pvs_released(self, mock_ca_context):
+        monitors, _ = self._start(mock_ca_context, ['PV1'])
+        sub = monitors.subscriptions[0]
+        pvs = mock_ca_context.acquire_pvs.return_value
+
+        monitors.stop()
+
+        sub.remove_callback.assert_called_once_with(sub.add_callback.return_value)
+        sub.clear.assert_not_called()
+        mock_ca_context.release_pvs.assert_called_once_with(pvs)
+
+
+if __name__ == '__main__':
+    unittest.main()
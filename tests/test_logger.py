@@ -0,0 +1,68 @@
+import logging
+import queue
+import unittest
+
+from mock import MagicMock
+
+from HLM_PV_Import.logger import DroppingQueueHandler, LoggerDispatchListener, LOGGING_CONFIG, LOG_FILES, \
+    get_logging_config
+
+
+def _make_record(name, level=logging.INFO, msg='test'):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+def _make_handler(level=logging.NOTSET):
+    handler = MagicMock()
+    handler.level = level
+    return handler
+
+
+class TestLogger(unittest.TestCase):
+
+    def test_GIVEN_full_queue_WHEN_emit_THEN_record_dropped_and_counted(self):
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+
+        handler.emit(_make_record('log'))
+        handler.emit(_make_record('log'))
+        handler.emit(_make_record('log'))
+
+        self.assertEqual(1, handler.queue.qsize())
+        self.assertEqual(2, handler.dropped)
+
+    def test_GIVEN_records_of_two_loggers_WHEN_handled_THEN_only_own_handlers_called(self):
+        log_handler, db_handler = _make_handler(), _make_handler()
+        listener = LoggerDispatchListener(queue.Queue(), {'log': [log_handler], 'db': [db_handler]})
+
+        listener.handle(_make_record('db'))
+
+        log_handler.handle.assert_not_called()
+        db_handler.handle.assert_called_once()
+
+    def test_GIVEN_handler_level_WHEN_lower_level_record_handled_THEN_handler_not_called(self):
+        info_handler, error_handler = _make_handler(logging.INFO), _make_handler(logging.ERROR)
+        listener = LoggerDispatchListener(queue.Queue(), {'log': [info_handler, error_handler]})
+
+        listener.handle(_make_record('log', level=logging.WARNING))
+
+        info_handler.handle.assert_called_once()
+        error_handler.handle.assert_not_called()
+
+    def test_GIVEN_started_listener_WHEN_record_queued_THEN_handled_on_listener_thread(self):
+        handler = _make_handler()
+        queue_handler = DroppingQueueHandler(queue.Queue())
+        listener = LoggerDispatchListener(queue_handler.queue, {'log': [handler]})
+        listener.start()
+
+        queue_handler.emit(_make_record('log', msg='queued'))
+        listener.stop()
+
+        self.assertEqual('queued', handler.handle.call_args[0][0].getMessage())
+
+    def test_GIVEN_suffix_WHEN_get_logging_config_THEN_suffix_added_to_log_files_only(self):
+        config = get_logging_config('1')
+
+        filenames = {handler['filename'] for handler in config['handlers'].values() if 'filename' in handler}
+        self.assertEqual(len(LOG_FILES), len(filenames))
+        self.assertIn(LOG_FILES['service'][:-len('.log')] + '.1.log', filenames)
+        self.assertIn(LOG_FILES['error'], {handler.get('filename') for handler in LOGGING_CONFIG['handlers'].values()})
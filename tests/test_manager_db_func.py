@@ -21,13 +21,13 @@ class TestManagerDBFunc(unittest.TestCase):
         db_func.db_connect()
         mock_database.database.close()
 
-    @mock.patch("ServiceManager.db_func.database.is_connection_usable")
+    @mock.patch("ServiceManager.db_func.database.obj.is_connection_usable")
     def test_db_connected_WHEN_db_connected_THEN_returns_true(self, mock_func):
         mock_func.return_value = True
         self.assertTrue(db_func.db_connected())
         mock_func.assert_called()
 
-    @mock.patch("ServiceManager.db_func.database.is_connection_usable")
+    @mock.patch("ServiceManager.db_func.database.obj.is_connection_usable")
     def test_db_connected_WHEN_db_not_connected_THEN_returns_false(self, mock_func):
         mock_func.return_value = False
         self.assertFalse(db_func.db_connected())
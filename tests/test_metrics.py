@@ -0,0 +1,75 @@
+import threading
+import unittest
+from urllib.request import urlopen
+
+from HLM_PV_Import.metrics import MetricsRegistry
+from HLM_PV_Import.metrics_server import MetricsServer
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_GIVEN_counter_WHEN_inc_THEN_value_increased(self):
+        counter = self.registry.counter('test_total', 'Test counter.')
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(3, counter.value)
+
+    def test_GIVEN_registered_name_WHEN_register_again_THEN_same_metric_returned(self):
+        counter = self.registry.counter('test_total', 'Test counter.')
+        self.assertIs(counter, self.registry.counter('test_total', 'Test counter.'))
+
+    def test_GIVEN_registered_name_WHEN_register_as_other_type_THEN_exception_raised(self):
+        self.registry.counter('test_total', 'Test counter.')
+        with self.assertRaises(ValueError):
+            self.registry.gauge('test_total', 'Test gauge.')
+
+    def test_GIVEN_histogram_WHEN_observe_THEN_cumulative_buckets_rendered(self):
+        histogram = self.registry.histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        result = self.registry.render()
+
+        self.assertIn('# TYPE test_seconds histogram', result)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', result)
+        self.assertIn('test_seconds_bucket{le="1"} 2', result)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', result)
+        self.assertIn('test_seconds_sum 5.55', result)
+        self.assertIn('test_seconds_count 3', result)
+
+    def test_GIVEN_observations_in_progress_WHEN_samples_THEN_count_consistent_with_buckets(self):
+        histogram = self.registry.histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1))
+        stop = threading.Event()
+
+        def observe():
+            while not stop.is_set():
+                histogram.observe(0.5)
+        thread = threading.Thread(target=observe)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+
+        for _ in range(1000):
+            samples = dict(histogram.samples())
+            self.assertEqual(samples['test_seconds_bucket{le="+Inf"}'], samples['test_seconds_count'])
+            self.assertEqual(0.5 * samples['test_seconds_count'], samples['test_seconds_sum'])
+
+    def test_GIVEN_gauge_WHEN_render_THEN_help_type_and_value_rendered(self):
+        self.registry.gauge('test_gauge', 'Test gauge.').set(7)
+        self.assertEqual('# HELP test_gauge Test gauge.\n# TYPE test_gauge gauge\ntest_gauge 7\n',
+                         self.registry.render())
+
+    def test_GIVEN_metrics_server_WHEN_get_metrics_THEN_rendered_registry_returned(self):
+        self.registry.counter('test_total', 'Test counter.').inc()
+        server = MetricsServer(port=0, metrics_registry=self.registry)
+        server.start()
+        self.addCleanup(server.stop)
+
+        with urlopen(f'http://127.0.0.1:{server.port}/metrics', timeout=5) as response:
+            body = response.read().decode('utf-8')
+
+        self.assertEqual(self.registry.render(), body)
@@ -0,0 +1,104 @@
+import unittest
+from datetime import datetime
+
+from mock import patch, MagicMock
+
+from HLM_PV_Import.ca_wrapper import PvMonitors
+from HLM_PV_Import.db_health import DBUnavailableError
+from HLM_PV_Import.pv_import import PvImport
+
+
+class TestPvImport(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('HLM_PV_Import.ca_wrapper.ca_context')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pv_monitors = PvMonitors(['PV1', 'PV2'])
+        self.config = MagicMock()
+        self.config.object_ids = [1]
+        self.config.logging_periods = {1: 1}
+        self.config.get_entry_measurement_pvs.return_value = {'1': 'PV1', '2': 'PV2', '3': 'PV1'}
+        self.config.get_entry_statistics.return_value = {'2': 'max', '3': 'count'}
+        self.pv_import = PvImport(self.pv_monitors, self.config, [])
+
+    def _update(self, pv_name, value):
+        response = MagicMock()
+        response.data = [value]
+        self.pv_monitors._callback_f(self.pv_monitors.get_handle(pv_name), MagicMock(), response)
+
+    def test_GIVEN_statistics_WHEN_get_values_THEN_statistics_since_last_measurement(self):
+        for value in (3, 1, 2):
+            self._update('PV1', value)
+            self._update('PV2', value * 10)
+
+        mea_values = self.pv_import._get_plan_values(self.pv_import._plans[1])
+
+        self.assertEqual({'1': 2, '2': 30, '3': 3}, dict(mea_values))
+
+    def test_GIVEN_no_updates_since_last_measurement_WHEN_get_values_THEN_last_value_and_zero_count(self):
+        self._update('PV1', 3)
+        self._update('PV2', 30)
+        self.pv_import._get_plan_values(self.pv_import._plans[1])
+
+        mea_values = self.pv_import._get_plan_values(self.pv_import._plans[1])
+
+        self.assertEqual({'1': 3, '2': 30, '3': 0}, dict(mea_values))
+
+    @patch('HLM_PV_Import.pv_import.pv_logger')
+    def test_GIVEN_pv_without_updates_WHEN_get_values_THEN_skipped_with_warning(self, mock_logger):
+        self._update('PV1', 3)
+
+        mea_values = self.pv_import._get_plan_values(self.pv_import._plans[1])
+
+        self.assertEqual({'1': 3, '3': 1}, dict(mea_values))
+        mock_logger.warning.assert_called_once()
+
+    def test_GIVEN_lease_held_by_other_instance_WHEN_get_due_measurements_THEN_object_skipped(self):
+        self._update('PV1', 3)
+        self._update('PV2', 30)
+        self.pv_import.lease_manager = MagicMock()
+        self.pv_import.lease_manager.holds.return_value = False
+
+        self.assertEqual([], list(self.pv_import._get_due_objects_measurements()))
+
+        self.pv_import.lease_manager.holds.return_value = True
+        self.assertEqual([1], [object_id for object_id, _ in self.pv_import._get_due_objects_measurements()])
+
+    @patch('HLM_PV_Import.pv_import.logger')
+    @patch('HLM_PV_Import.pv_import.add_measurement')
+    @patch('HLM_PV_Import.pv_import.db_health')
+    def test_GIVEN_db_unavailable_WHEN_available_again_THEN_due_objects_added(self, mock_db_health,
+                                                                               mock_add_measurement, _):
+        self._update('PV1', 3)
+        mock_db_health.healthy = False
+
+        self.assertFalse(self.pv_import._db_available())
+        mock_db_health.healthy = True
+        self.assertTrue(self.pv_import._db_available())
+        self.pv_import._import_objects()
+
+        mock_add_measurement.assert_called_once()
+
+    @patch('HLM_PV_Import.pv_import.add_measurement')
+    def test_GIVEN_db_lost_while_adding_WHEN_import_objects_THEN_object_still_due(self, mock_add_measurement):
+        self._update('PV1', 3)
+        mock_add_measurement.side_effect = DBUnavailableError('test')
+
+        self.assertRaises(DBUnavailableError, self.pv_import._import_objects)
+        mock_add_measurement.side_effect = None
+        self.pv_import._import_objects()
+
+        self.assertEqual(2, mock_add_measurement.call_count)
+        self.assertEqual([], list(self.pv_import._get_due_objects_measurements()))
+
+    @patch('HLM_PV_Import.pv_import.get_last_measurement_date', return_value=datetime(2021, 1, 1))
+    def test_GIVEN_lease_acquired_WHEN_renew_leases_THEN_next_measurement_one_period_after_last(self, _):
+        self.pv_import.lease_manager = MagicMock()
+        self.pv_import.lease_manager.held = set()
+        self.pv_import.lease_manager.renew_if_due.side_effect = lambda: setattr(self.pv_import.lease_manager, 'held',
+                                                                                {'1'})
+
+        self.pv_import._renew_leases()
+
+        self.assertEqual(datetime(2021, 1, 1, 0, 1).timestamp(), self.pv_import.tasks[1])
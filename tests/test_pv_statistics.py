@@ -0,0 +1,23 @@
+import unittest
+
+from HLM_PV_Import.pv_statistics import PvStatistics
+from shared.const import MeaStatistics
+
+
+class TestPvStatistics(unittest.TestCase):
+
+    def test_GIVEN_values_WHEN_take_THEN_statistics_returned(self):
+        statistics = PvStatistics()
+        for value in (2, 8, 5):
+            statistics.add(value)
+
+        self.assertEqual({MeaStatistics.MIN: 2, MeaStatistics.MAX: 8, MeaStatistics.MEAN: 5, MeaStatistics.COUNT: 3},
+                         statistics.take())
+
+    def test_GIVEN_taken_WHEN_take_again_THEN_no_values(self):
+        statistics = PvStatistics()
+        statistics.add(1)
+        statistics.take()
+
+        self.assertEqual({MeaStatistics.MIN: None, MeaStatistics.MAX: None, MeaStatistics.MEAN: None,
+                          MeaStatistics.COUNT: 0}, statistics.take())
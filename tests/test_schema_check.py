@@ -0,0 +1,58 @@
+import unittest
+
+from mock import patch
+
+from HLM_PV_Import import schema_check
+from tests import mock_database
+
+
+@patch('HLM_PV_Import.schema_check.database', new=mock_database.database)
+class TestSchemaCheck(unittest.TestCase):
+
+    def setUp(self):
+        db = mock_database.Database()
+        db.__enter__()
+        self.addCleanup(db.__exit__, None, None, None)
+
+    @staticmethod
+    def _drop_index(table, columns):
+        # Drop all the indexes that can be used for the columns
+        name = schema_check.find_index(table, columns)
+        while name is not None:
+            mock_database.database.execute_sql(f'DROP INDEX "{name}"')
+            name = schema_check.find_index(table, columns)
+
+    def test_WHEN_get_required_indexes_THEN_columns_of_model_indexes(self):
+        self.assertIn(('gam_measurement', ('MEA_OBJECT_ID', 'MEA_DATE')), schema_check.get_required_indexes())
+
+    def test_GIVEN_indexes_exist_WHEN_check_indexes_THEN_none_missing(self):
+        results = schema_check.check_indexes()
+
+        self.assertEqual(len(schema_check.get_required_indexes()), len(results))
+        self.assertTrue(all(name for _, _, name in results))
+
+    def test_GIVEN_index_missing_WHEN_check_indexes_THEN_reported(self):
+        self._drop_index('gam_object', ('OB_NAME',))
+
+        results = schema_check.check_indexes()
+
+        self.assertIn(('gam_object', ('OB_NAME',), None), results)
+
+    def test_GIVEN_index_missing_WHEN_check_indexes_and_create_THEN_created(self):
+        self._drop_index('gam_measurement', ('MEA_OBJECT_ID', 'MEA_DATE'))
+
+        schema_check.check_indexes(create=True)
+
+        self.assertTrue(all(name for _, _, name in schema_check.check_indexes()))
+
+    def test_GIVEN_index_on_leading_columns_WHEN_find_index_THEN_primary_key_taken_as_implicit_suffix(self):
+        self._drop_index('gam_measurement', ('MEA_OBJECT_ID', 'MEA_ID'))
+        mock_database.database.execute_sql('CREATE INDEX "fk_object" ON "gam_measurement" ("MEA_OBJECT_ID")')
+
+        self.assertEqual('fk_object', schema_check.find_index('gam_measurement', ('MEA_OBJECT_ID', 'MEA_ID')))
+        self.assertIsNone(schema_check.find_index('gam_measurement', ('MEA_OBJECT_ID', 'MEA_STATUS')))
+
+    def test_GIVEN_index_WHEN_explain_last_measurement_THEN_index_used(self):
+        plan = schema_check.explain(schema_check.get_hot_queries()['last measurement of an object'])
+
+        self.assertIn('INDEX', ' '.join(str(row) for row in plan))
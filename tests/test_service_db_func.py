@@ -1,8 +1,13 @@
 import unittest
+from datetime import datetime
+
 import mock
+from peewee import OperationalError
 
 from tests import mock_database
 from HLM_PV_Import import db_func
+from HLM_PV_Import.clock import clock, Clock, SimulatedClock
+from HLM_PV_Import.db_health import DBHealth, DBUnavailableError
 
 
 RECONNECT_MAX_WAIT_TIME = 14400
@@ -23,14 +28,14 @@ class TestServiceDBFunc(unittest.TestCase):
         self.assertEqual(db_func.increase_reconnect_wait_time(10000), RECONNECT_MAX_WAIT_TIME)
 
     @mock.patch("HLM_PV_Import.db_func.logger.info")
-    @mock.patch("HLM_PV_Import.db_func.database.connect")
+    @mock.patch("HLM_PV_Import.db_func.database.obj.connect")
     def test_db_connect_WHEN_valid_db_THEN_connects(self, mock_connection, mock_logger):
         mock_connection.return_value = True
         db_func.db_connect()
         mock_logger.assert_called_with('Database connection successful.')
 
     @mock.patch("HLM_PV_Import.db_func.logger.error")
-    @mock.patch("HLM_PV_Import.db_func.database.connect")
+    @mock.patch("HLM_PV_Import.db_func.database.obj.connect")
     def test_db_connect_WHEN_no_db_THEN_fails(self, mock_connection, mock_logger):
         error = Exception("Failed")
         mock_connection.side_effect = error
@@ -38,37 +43,66 @@ class TestServiceDBFunc(unittest.TestCase):
         mock_logger.assert_called_with(error)
 
     @mock.patch("HLM_PV_Import.db_func.RECONNECT_ATTEMPTS_MAX", 100)
-    @mock.patch("HLM_PV_Import.db_func.check_db_connection", side_effect=db_func.check_db_connection)
-    def test_check_db_connection_WHEN_no_db_THEN_exception_AND_called_max_attempt_times_before_exception(self, mock_function):
-        self.assertRaises(Exception, mock_function, 1, 0)
-        self.assertEqual(101, mock_function.call_count)
-
-    @mock.patch("HLM_PV_Import.db_func.check_db_connection", side_effect=db_func.check_db_connection)
-    @mock.patch("HLM_PV_Import.db_func.database.is_connection_usable", return_value=True)
-    def test_check_db_connection_WHEN_db_THEN_return_true_and_called_once(self, mock_function, mock_connection):
-        self.assertTrue(mock_function(1, 1))
-        self.assertEqual(1, mock_function.call_count)
-
-    @mock.patch("shared.db_models.database.is_connection_usable")
-    def test_GIVEN_database_connected_THEN_need_connection_succeeds(self, mock_function):
-        mock_function.return_value = True
+    @mock.patch("HLM_PV_Import.db_func.time.sleep")
+    @mock.patch("HLM_PV_Import.db_func.probe_connection", return_value=False)
+    def test_check_db_connection_WHEN_no_db_THEN_exception_AND_attempted_max_times_before_exception(
+            self, mock_probe, mock_sleep):
+        self.assertRaises(Exception, db_func.check_db_connection, 0)
+        self.assertEqual(101, mock_probe.call_count)
+        self.assertEqual(100, mock_sleep.call_count)
+
+    @mock.patch("HLM_PV_Import.db_func.time.sleep")
+    @mock.patch("HLM_PV_Import.db_func.probe_connection", return_value=True)
+    def test_check_db_connection_WHEN_db_THEN_return_true_without_waiting(self, mock_probe, mock_sleep):
+        self.assertTrue(db_func.check_db_connection())
+        mock_probe.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @mock.patch("HLM_PV_Import.db_func.time.sleep")
+    @mock.patch("HLM_PV_Import.db_func.probe_connection", side_effect=[False, False, True])
+    def test_check_db_connection_WHEN_db_reconnects_THEN_return_true_after_increasing_waits(self, _, mock_sleep):
+        self.assertTrue(db_func.check_db_connection(1))
+        mock_sleep.assert_has_calls([mock.call(1), mock.call(2)])
+
+    @mock.patch("HLM_PV_Import.db_func.probe_connection")
+    @mock.patch("HLM_PV_Import.db_func.db_health", new_callable=DBHealth)
+    def test_GIVEN_database_healthy_THEN_need_connection_succeeds_without_probing(self, _, mock_probe):
 
         @db_func.check_connection
         def test_function():
             return True
 
         self.assertTrue(test_function())
-        mock_function.assert_called()
+        mock_probe.assert_not_called()
 
-    @mock.patch("HLM_PV_Import.db_func.RECONNECT_ATTEMPTS_MAX", 1)
-    @mock.patch("HLM_PV_Import.db_func.check_db_connection", side_effect=db_func.check_db_connection)
-    def test_GIVEN_database_connected_THEN_need_connection_fails(self, mock_function):
+    @mock.patch("HLM_PV_Import.db_func.db_health", new_callable=DBHealth)
+    def test_GIVEN_database_unavailable_THEN_need_connection_fails_fast(self, mock_db_health):
+        mock_db_health.report_failure(Exception('lost'))
+        test_function = mock.MagicMock()
 
-        @db_func.check_connection
-        def test_function():
-            return True
+        self.assertRaises(DBUnavailableError, db_func.check_connection(test_function))
+        test_function.assert_not_called()
+
+    @mock.patch("HLM_PV_Import.db_func.db_health", new_callable=DBHealth)
+    def test_GIVEN_connection_error_WHEN_need_connection_THEN_unavailable_raised_AND_database_unavailable(
+            self, mock_db_health):
+        test_function = mock.MagicMock(side_effect=OperationalError(2013, 'Lost connection to MySQL server'))
 
-        self.assertRaises(Exception, test_function)
+        self.assertRaises(DBUnavailableError, db_func.check_connection(test_function))
+        self.assertFalse(mock_db_health.healthy)
+
+    @mock.patch("HLM_PV_Import.db_func.db_health", new_callable=DBHealth)
+    def test_GIVEN_lock_error_WHEN_need_connection_THEN_raised_AND_database_still_available(self, mock_db_health):
+        test_function = mock.MagicMock(side_effect=OperationalError(1205, 'Lock wait timeout exceeded'))
+
+        self.assertRaises(OperationalError, db_func.check_connection(test_function))
+        self.assertTrue(mock_db_health.healthy)
+
+    @mock.patch("HLM_PV_Import.db_func.GamObject.select",
+                side_effect=OperationalError(2006, 'MySQL server has gone away'))
+    @mock.patch("HLM_PV_Import.db_func.db_health", new_callable=DBHealth)
+    def test_GIVEN_connection_error_WHEN_get_obj_id_and_create_if_not_exist_THEN_unavailable_raised(self, *_):
+        self.assertRaises(DBUnavailableError, db_func.get_obj_id_and_create_if_not_exist, 'test', 1, '')
 
     @mock.patch("HLM_PV_Import.db_func.database", new=mock_database.database)
     def test_get_object_GIVEN_no_object_THEN_returns_none(self):
@@ -81,3 +115,72 @@ class TestServiceDBFunc(unittest.TestCase):
         with mock_database.Database():
             obj = mock_database.GamObject.create(ob_name="test", ob_objecttype=1)
             self.assertEqual(db_func.get_object(1), obj)
+
+
+@mock.patch("HLM_PV_Import.db_func.logger")
+@mock.patch("HLM_PV_Import.db_func.database", new=mock_database.database)
+@mock.patch("shared.utils.database", new=mock_database.database)
+class TestServiceDBFuncAddMeasurements(unittest.TestCase):
+
+    def _create_object(self, name, object_class):
+        function = mock_database.GamFunction.create(of_name='test')
+        mock_database.GamObjectclass.get_or_create(
+            oc_id=object_class, defaults={'oc_name': 'test', 'oc_function': function, 'oc_positiontype': 0})
+        object_type = mock_database.GamObjecttype.create(ot_name='test', ot_objectclass=object_class)
+        return mock_database.GamObject.insert(ob_name=name, ob_objecttype=object_type).execute()
+
+    def _get_measurements(self, object_id):
+        return list(mock_database.GamMeasurement.select()
+                    .where(mock_database.GamMeasurement.mea_object == object_id)
+                    .order_by(mock_database.GamMeasurement.mea_id)
+                    .tuples())
+
+    def test_GIVEN_measurements_WHEN_add_measurements_THEN_same_rows_as_add_measurement(self, _):
+        clock.use(SimulatedClock(datetime(2021, 1, 1).timestamp()))
+        self.addCleanup(clock.use, Clock())
+        with mock_database.Database():
+            first_id = self._create_object('first', db_func.DBClassIDs.VESSEL)
+            second_id = self._create_object('second', db_func.DBClassIDs.VESSEL)
+            mea_values = {'1': 1.5, '2': 20, '3': None, '4': None, '5': -3.25}
+
+            db_func.add_measurement(first_id, dict(mea_values))
+            db_func.add_measurements([(second_id, dict(mea_values))])
+
+            first, second = self._get_measurements(first_id)[0], self._get_measurements(second_id)[0]
+            # All but the ID, comment (has the object name) and object
+            self.assertEqual([value for i, value in enumerate(first) if i not in (0, 2, 5)],
+                             [value for i, value in enumerate(second) if i not in (0, 2, 5)])
+
+    def test_GIVEN_two_gas_counter_measurements_in_batch_WHEN_add_measurements_THEN_second_calculated_from_first(
+            self, _):
+        with mock_database.Database():
+            object_id = self._create_object('gas counter', db_func.DBClassIDs.GAS_COUNTER)
+            mock_database.GamMeasurement.create(mea_object=object_id, mea_date='2021-01-01 00:00:00', mea_value1=100)
+
+            db_func.add_measurements([(object_id, {'1': 110, '2': None, '3': None, '4': None, '5': None}),
+                                      (object_id, {'1': 130, '2': None, '3': None, '4': None, '5': None})])
+
+            litres = [row[-1] for row in self._get_measurements(object_id)]
+            self.assertEqual([None, round(10 * 1.321, 2), round(20 * 1.321, 2)], [
+                None if value is None else float(value) for value in litres])
+
+    def test_GIVEN_measurements_WHEN_get_last_measurement_date_THEN_latest_date(self, _):
+        with mock_database.Database():
+            object_id = self._create_object('vessel', db_func.DBClassIDs.VESSEL)
+            for date in ('2021-01-01 00:02:00', '2021-01-01 00:03:00', '2021-01-01 00:01:00'):
+                mock_database.GamMeasurement.create(mea_object=object_id, mea_date=date)
+
+            self.assertEqual(datetime(2021, 1, 1, 0, 3), db_func.get_last_measurement_date(object_id))
+            self.assertIsNone(db_func.get_last_measurement_date(object_id + 1))
+
+    @mock.patch("HLM_PV_Import.db_func._get_measurement_insert_sql", return_value='INSERT INTO "lost" VALUES (?)')
+    @mock.patch("HLM_PV_Import.db_func.db_health", new_callable=DBHealth)
+    def test_GIVEN_insert_fails_WHEN_add_measurements_THEN_peewee_error_raised_AND_database_still_available(
+            self, mock_db_health, _, __):
+        with mock_database.Database():
+            object_id = self._create_object('vessel', db_func.DBClassIDs.VESSEL)
+
+            self.assertRaises(OperationalError, db_func.add_measurements,
+                              [(object_id, {'1': 1, '2': None, '3': None, '4': None, '5': None})])
+            self.assertTrue(mock_db_health.healthy)
+            self.assertEqual([], self._get_measurements(object_id))
@@ -0,0 +1,141 @@
+import unittest
+from datetime import datetime, timedelta
+
+from mock import patch, MagicMock
+
+from tests import mock_database
+from HLM_PV_Import.ca_wrapper import PvMonitors
+from HLM_PV_Import.clock import clock, Clock, SimulatedClock
+from HLM_PV_Import.pv_import import PvImport
+from HLM_PV_Import.settings import CA, PvImportConfig
+from shared.const import DBClassIDs
+
+START = datetime(2021, 3, 1)
+DAY = 24 * 3600
+LOGGING_PERIODS = (30, 60, 120)  # minutes
+GAS_COUNTER_REVOLUTIONS_PER_MINUTE = 10
+SILENT_AFTER = 2 * 3600  # seconds after which the PV of the silent object stops updating
+
+
+class _Response:
+    def __init__(self, value):
+        self.data = [value]
+
+
+@patch.object(PvImportConfig, 'LOOP_TIMER', 10)
+@patch.object(CA, 'STALE_AFTER', 3600)
+@patch.object(CA, 'ADD_STALE_PVS', False)
+@patch('HLM_PV_Import.pv_import.logger', MagicMock())
+@patch('HLM_PV_Import.pv_import.pv_logger', MagicMock())
+@patch('HLM_PV_Import.ca_wrapper.pv_logger', MagicMock())
+@patch('HLM_PV_Import.db_func.logger', MagicMock())
+@patch('HLM_PV_Import.db_func.database', new=mock_database.database)
+@patch('shared.utils.database', new=mock_database.database)
+@patch('HLM_PV_Import.ca_wrapper.ca_context')
+class TestSimulatedDay(unittest.TestCase):
+    """
+    A day of the import schedule, run on a simulated clock against the SQLite mock DB.
+    """
+
+    def setUp(self):
+        db = mock_database.Database()
+        db.__enter__()
+        self.addCleanup(db.__exit__, None, None, None)
+        self.clock = SimulatedClock(START.timestamp())
+        clock.use(self.clock)
+        self.addCleanup(clock.use, Clock())
+
+    @staticmethod
+    def _create_object(name, object_class):
+        function = mock_database.GamFunction.create(of_name='test')
+        mock_database.GamObjectclass.get_or_create(
+            oc_id=object_class, defaults={'oc_name': 'test', 'oc_function': function, 'oc_positiontype': 0})
+        object_type = mock_database.GamObjecttype.create(ot_name='test', ot_objectclass=object_class)
+        return mock_database.GamObject.insert(ob_name=name, ob_objecttype=object_type).execute()
+
+    def _schedule_updates(self, pv_monitors, pv_name, period, get_value, until=None):
+        """ Update the PV every period seconds from the start, until the given time if any. """
+        handle = pv_monitors.get_handle(pv_name)
+        sub = MagicMock()
+
+        def update():
+            elapsed = self.clock.time() - START.timestamp()
+            pv_monitors._callback_f(handle, sub, _Response(get_value(elapsed)))
+            if until is None or elapsed + period < until:
+                self.clock.call_later(period, update)
+
+        self.clock.call_at(START.timestamp(), update)
+
+    @staticmethod
+    def _get_measurements(object_id):
+        return list(mock_database.GamMeasurement
+                    .select(mock_database.GamMeasurement.mea_date, mock_database.GamMeasurement.mea_value1,
+                            mock_database.GamMeasurement.mea_value5)
+                    .where(mock_database.GamMeasurement.mea_object == object_id)
+                    .order_by(mock_database.GamMeasurement.mea_id)
+                    .tuples())
+
+    def test_GIVEN_day_of_updates_WHEN_import_runs_THEN_measurements_on_schedule_with_correct_values(self, _):
+        vessels = {self._create_object(f'vessel {i}', DBClassIDs.VESSEL): LOGGING_PERIODS[i % len(LOGGING_PERIODS)]
+                   for i in range(12)}
+        gas_counter = self._create_object('gas counter', DBClassIDs.GAS_COUNTER)
+        silent = self._create_object('silent vessel', DBClassIDs.VESSEL)
+
+        pvs = {object_id: f'LVL{object_id}' for object_id in vessels}
+        pvs[gas_counter] = 'REV'
+        pvs[silent] = 'SILENT'
+        periods = {**vessels, gas_counter: 60, silent: 15}
+
+        config = MagicMock()
+        config.object_ids = list(pvs)
+        config.logging_periods = periods
+        config.get_entry_measurement_pvs.side_effect = lambda object_id, full_names: {'1': pvs[object_id]}
+        config.get_entry_statistics.return_value = {}
+        pv_monitors = PvMonitors(list(pvs.values()))
+        pv_import = PvImport(pv_monitors, config, [])
+
+        for pv_name in pvs.values():
+            if pv_name.startswith('LVL'):
+                self._schedule_updates(pv_monitors, pv_name, 30, lambda elapsed: 50 + elapsed % 7)
+        self._schedule_updates(pv_monitors, 'REV', 60,
+                               lambda elapsed: elapsed / 60 * GAS_COUNTER_REVOLUTIONS_PER_MINUTE)
+        self._schedule_updates(pv_monitors, 'SILENT', 30, lambda elapsed: 1.0, until=SILENT_AFTER)
+        self.clock.call_at(START.timestamp() + DAY, pv_import.stop)
+
+        pv_import.start()
+
+        self.assertEqual(START + timedelta(seconds=DAY), clock.now())
+        for object_id, period in vessels.items():
+            dates = [date for date, _, _ in self._get_measurements(object_id)]
+            self.assertEqual(DAY // (period * 60), len(dates))
+            self.assertEqual({timedelta(minutes=period)}, {b - a for a, b in zip(dates, dates[1:])})
+
+        # One hour of revolutions between each measurement, converted to litres
+        litres = [float(value5) for _, _, value5 in self._get_measurements(gas_counter)[1:]]
+        self.assertEqual(23, len(litres))
+        self.assertEqual({round(60 * GAS_COUNTER_REVOLUTIONS_PER_MINUTE * 1.321, 2)}, set(litres))
+
+        # Not measured once its PV is stale
+        last_silent = self._get_measurements(silent)[-1][0]
+        self.assertLessEqual(last_silent, START + timedelta(seconds=SILENT_AFTER + CA.STALE_AFTER))
+        self.assertIn('SILENT', pv_monitors.get_stale_pvs())
+
+
+class TestSimulatedClock(unittest.TestCase):
+
+    def test_GIVEN_scheduled_callbacks_WHEN_sleep_THEN_run_in_order_at_their_time(self):
+        sim_clock = SimulatedClock(100)
+        calls = []
+        sim_clock.call_at(105, lambda: calls.append(('second', sim_clock.time())))
+        sim_clock.call_later(2, lambda: calls.append(('first', sim_clock.time())))
+        sim_clock.call_at(200, lambda: calls.append(('later', sim_clock.time())))
+
+        sim_clock.sleep(10)
+
+        self.assertEqual([('first', 102), ('second', 105)], calls)
+        self.assertEqual(110, sim_clock.time())
+        self.assertEqual(datetime.fromtimestamp(110), sim_clock.now())
+
+
+if __name__ == '__main__':
+    unittest.main()
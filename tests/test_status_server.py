@@ -0,0 +1,126 @@
+import socket
+import unittest
+
+from mock import patch, MagicMock
+
+from HLM_PV_Import.status_server import StatusServer
+from ServiceManager.status_client import StatusClient
+
+
+@patch('HLM_PV_Import.status_server.logger', MagicMock())
+class TestStatusServer(unittest.TestCase):
+
+    def _start_server(self, commands=None, interval=0.1, token='', client_token=''):
+        self.status = {'monitored_pvs': 3, 'stale_pvs': 1}
+        server = StatusServer(0, lambda: self.status, commands, interval=interval, token=token)
+        server.start()
+        self.addCleanup(server.stop)
+        client = StatusClient(server.port, token=client_token)
+        client.connect()
+        self.addCleanup(client.close)
+        return server, client
+
+    def test_GIVEN_client_connected_WHEN_receive_THEN_status_pushed_on_connect_and_periodically(self):
+        _, client = self._start_server()
+
+        first = client.receive()
+        self.status = {'monitored_pvs': 4, 'stale_pvs': 0}
+        second = client.receive()
+
+        self.assertEqual(('status', 3, 1), (first['type'], first['monitored_pvs'], first['stale_pvs']))
+        self.assertEqual(('status', 4, 0), (second['type'], second['monitored_pvs'], second['stale_pvs']))
+
+    def test_GIVEN_command_WHEN_sent_THEN_run_and_replied(self):
+        reload_config = MagicMock(return_value={'objects': 2})
+        _, client = self._start_server({'reload_config': reload_config}, interval=60)
+        client.receive()  # the status pushed on connect
+
+        client.send_command('reload_config')
+
+        self.assertEqual({'type': 'reply', 'command': 'reload_config', 'ok': True, 'objects': 2}, client.receive())
+        reload_config.assert_called_once_with()
+
+    def test_GIVEN_token_WHEN_command_sent_with_wrong_token_THEN_refused_AND_status_still_served(self):
+        reload_config = MagicMock()
+        _, client = self._start_server({'reload_config': reload_config}, interval=60, token='secret',
+                                       client_token='wrong')
+        client.receive()
+
+        client.send_command('reload_config')
+        refused = client.receive()
+        client.send_command('status')
+        status = client.receive()
+
+        self.assertEqual((False, 'Invalid token.'), (refused['ok'], refused['error']))
+        self.assertEqual('status', status['type'])
+        reload_config.assert_not_called()
+
+    def test_GIVEN_token_WHEN_command_sent_with_token_THEN_run(self):
+        reload_config = MagicMock(return_value=None)
+        _, client = self._start_server({'reload_config': reload_config}, interval=60, token='secret',
+                                       client_token='secret')
+        client.receive()
+
+        client.send_command('reload_config')
+
+        self.assertTrue(client.receive()['ok'])
+        reload_config.assert_called_once_with()
+
+    def test_GIVEN_failing_or_unknown_command_WHEN_sent_THEN_error_replied(self):
+        _, client = self._start_server({'reload_config': MagicMock(side_effect=RuntimeError('Not running.'))},
+                                       interval=60)
+        client.receive()
+
+        client.send_command('reload_config')
+        failed = client.receive()
+        client.send_command('restart')
+        unknown = client.receive()
+
+        self.assertEqual((False, 'Not running.'), (failed['ok'], failed['error']))
+        self.assertEqual(('restart', False), (unknown['command'], unknown['ok']))
+
+    def test_GIVEN_invalid_message_WHEN_sent_THEN_error_replied_and_still_connected(self):
+        server, client = self._start_server(interval=60)
+        client.receive()
+
+        with socket.create_connection(('127.0.0.1', server.port)) as sock:
+            reader = sock.makefile('rb')
+            reader.readline()
+            sock.sendall(b'not json\n{"command": "status"}\n')
+            invalid, status = reader.readline(), reader.readline()
+            reader.close()
+
+        self.assertIn(b'"ok": false', invalid)
+        self.assertIn(b'"type": "status"', status)
+
+    def test_GIVEN_server_stopped_WHEN_receive_THEN_connection_closed(self):
+        server, client = self._start_server(interval=0.05)
+        client.receive()
+
+        server.stop()
+        while client.receive() is not None:
+            pass  # the status pushed before the server stopped
+
+        self.assertIsNone(client.receive())
+
+
+class TestServiceStatusSubscriberThread(unittest.TestCase):
+
+    def test_GIVEN_malformed_message_WHEN_receive_messages_THEN_skipped_AND_next_messages_received(self):
+        from ServiceManager.GUI.main_window_threads import ServiceStatusSubscriberThread  # needs PyQt5
+        thread = ServiceStatusSubscriberThread()
+        thread.running = True
+        thread.client = MagicMock()
+        thread.client.receive.side_effect = [ValueError('Expecting value'), ['not', 'a', 'dict'],
+                                             {'type': 'status', 'monitored_pvs': 1}, None]
+        received = []
+        thread.status_received.connect(received.append)
+
+        with patch('ServiceManager.GUI.main_window_threads.manager_logger'):
+            thread.receive_messages()
+
+        self.assertEqual([{'type': 'status', 'monitored_pvs': 1}], received)
+
+
+if __name__ == '__main__':
+    unittest.main()
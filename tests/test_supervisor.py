@@ -0,0 +1,118 @@
+import unittest
+
+from mock import patch, MagicMock
+
+from HLM_PV_Import.ca_wrapper import MONITORED_PVS
+from HLM_PV_Import.metrics import registry
+from HLM_PV_Import.supervisor import Supervisor, HEARTBEAT_TIMEOUT, RESTART_DELAY, WORKER_METRICS
+from HLM_PV_Import.user_config import get_shard
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        for name in WORKER_METRICS:
+            metric = registry.get(name)
+            if metric is not None:
+                self.addCleanup(setattr, metric, 'function', metric.function)
+        self.supervisor = Supervisor(2)
+        self.supervisor.running = True
+        for worker in self.supervisor.workers:
+            worker.process = MagicMock()
+            worker.process.is_alive.return_value = True
+            worker.start = MagicMock()
+            worker.started = 1000
+            worker.heartbeat.value = 1000
+        self.worker = self.supervisor.workers[0]
+
+    @patch('HLM_PV_Import.supervisor.time')
+    def test_GIVEN_healthy_workers_WHEN_check_workers_THEN_none_restarted(self, mock_time):
+        mock_time.time.return_value = 1000 + HEARTBEAT_TIMEOUT - 1
+
+        self.supervisor.check_workers()
+
+        for worker in self.supervisor.workers:
+            worker.start.assert_not_called()
+
+    @patch('HLM_PV_Import.supervisor.time')
+    def test_GIVEN_exited_worker_WHEN_check_workers_THEN_restarted(self, mock_time):
+        mock_time.time.return_value = 1000 + RESTART_DELAY
+        self.worker.process.is_alive.return_value = False
+
+        self.supervisor.check_workers()
+
+        self.worker.start.assert_called_once()
+        self.supervisor.workers[1].start.assert_not_called()
+
+    @patch('HLM_PV_Import.supervisor.time')
+    def test_GIVEN_hung_worker_WHEN_check_workers_THEN_terminated_and_restarted(self, mock_time):
+        mock_time.time.return_value = 1000 + HEARTBEAT_TIMEOUT
+        self.supervisor.workers[1].heartbeat.value = 1000 + HEARTBEAT_TIMEOUT
+
+        self.supervisor.check_workers()
+
+        self.worker.process.terminate.assert_called_once()
+        self.worker.start.assert_called_once()
+        self.supervisor.workers[1].start.assert_not_called()
+
+    @patch('HLM_PV_Import.supervisor.time')
+    def test_GIVEN_worker_just_restarted_WHEN_check_workers_THEN_not_restarted_again(self, mock_time):
+        mock_time.time.return_value = 1000 + RESTART_DELAY - 1
+        self.worker.process.is_alive.return_value = False
+
+        self.supervisor.check_workers()
+
+        self.worker.start.assert_not_called()
+
+    @patch('HLM_PV_Import.supervisor.time')
+    def test_GIVEN_stopped_WHEN_check_workers_THEN_exited_workers_not_restarted(self, mock_time):
+        mock_time.time.return_value = 1000 + RESTART_DELAY
+        self.worker.process.is_alive.return_value = False
+
+        self.supervisor.stop()
+        self.supervisor.check_workers()
+
+        self.worker.start.assert_not_called()
+        self.assertTrue(self.supervisor._stop_event.is_set())
+
+    def test_GIVEN_running_WHEN_restart_workers_THEN_all_stopped_and_started_again(self):
+        for worker in self.supervisor.workers:
+            worker.stop = MagicMock()
+
+        self.supervisor.restart_workers()
+
+        for worker in self.supervisor.workers:
+            worker.stop.assert_called_once()
+            worker.start.assert_called_once()
+        self.assertFalse(self.supervisor._stop_event.is_set())
+
+    def test_GIVEN_worker_metrics_WHEN_get_worker_metric_THEN_combined(self):
+        names = list(WORKER_METRICS)
+        for worker, (monitored_pvs, last_insert_time, db_healthy) in zip(self.supervisor.workers,
+                                                                          [(10, 1000, 1), (20, 2000, 0)]):
+            worker.metrics[names.index('hlm_monitored_pvs')] = monitored_pvs
+            worker.metrics[names.index('hlm_db_last_insert_timestamp_seconds')] = last_insert_time
+            worker.metrics[names.index('hlm_db_healthy')] = db_healthy
+
+        self.assertEqual(30, self.supervisor.get_worker_metric('hlm_monitored_pvs'))
+        self.assertEqual(2000, self.supervisor.get_worker_metric('hlm_db_last_insert_timestamp_seconds'))
+        self.assertEqual(0, self.supervisor.get_worker_metric('hlm_db_healthy'))
+
+    def test_GIVEN_worker_metrics_WHEN_metric_value_THEN_combined_value_of_workers(self):
+        index = list(WORKER_METRICS).index('hlm_monitored_pvs')
+        for worker in self.supervisor.workers:
+            worker.metrics[index] = 5
+
+        self.assertEqual(10, MONITORED_PVS.value)
+
+
+class TestGetShard(unittest.TestCase):
+
+    def test_GIVEN_objects_WHEN_get_shard_THEN_each_object_in_one_shard_and_all_shards_used(self):
+        shards = [get_shard(object_id, 4) for object_id in range(1, 101)]
+
+        self.assertEqual({0, 1, 2, 3}, set(shards))
+        self.assertEqual(shards, [get_shard(object_id, 4) for object_id in range(1, 101)])
+
+    def test_GIVEN_one_shard_WHEN_get_shard_THEN_always_first(self):
+        self.assertEqual({0}, {get_shard(object_id, 1) for object_id in range(1, 101)})
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from mock import patch
+
+from HLM_PV_Import.tracing import Tracer
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('HLM_PV_Import.tracing.trace_logger')
+        self.mock_logger = patcher.start()
+        self.addCleanup(patcher.stop)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+        self.trace_flag = os.path.join(self.dir, 'trace.flag')
+        self.profile_flag = os.path.join(self.dir, 'profile.flag')
+        self.tracer = Tracer(trace_flag=self.trace_flag, profile_flag=self.profile_flag, report_interval=3600,
+                             enabled=False)
+
+    def _create_file(self, path, content=''):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_GIVEN_tracing_disabled_WHEN_span_THEN_nothing_recorded(self):
+        with self.tracer.span('test'):
+            pass
+        self.assertEqual({}, self.tracer.get_stats())
+
+    def test_GIVEN_trace_flag_WHEN_poll_and_span_THEN_duration_recorded(self):
+        self._create_file(self.trace_flag)
+
+        self.tracer.poll()
+        with self.tracer.span('test'):
+            pass
+        with self.tracer.span('test'):
+            pass
+
+        self.assertTrue(self.tracer.enabled)
+        self.assertEqual(2, self.tracer.get_stats()['test'].histogram.count)
+
+    def test_GIVEN_tracing_enabled_WHEN_spans_on_several_threads_THEN_all_recorded(self):
+        self.tracer.enabled = True
+
+        def add_spans():
+            for _ in range(1000):
+                with self.tracer.span('test'):
+                    pass
+        threads = [threading.Thread(target=add_spans) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(4000, self.tracer.get_stats()['test'].histogram.count)
+
+    @patch('HLM_PV_Import.tracing.log_exception')
+    def test_GIVEN_profile_flag_unreadable_WHEN_poll_THEN_error_logged_not_raised(self, mock_log_exception):
+        os.mkdir(self.profile_flag)
+
+        self.tracer.poll()
+
+        self.mock_logger.error.assert_called_once()
+        mock_log_exception.assert_called_once()
+
+    def test_GIVEN_trace_flag_removed_WHEN_poll_THEN_disabled_and_report_written(self):
+        self._create_file(self.trace_flag)
+        self.tracer.poll()
+        self.tracer.record('test', 0.01)
+        os.remove(self.trace_flag)
+
+        self.tracer.poll()
+
+        self.assertFalse(self.tracer.enabled)
+        self.assertEqual({}, self.tracer.get_stats())
+        self.assertIn('test: count=1', self.mock_logger.info.call_args[0][0])
+
+    def test_GIVEN_profile_flag_WHEN_poll_until_removed_THEN_profile_saved(self):
+        self._create_file(self.profile_flag)
+
+        self.tracer.poll()
+        sum(range(1000))
+        os.remove(self.profile_flag)
+        with patch('HLM_PV_Import.tracing.LoggingFiles.TRACE_LOG', os.path.join(self.dir, 'trace.log')):
+            self.tracer.poll()
+
+        profiles = [name for name in os.listdir(self.dir) if name.endswith('.prof')]
+        self.assertEqual(1, len(profiles))
@@ -1,6 +1,6 @@
 from parameterized import parameterized
 import unittest
-from mock import patch
+from mock import patch, DEFAULT
 from HLM_PV_Import.user_config import *
 from HLM_PV_Import.settings import PVConfig
 
@@ -169,3 +169,34 @@ class TestUserConfig(unittest.TestCase):
 
         # Assert
         self.assertCountEqual(expected_value, result)
+
+    @parameterized.expand([
+        ([{PVConfig.OBJ: 1, PVConfig.MEAS: {'1': 'a'}}],),
+        ([{PVConfig.OBJ: 1, PVConfig.MEAS: {'1': 'a', '2': 'a'}, PVConfig.STATS: {'1': 'mean', '2': 'max'}}],),
+        ([{PVConfig.OBJ: 1, PVConfig.MEAS: {'1': 'a'}, PVConfig.STATS: None}],)
+    ])
+    def test_GIVEN_valid_statistics_WHEN_check_entries_statistics_THEN_no_exception(self, entries):
+        self.config.entries = entries
+        self.config.object_ids = [entry[PVConfig.OBJ] for entry in self.config.entries]
+        self.config._check_entries_statistics()
+
+    def test_GIVEN_invalid_statistic_WHEN_check_entries_statistics_THEN_exception_raised(self):
+        self.config.entries = [{PVConfig.OBJ: 1, PVConfig.MEAS: {'1': 'a'}, PVConfig.STATS: {'1': 'median'}}]
+        self.config.object_ids = [1]
+        with self.assertRaises(PVConfigurationException):
+            self.config._check_entries_statistics()
+
+
+class TestUserConfigShards(unittest.TestCase):
+
+    @patch('HLM_PV_Import.user_config.logger')
+    @patch.multiple(UserConfig, _check_objects_exist=DEFAULT, _check_measurement_pvs_connect=DEFAULT)
+    @patch.object(UserConfig, '_get_all_entries')
+    def test_GIVEN_shards_WHEN_init_THEN_each_object_in_one_shard(self, mock_get_all_entries, *_, **__):
+        mock_get_all_entries.return_value = [{PVConfig.OBJ: i, PVConfig.MEAS: {'1': 'a'}, PVConfig.LOG_PERIOD: 1}
+                                             for i in range(1, 21)]
+
+        shards = [UserConfig(shard_index, 3).object_ids for shard_index in range(3)]
+
+        self.assertEqual(list(range(1, 21)), sorted(sum(shards, [])))
+        self.assertTrue(all(shards))
@@ -4,6 +4,9 @@ from tests import mock_database
 from parameterized import parameterized
 from shared.utils import *
 from shared.utils import _get_module_object
+from shared import db_models
+from shared.db_models import initialize_database, initialize_database_from_option, is_database, \
+    ReconnectMySQLDatabase, ReconnectPooledMySQLDatabase
 
 
 NAME = 'pv_name:4_test'
@@ -70,7 +73,7 @@ class TestUtilities(unittest.TestCase):
         result = get_short_pv_name(input_val, prefix=PREFIX, domain=DOMAIN)
         self.assertEqual(NAME, result)
 
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_connected_THEN_need_connection_succeeds(self, mock_func):
         mock_func.return_value = True
 
@@ -81,7 +84,7 @@ class TestUtilities(unittest.TestCase):
         self.assertTrue(test_function())
         mock_func.assert_called()
 
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_not_connected_THEN_need_connection_fail(self, mock_func):
         mock_func.return_value = False
 
@@ -93,21 +96,21 @@ class TestUtilities(unittest.TestCase):
         mock_func.assert_called()
 
     @mock.patch("shared.utils.GamObject.get_or_none")
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_connected_AND_object_does_not_exist_THEN_return_None(self, _, mock_object):
         mock_object.return_value = None
         self.assertIsNone(get_object_module(1))
         mock_object.assert_called()
 
     @mock.patch("shared.utils.GamObject.get_or_none")
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_connected_AND_invalid_class_THEN_return_None(self, _, mock_object):
         self.assertIsNone(get_object_module(1, "INVALID VALUE"))
         mock_object.assert_not_called()
 
     @mock.patch("shared.utils._get_module_object")
     @mock.patch("shared.utils.GamObject.get_or_none")
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_connected_AND_object_is_vessel_THEN_return_module(self, _, mock_object, mock_get_module):
         obj = mock_object.return_value
         obj.ob_objecttype.ot_objectclass.oc_name = VESSEL
@@ -119,7 +122,7 @@ class TestUtilities(unittest.TestCase):
 
     @mock.patch("shared.utils._get_module_object")
     @mock.patch("shared.utils.GamObject.get_or_none")
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_connected_AND_object_is_vessel_THEN_return_module(self, _, mock_object, mock_get_module):
         obj = mock_object.return_value
         obj.ob_objecttype.ot_objectclass.oc_name = VESSEL
@@ -131,7 +134,7 @@ class TestUtilities(unittest.TestCase):
 
     @mock.patch("shared.utils._get_module_object")
     @mock.patch("shared.utils.GamObject.get_or_none")
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_connected_AND_object_is_cryostat_THEN_return_module(self, _, mock_object, mock_get_module):
         obj = mock_object.return_value
 
@@ -144,7 +147,7 @@ class TestUtilities(unittest.TestCase):
 
     @mock.patch("shared.utils._get_module_object")
     @mock.patch("shared.utils.GamObject.get_or_none")
-    @mock.patch("shared.db_models.database.is_connection_usable")
+    @mock.patch("shared.db_models.database.obj.is_connection_usable")
     def test_GIVEN_database_connected_AND_object_is_counter_THEN_return_module(self, _, mock_object, mock_get_module):
         obj = mock_object.return_value
 
@@ -184,3 +187,34 @@ class TestUtilities(unittest.TestCase):
 
             GamObjectrelation.create(or_object=1, or_object_id_assigned=2, or_date_assignment="", or_date_removal="NOTNULL")
             self.assertIsNone(_get_module_object(1, 0))
+
+
+class TestInitializeDatabaseFromOption(unittest.TestCase):
+
+    @mock.patch('shared.db_models.initialize_database')
+    def test_GIVEN_mysql_option_WHEN_initialize_THEN_credentials_parsed(self, mock_initialize):
+        initialize_database_from_option('user:pa:ss@host/name', pool_size=2)
+
+        mock_initialize.assert_called_once_with(name='name', user='user', password='pa:ss', host='host', pool_size=2)
+
+
+class TestInitializeDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(db_models.database.initialize, db_models.database.obj)
+
+    def test_GIVEN_no_pool_size_WHEN_initialize_THEN_connections_not_pooled(self):
+        initialize_database(name='name', user='user', password='pass', host='host')
+
+        self.assertIs(type(db_models.database.obj), ReconnectMySQLDatabase)
+        self.assertEqual(db_models.database.database, 'name')
+
+    def test_GIVEN_pool_size_WHEN_initialize_THEN_connections_pooled(self):
+        initialize_database(name='name', user='user', password='pass', host='host', pool_size=2)
+
+        self.assertIs(type(db_models.database.obj), ReconnectPooledMySQLDatabase)
+        self.assertEqual(db_models.database.database, 'name')
+
+    def test_GIVEN_proxy_WHEN_is_database_THEN_checks_the_proxied_database(self):
+        self.assertTrue(is_database(db_models.database, ReconnectMySQLDatabase))
+        self.assertFalse(is_database(db_models.database, ReconnectPooledMySQLDatabase))
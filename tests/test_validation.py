@@ -0,0 +1,114 @@
+import unittest
+
+import numpy as np
+from mock import patch, MagicMock
+
+from tests import mock_database
+from HLM_PV_Import.validation import ObjectLimits, get_limits
+from HLM_PV_Import.ca_wrapper import PvMonitors
+from HLM_PV_Import.db_func import get_object_display_formats, UNVALIDATED
+from HLM_PV_Import.pv_import import PvImport
+from HLM_PV_Import.settings import PvImportConfig
+from shared.const import MeaStatus
+
+
+def _display_format(lower=None, upper=None, alarm_low=None, alarm_high=None):
+    return MagicMock(df_lowerlimit=lower, df_upperlimit=upper, df_alarmlow=alarm_low, df_alarmhigh=alarm_high)
+
+
+class TestValidation(unittest.TestCase):
+
+    def test_GIVEN_display_formats_WHEN_get_limits_THEN_limits_per_measurement_number(self):
+        limits = get_limits([_display_format(0, 100), None, _display_format(alarm_high=5)])
+
+        self.assertEqual([0, 100], limits[:2, 0].tolist())
+        self.assertEqual(5, limits[3, 2])
+        self.assertEqual(17, np.isnan(limits).sum())
+
+    @patch('HLM_PV_Import.validation.pv_logger')
+    def test_GIVEN_measurements_WHEN_validate_THEN_out_of_range_and_alarms_flagged(self, mock_logger):
+        limits = ObjectLimits()
+        limits.add_objects([10, 11, 12], {10: [_display_format(0, 100, 10, 90), None, _display_format(alarm_low=0)],
+                                          11: [None] * 5})
+        measurements = [(10, {'1': 50, '2': -5}), (10, {'1': 95}), (10, {'1': 101, '3': -1}), (10, {'3': -1}),
+                        (10, {'1': 'High'}), (11, {'1': -100}), (12, {'1': -100})]
+
+        validity = limits.validate(measurements)
+
+        self.assertEqual([(1, MeaStatus.OK), (1, MeaStatus.ALARM), (0, MeaStatus.OUT_OF_RANGE), (1, MeaStatus.ALARM),
+                          (1, MeaStatus.OK), (1, MeaStatus.OK), (1, MeaStatus.OK)], validity)
+        self.assertEqual([], limits.get_missing_objects([10, 11, 12]))
+        self.assertEqual(3, mock_logger.warning.call_count)
+
+
+@patch('HLM_PV_Import.db_func.database', new=mock_database.database)
+@patch('shared.utils.database', new=mock_database.database)
+class TestValidationImport(unittest.TestCase):
+
+    def setUp(self):
+        db = mock_database.Database()
+        db.__enter__()
+        self.addCleanup(db.__exit__, None, None, None)
+
+        class_format = mock_database.GamDisplayformat.create(df_lowerlimit=0, df_upperlimit=200)
+        type_format = mock_database.GamDisplayformat.create(df_lowerlimit=0, df_upperlimit=100)
+        object_format = mock_database.GamDisplayformat.create(df_alarmhigh=10)
+        function = mock_database.GamFunction.create(of_name='test')
+        object_class = mock_database.GamObjectclass.create(oc_name='test', oc_function=function, oc_positiontype=0,
+                                                           oc_df_id_1=class_format, oc_df_id_2=class_format)
+        object_type = mock_database.GamObjecttype.create(ot_name='test', ot_objectclass=object_class,
+                                                         ot_df_id_1=type_format)
+        self.object_id = mock_database.GamObject.insert(ob_name='vessel', ob_objecttype=object_type,
+                                                        ob_df_id_3=object_format).execute()
+
+    def test_GIVEN_object_ids_WHEN_get_display_formats_THEN_object_then_type_then_class_formats(self):
+        display_formats = get_object_display_formats([self.object_id, self.object_id + 1])
+
+        self.assertEqual([self.object_id], list(display_formats))
+        upper_limits = [display_format.df_upperlimit if display_format else None
+                        for display_format in display_formats[self.object_id]]
+        self.assertEqual([100, 200, None, None, None], upper_limits)
+        self.assertEqual(10, display_formats[self.object_id][2].df_alarmhigh)
+
+    @patch.object(PvImportConfig, 'VALIDATION', True)
+    @patch('HLM_PV_Import.pv_import.add_measurement')
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_GIVEN_validation_enabled_WHEN_import_objects_THEN_out_of_range_measurement_not_valid(
+            self, _, mock_add_measurement):
+        pv_monitors = PvMonitors(['LVL'])
+        config = MagicMock()
+        config.object_ids = [self.object_id]
+        config.logging_periods = {self.object_id: 1}
+        config.get_entry_measurement_pvs.return_value = {'1': 'LVL'}
+        config.get_entry_statistics.return_value = {}
+        pv_import = PvImport(pv_monitors, config, [])
+        response = MagicMock()
+        response.data = [150.0]
+        pv_monitors._callback_f(pv_monitors.get_handle('LVL'), MagicMock(), response)
+
+        pv_import._import_objects()
+
+        self.assertEqual((0, MeaStatus.OUT_OF_RANGE), mock_add_measurement.call_args[1]['validity'])
+
+    @patch('HLM_PV_Import.pv_import.add_measurement')
+    @patch('HLM_PV_Import.ca_wrapper.ca_context')
+    def test_GIVEN_validation_disabled_WHEN_import_objects_THEN_measurement_unvalidated(self, _,
+                                                                                      mock_add_measurement):
+        pv_monitors = PvMonitors(['LVL'])
+        config = MagicMock()
+        config.object_ids = [self.object_id]
+        config.logging_periods = {self.object_id: 1}
+        config.get_entry_measurement_pvs.return_value = {'1': 'LVL'}
+        config.get_entry_statistics.return_value = {}
+        pv_import = PvImport(pv_monitors, config, [])
+        response = MagicMock()
+        response.data = [150.0]
+        pv_monitors._callback_f(pv_monitors.get_handle('LVL'), MagicMock(), response)
+
+        pv_import._import_objects()
+
+        self.assertEqual(UNVALIDATED, mock_add_measurement.call_args[1]['validity'])
+
+
+if __name__ == '__main__':
+    unittest.main()